@@ -0,0 +1,120 @@
+import sqlite3
+from typing import Optional
+
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+
+
+def create_table(cursor: sqlite3.Cursor) -> None:
+    """Create ballots ledger, tally watermark and standings view if they
+      don't exist.
+
+    Ballots are append-only, one row per vote. Party totals in
+      parties.votes only hold ballots up to the tally watermark, ballots
+      after it are counted on read by the standings view until they are
+      folded into the totals, see fold.
+
+    Each ballot records the district of its voter, if any, so results
+      can be reported per district and region, see district module.
+
+    To be called from a create_tables function in setup, after the
+      parties and districts tables have been created.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+
+    Raises:
+        sqlite3.Error: SQLite exception
+        Exception: Generic exception
+    """
+    queries: tuple = (
+        '''CREATE TABLE IF NOT EXISTS ballots(
+            id INTEGER PRIMARY KEY NOT NULL,
+            party_id INTEGER NOT NULL REFERENCES parties(id),
+            district_id INTEGER REFERENCES districts(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS tally(
+            id INTEGER PRIMARY KEY NOT NULL CHECK (id = 0),
+            folded_ballot_id INTEGER NOT NULL DEFAULT 0
+        )''',
+        'INSERT OR IGNORE INTO tally(id) VALUES(0)',
+        '''CREATE VIEW IF NOT EXISTS standings AS
+            WITH pending AS (
+                SELECT party_id, COUNT(*) AS votes FROM ballots
+                WHERE id > (SELECT folded_ballot_id FROM tally)
+                GROUP BY party_id
+            )
+            SELECT parties.id AS id, name, symbol,
+                parties.votes + COALESCE(pending.votes, 0) AS votes
+            FROM parties LEFT JOIN pending ON pending.party_id = parties.id
+        ''',
+    )
+    try:
+        for query in queries:
+            cursor.execute(query)
+        db.add_column(cursor, 'ballots', 'district_id',
+                      'INTEGER REFERENCES districts(id)')
+    except sqlite3.OperationalError as e:
+        print(repr(e))
+        raise e
+    except Exception as e:
+        print(repr(e))
+        raise e
+
+
+def record(cursor: sqlite3.Cursor, party_id: int,
+           district_id: Optional[int] = None) -> int:
+    """Append a ballot for a party to the ledger.
+
+    Folds pending ballots into the party totals every
+      config.BALLOT_FOLD_INTERVAL ballots, so the parties rows are only
+      written periodically instead of once per vote.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor, inside the vote
+          transaction
+        party_id (int): ID of party voted for
+        district_id (Optional[int], optional): District of voter.
+          Defaults to None.
+
+    Returns:
+        int: Ballot ID
+    """
+    query: str = 'INSERT INTO ballots(party_id, district_id) VALUES(?, ?)'
+    ballot_id: int = cursor.execute(query, (party_id, district_id)).lastrowid
+    if ballot_id % config.BALLOT_FOLD_INTERVAL == 0:
+        fold(cursor)
+    return ballot_id
+
+
+def fold(cursor: sqlite3.Cursor) -> int:
+    """Add ballots after the tally watermark to the party totals and
+      the district and region tallies, and move the watermark to the
+      latest ballot.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+
+    Returns:
+        int: New watermark (ID of latest folded ballot)
+    """
+    folded_ballot_id: int = cursor.execute(
+        'SELECT folded_ballot_id FROM tally').fetchone()[0]
+    latest_ballot_id: int = cursor.execute(
+        'SELECT COALESCE(MAX(id), 0) FROM ballots').fetchone()[0]
+    if latest_ballot_id <= folded_ballot_id:
+        return folded_ballot_id
+    query: str = '''UPDATE parties SET votes = votes + (
+            SELECT COUNT(*) FROM ballots
+            WHERE party_id = parties.id AND id > :folded AND id <= :latest
+        )
+        WHERE id IN (
+            SELECT party_id FROM ballots WHERE id > :folded AND id <= :latest
+        )'''
+    cursor.execute(
+        query, {'folded': folded_ballot_id, 'latest': latest_ballot_id})
+    district.fold(cursor, folded_ballot_id, latest_ballot_id)
+    cursor.execute('UPDATE tally SET folded_ballot_id = ?',
+                   (latest_ballot_id,))
+    return latest_ballot_id
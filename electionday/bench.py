@@ -0,0 +1,345 @@
+import argparse
+import json
+import math
+import pathlib
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import electionday as app
+import electionday.ballot as ballot
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.memory as memory
+import electionday.party as party_model
+import electionday.results as results
+import electionday.roll as roll
+import electionday.storage as storage
+import electionday.voter as voter_model
+import electionday.writer as ballot_writer
+
+
+def voter_id(i: int) -> str:
+    """Synthetic voter ID for voter number i."""
+    return f'{i:010d}'
+
+
+def voter_name(i: int) -> str:
+    """Synthetic name for voter number i."""
+    return f'Voter {i}'
+
+
+def generate_voters(count: int) -> Iterator[roll.Row]:
+    """Yield count synthetic (voter_id, name) rows."""
+    return ((voter_id(i), voter_name(i)) for i in range(count))
+
+
+def generate_parties(count: int) -> List[str]:
+    """Synthetic party names."""
+    return [f'Party {i:04d}' for i in range(count)]
+
+
+def write_roll(path: pathlib.Path, count: int) -> pathlib.Path:
+    """Write a synthetic CSV voter roll without holding it in memory."""
+    with open(path, 'w', newline='') as f:
+        f.write('voter_id,name\n')
+        for batch in roll.batched(generate_voters(count), 100_000):
+            f.writelines(f'{_id},{name}\n' for _id, name in batch)
+    return path
+
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """Summarise latency samples in microseconds (nearest rank).
+
+    Args:
+        samples (Sequence[float]): Latencies in seconds
+
+    Returns:
+        Dict[str, float]: count, mean, p50, p95, p99 and max
+    """
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    n: int = len(ordered)
+
+    def rank(q: float) -> float:
+        return round(ordered[max(math.ceil(q * n) - 1, 0)] * 1e6, 2)
+
+    return {
+        'count': n,
+        'mean_us': round(sum(ordered) / n * 1e6, 2),
+        'p50_us': rank(0.50),
+        'p95_us': rank(0.95),
+        'p99_us': rank(0.99),
+        'max_us': round(ordered[-1] * 1e6, 2),
+    }
+
+
+def timed(fn: Callable, calls: int) -> List[float]:
+    """Call fn(i) for i in range(calls) and return per-call latencies."""
+    latencies: List[float] = []
+    clock = time.perf_counter
+    for i in range(calls):
+        started = clock()
+        fn(i)
+        latencies.append(clock() - started)
+    return latencies
+
+
+def bench_import(roll_path: pathlib.Path, parties: List[str],
+                 batch_size: int) -> dict:
+    db.create_tables(party_model.create_table, district.create_table,
+                     voter_model.create_table, ballot.create_table)
+    db.populate_tables((party_model.populate_table, parties))
+    started = time.perf_counter()
+    inserted = voter_model.bulk_import(
+        roll.iter_voters(roll_path), batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    baseline: dict = bench_import_row_by_row(roll_path)
+    return {'rows': inserted, 'seconds': round(elapsed, 3),
+            'rows_per_sec': round(inserted / elapsed, 1),
+            'row_by_row': baseline,
+            'speedup': round(baseline['seconds'] / elapsed, 2)}
+
+
+def bench_import_row_by_row(roll_path: pathlib.Path) -> dict:
+    """Import the roll with one INSERT per voter, as before bulk_import.
+
+    Uses a separate database next to the roll with the original voters
+      table, so bulk_import can be compared against it.
+    """
+    path = roll_path.with_name('row_by_row.db')
+    path.unlink(missing_ok=True)
+    connection = sqlite3.connect(path)
+    query: str = 'INSERT INTO voters(name, voter_id) VALUES(?, ?)'
+    inserted: int = 0
+    try:
+        connection.execute('''CREATE TABLE voters(
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            name VARCHAR(60) NOT NULL,
+            voter_id VARCHAR(12) NOT NULL UNIQUE,
+            has_voted NUMERIC(1) NOT NULL DEFAULT 0
+        )''')
+        started = time.perf_counter()
+        with connection:
+            cursor = connection.cursor()
+            for _id, name in roll.iter_voters(roll_path):
+                try:
+                    cursor.execute(query, (name, _id))
+                except sqlite3.IntegrityError:
+                    continue
+                inserted += 1
+            cursor.close()
+        elapsed = time.perf_counter() - started
+    finally:
+        connection.close()
+    return {'rows': inserted, 'seconds': round(elapsed, 3),
+            'rows_per_sec': round(inserted / elapsed, 1)}
+
+
+def bench_login(voters: int, samples: int, rng: random.Random) -> dict:
+    ids: List[int] = [rng.randrange(voters) for _ in range(samples)]
+
+    def legacy(i: int) -> None:
+        _id = ids[i]
+        if voter_model.is_valid(voter_name(_id), voter_id(_id)):
+            voter_model.get_by_voter_id(voter_id(_id))
+
+    def authenticate(i: int) -> None:
+        _id = ids[i]
+        voter_model.authenticate(voter_name(_id), voter_id(_id))
+
+    return {
+        'is_valid+get_by_voter_id': percentiles(timed(legacy, samples)),
+        'authenticate': percentiles(timed(authenticate, samples)),
+    }
+
+
+def bench_cast_vote(chosen: Sequence[int], writers: int,
+                    group_commit: bool = False) -> dict:
+    parties = party_model.select_all()
+    ballots = ballot_writer.BallotWriter() if group_commit else None
+    cast: Callable = ballots.cast if ballots else (
+        lambda voter, party: app.cast_vote(voter=voter, party=party))
+    latencies: List[List[float]] = [[] for _ in range(writers)]
+    errors: List[int] = [0] * writers
+
+    def work(worker: int) -> None:
+        clock = time.perf_counter
+        for i in chosen[worker::writers]:
+            voter = voter_model.Voter(
+                _id=i + 1, name=voter_name(i), voter_id=voter_id(i))
+            party = parties[i % len(parties)]
+            started = clock()
+            try:
+                cast(voter, party)
+            except (sqlite3.Error, voter_model.AlreadyVotedError):
+                errors[worker] += 1
+            latencies[worker].append(clock() - started)
+
+    threads = [threading.Thread(target=work, args=(worker,))
+               for worker in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if ballots:
+        ballots.close()
+    samples = [latency for worker in latencies for latency in worker]
+    return {
+        'writers': writers,
+        'commits': ballots.batches if ballots else len(samples),
+        'ballots': len(samples) - sum(errors),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'ballots_per_sec': round((len(samples) - sum(errors)) / elapsed, 1),
+        'latency': percentiles(samples),
+    }
+
+
+def bench_results(samples: int) -> dict:
+    def select(i: int) -> None:
+        party_model.select_results()
+        party_model.select_winners()
+
+    def cached(i: int) -> None:
+        results.CACHE.results()
+        results.CACHE.winners()
+
+    results.CACHE.invalidate()
+    return {
+        'select_results+select_winners': percentiles(timed(select, samples)),
+        'cache': percentiles(timed(cached, samples)),
+    }
+
+
+def bench_memory(roll_path: pathlib.Path, parties: List[str],
+                 chosen: Sequence[int], samples: int,
+                 rng: random.Random) -> dict:
+    """Import, login, cast_vote and results of the in-memory storage
+      engine, for comparison with the SQLite benchmarks."""
+    engine = memory.MemoryStorage(None)
+    engine.add_parties(parties)
+    started = time.perf_counter()
+    inserted = engine.add_voters(roll.iter_voters(roll_path))
+    elapsed = time.perf_counter() - started
+    with storage.using(engine):
+        report = {
+            'import': {'rows': inserted, 'seconds': round(elapsed, 3),
+                       'rows_per_sec': round(inserted / elapsed, 1)},
+            'login': bench_login(inserted, samples, rng),
+        }
+        ranked = party_model.select_all()
+
+        def cast(i: int) -> None:
+            _id = chosen[i]
+            app.cast_vote(voter=voter_model.Voter(
+                _id=_id + 1, name=voter_name(_id), voter_id=voter_id(_id)),
+                party=ranked[_id % len(ranked)])
+
+        def select(i: int) -> None:
+            party_model.select_results()
+            party_model.select_winners()
+
+        report['cast_vote'] = percentiles(timed(cast, len(chosen)))
+        report['results'] = percentiles(timed(select, samples))
+    return report
+
+
+def run(voters: int = 10_000, parties: int = 10, writers: int = 4,
+        votes: int = 2_000, samples: int = 1_000,
+        batch_size: int = config.IMPORT_BATCH_SIZE, seed: int = 0,
+        directory: Optional[pathlib.Path] = None) -> dict:
+    """Run all benchmarks against a fresh database, and the same
+      workload against the in-memory storage engine.
+
+    Args:
+        voters (int, optional): Voters on the synthetic roll
+        parties (int, optional): Parties on the ballot
+        writers (int, optional): Concurrent cast_vote threads
+        votes (int, optional): Ballots cast in each write benchmark
+        samples (int, optional): Calls per latency benchmark
+        batch_size (int, optional): Voter import batch size
+        seed (int, optional): Random seed for voter sampling
+        directory (Optional[pathlib.Path], optional): Where to create
+          the roll and database. Defaults to None, a temporary directory.
+
+    Returns:
+        dict: Machine-readable benchmark report
+    """
+    rng = random.Random(seed)
+    # Distinct voters for each write benchmark.
+    chosen: List[int] = rng.sample(range(voters), min(2 * votes, voters))
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = pathlib.Path(directory or tmp)
+        db_path = directory.joinpath('bench.db')
+        for suffix in ('', '-wal', '-shm'):
+            pathlib.Path(f'{db_path}{suffix}').unlink(missing_ok=True)
+        roll_path = write_roll(directory.joinpath('roll.csv'), voters)
+        provider = db.configure(db_path)
+        try:
+            report = {
+                'parameters': {
+                    'voters': voters, 'parties': parties,
+                    'writers': writers, 'votes': votes, 'samples': samples,
+                    'batch_size': batch_size, 'seed': seed,
+                },
+                'environment': {
+                    'python': platform.python_version(),
+                    'sqlite': sqlite3.sqlite_version,
+                    'platform': platform.platform(),
+                    'journal_mode': provider.journal_mode,
+                    'synchronous': provider.synchronous,
+                },
+                'import': bench_import(
+                    roll_path, generate_parties(parties), batch_size),
+                'login': bench_login(voters, samples, rng),
+                'cast_vote': bench_cast_vote(chosen[::2], writers),
+                'cast_vote_group_commit': bench_cast_vote(
+                    chosen[1::2], writers, group_commit=True),
+                'results': bench_results(samples),
+                'memory_engine': bench_memory(
+                    roll_path, generate_parties(parties), chosen[::2],
+                    samples, rng),
+            }
+        finally:
+            provider.close()
+    return report
+
+
+def main() -> None:
+    """Run benchmarks from the command line and print JSON report."""
+    parser = argparse.ArgumentParser(
+        description=f'{config.APP_NAME} database benchmarks')
+    parser.add_argument('--voters', type=int, default=10_000)
+    parser.add_argument('--parties', type=int, default=10)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--votes', type=int, default=2_000)
+    parser.add_argument('--samples', type=int, default=1_000)
+    parser.add_argument('--batch-size', type=int,
+                        default=config.IMPORT_BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', type=pathlib.Path, default=None,
+                        help='Directory for roll and database files')
+    parser.add_argument('--output', type=pathlib.Path, default=None,
+                        help='Write JSON report to file instead of stdout')
+    args = parser.parse_args()
+    report = run(args.voters, args.parties, args.writers, args.votes,
+                 args.samples, args.batch_size, args.seed, args.dir)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import hashlib
+import math
+import os
+import pathlib
+import sqlite3
+import struct
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import electionday.config as config
+import electionday.database as db
+
+
+MAGIC: bytes = b'EDBLOOM1'
+# Magic, number of bits and number of hash functions, followed by the
+#   bit array.
+HEADER = struct.Struct('=8sqq')
+
+# Filter file identity (inode, mtime, size) when it was loaded.
+Signature = Tuple[int, int, int]
+
+_filters: Dict[Any, Tuple[Optional[Signature],
+                          Optional['BloomFilter']]] = {}
+_lock = threading.Lock()
+
+
+class BloomFilter:
+    """Bit array answering "definitely not added" or "maybe added".
+
+    Each item sets hashes bits, derived from one 128-bit BLAKE2b digest
+      by double hashing. An item with any of its bits clear was never
+      added, so lookups never miss an added item and cost the same
+      however many items there are.
+    """
+
+    def __init__(self, size: int, hashes: int,
+                 bits: Optional[bytearray] = None):
+        self.size: int = max(int(size), 8)
+        self.hashes: int = max(int(hashes), 1)
+        self.bits = bytearray((self.size + 7) // 8) if bits is None else bits
+
+    @classmethod
+    def for_capacity(cls, capacity: int,
+                     false_positive_rate: float = (
+                         config.BLOOM_FALSE_POSITIVE_RATE),
+                     ) -> 'BloomFilter':
+        """Create a filter sized for capacity items.
+
+        Args:
+            capacity (int): Expected number of items
+            false_positive_rate (float, optional): Chance a missing item
+              is reported as maybe added, at capacity.
+              Defaults to config.BLOOM_FALSE_POSITIVE_RATE.
+
+        Returns:
+            BloomFilter: Empty filter
+        """
+        capacity = max(int(capacity), 1)
+        size: int = math.ceil(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        hashes: int = round(size / capacity * math.log(2))
+        return cls(size, hashes)
+
+    def _hash(self, item: Any) -> Tuple[int, int]:
+        digest: int = int.from_bytes(hashlib.blake2b(
+            str(item).encode(), digest_size=16).digest(), 'little')
+        return digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+
+    def add(self, item: Any) -> None:
+        position, step = self._hash(item)
+        bits, size = self.bits, self.size
+        for _ in range(self.hashes):
+            bit: int = position % size
+            bits[bit >> 3] |= 1 << (bit & 7)
+            position += step
+
+    def update(self, items: Iterable[Any]) -> None:
+        for item in items:
+            self.add(item)
+
+    def saturated(self) -> bool:
+        """True once more than half the bits are set.
+
+        A filter sized by for_capacity is half set at capacity, past that
+          more unknown items get through than it was sized for.
+        """
+        set_bits: int = bin(int.from_bytes(self.bits, 'little')).count('1')
+        return set_bits * 2 > self.size
+
+    def __contains__(self, item: Any) -> bool:
+        position, step = self._hash(item)
+        bits, size = self.bits, self.size
+        for _ in range(self.hashes):
+            bit: int = position % size
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+            position += step
+        return True
+
+    def save(self, path: Any) -> None:
+        """Write filter to path, atomically replacing any previous file."""
+        path = pathlib.Path(path)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.size, self.hashes))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Any) -> 'BloomFilter':
+        """Read filter written by save.
+
+        Raises:
+            ValueError: File is not a Bloom filter
+        """
+        data: bytes = pathlib.Path(path).read_bytes()
+        magic, size, hashes = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f'Not a Bloom filter: {path}')
+        return cls(size, hashes, bytearray(data[HEADER.size:]))
+
+
+def filter_path(path: Any) -> Optional[pathlib.Path]:
+    """Voter ID filter file of a database, None for in-memory ones."""
+    if str(path) == ':memory:':
+        return None
+    return pathlib.Path(path).with_suffix(config.BLOOM_SUFFIX)
+
+
+def _signature(file_path: pathlib.Path) -> Optional[Signature]:
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def current() -> Optional[BloomFilter]:
+    """Voter ID filter of the database used by the decorators.
+
+    Loaded once per process and loaded again when the file has been
+      replaced since, e.g. rebuilt by an import or sync in another
+      process, which costs a stat per call. None if it hasn't been
+      built.
+    """
+    path = db.get_provider().path
+    file_path: Optional[pathlib.Path] = filter_path(path)
+    if file_path is None:
+        return None
+    signature: Optional[Signature] = _signature(file_path)
+    cached = _filters.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with _lock:
+        cached = _filters.get(path)
+        if cached is None or cached[0] != signature:
+            try:
+                voter_ids: Optional[BloomFilter] = (
+                    BloomFilter.load(file_path) if signature else None)
+            except FileNotFoundError:
+                # Removed since the stat, checked again on next call.
+                signature, voter_ids = None, None
+            cached = _filters[path] = signature, voter_ids
+        return cached[1]
+
+
+def might_be_registered(voter_id: str) -> bool:
+    """False if voter_id is certainly not registered, without a query."""
+    voter_ids: Optional[BloomFilter] = current()
+    return voter_ids is None or voter_id in voter_ids
+
+
+def _file_path(cursor: sqlite3.Cursor) -> Optional[pathlib.Path]:
+    # Main database file of the cursor, empty for in-memory databases.
+    path: str = cursor.execute('PRAGMA database_list').fetchone()[2]
+    return filter_path(path) if path else None
+
+
+def saved(cursor: sqlite3.Cursor) -> Optional[BloomFilter]:
+    """Voter ID filter saved for the cursor's database, None if none."""
+    file_path: Optional[pathlib.Path] = _file_path(cursor)
+    if file_path is None:
+        return None
+    try:
+        return BloomFilter.load(file_path)
+    except FileNotFoundError:
+        return None
+
+
+def store(cursor: sqlite3.Cursor,
+          voter_ids: BloomFilter) -> Optional[BloomFilter]:
+    """Save voter_ids as the filter of the cursor's database.
+
+    A saturated filter is removed instead, lookups query the database
+      until build sizes a new one for all voters.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        voter_ids (BloomFilter): Filter from saved with voter IDs added
+
+    Returns:
+        Optional[BloomFilter]: Filter, None if removed
+    """
+    file_path: Optional[pathlib.Path] = _file_path(cursor)
+    if file_path is None:
+        return None
+    if voter_ids.saturated():
+        file_path.unlink(missing_ok=True)
+        return None
+    voter_ids.save(file_path)
+    return voter_ids
+
+
+def add(cursor: sqlite3.Cursor,
+        voter_ids: Iterable[str]) -> Optional[BloomFilter]:
+    """Add voter IDs to the saved filter of the cursor's database.
+
+    Nothing is done without a saved filter, a saturated one is built
+      again, see store.
+
+    Returns:
+        Optional[BloomFilter]: Filter, None if there is none
+    """
+    saved_ids: Optional[BloomFilter] = saved(cursor)
+    if saved_ids is None:
+        return None
+    saved_ids.update(voter_ids)
+    return store(cursor, saved_ids) or build(cursor)
+
+
+def build(cursor: sqlite3.Cursor,
+          false_positive_rate: float = config.BLOOM_FALSE_POSITIVE_RATE,
+          ) -> Optional[BloomFilter]:
+    """Build and save the voter ID filter of the cursor's database.
+
+    Sized for config.BLOOM_HEADROOM more voters than registered, which
+      store adds without a rebuild.
+
+    Run inside the import transaction, a rolled back import leaves extra
+      voter IDs in the filter, which only costs a query.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        false_positive_rate (float, optional): Chance an unknown voter ID
+          gets past the filter.
+          Defaults to config.BLOOM_FALSE_POSITIVE_RATE.
+
+    Returns:
+        Optional[BloomFilter]: Filter, None for in-memory databases
+    """
+    file_path: Optional[pathlib.Path] = _file_path(cursor)
+    if file_path is None:
+        return None
+    count: int = cursor.execute('SELECT COUNT(*) FROM voters').fetchone()[0]
+    voter_ids = BloomFilter.for_capacity(
+        count * (1 + config.BLOOM_HEADROOM), false_positive_rate)
+    query: str = 'SELECT voter_id FROM voters'
+    voter_ids.update(voter_id for voter_id, in cursor.execute(query))
+    voter_ids.save(file_path)
+    with _lock:
+        # Cached per provider path, reloaded on next use.
+        _filters.clear()
+    return voter_ids
+
+
+@db.connect_with_cursor
+def rebuild(cursor: sqlite3.Cursor) -> Optional[BloomFilter]:
+    """Build the filter of the database used by the decorators, see build.
+
+    Run once all voters are imported, an import only adds to an existing
+      filter, see voter.populate_table.
+    """
+    return build(cursor)
@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+import weakref
+
+import electionday.database as db
+from electionday.party import PartyRecord
+import electionday.storage as storage
+
+
+@db.connect_with_cursor
+def _load(cursor: sqlite3.Cursor) -> Tuple[Tuple[PartyRecord, ...], int]:
+    """Read the party list and its version from one snapshot.
+
+    Args:
+        cursor (sqlite3.Cursor): Passed via decorator
+
+    Returns:
+        Tuple[Tuple[PartyRecord, ...], int]: Parties ordered by name with
+          selectors, and catalog version
+    """
+    cursor.execute('BEGIN')
+    version: int = _version(cursor)
+    query: str = 'SELECT id, name, symbol FROM parties ORDER BY name ASC'
+    parties: Tuple[PartyRecord, ...] = tuple(
+        PartyRecord(_id, name, symbol, str(i+1))
+        for i, (_id, name, symbol) in enumerate(cursor.execute(query)))
+    return parties, version
+
+
+def _version(cursor: sqlite3.Cursor) -> int:
+    query: str = 'SELECT version FROM parties_version'
+    return cursor.execute(query).fetchone()[0]
+
+
+def _from_storage(engine: storage.Storage) -> Tuple[PartyRecord, ...]:
+    """Party list of a storage engine keeping its own parties, e.g. the
+      in-memory engine, whose party IDs need not match the database."""
+    return tuple(PartyRecord(party._id, party.name, party.symbol, str(i+1))
+                 for i, party in enumerate(engine.select_all()))
+
+
+# Parties ordered by name, and the same by selector and by ID.
+Listing = Tuple[Tuple[PartyRecord, ...], Dict[str, PartyRecord],
+                Dict[int, PartyRecord]]
+
+
+def _listing(parties: Tuple[PartyRecord, ...]) -> Listing:
+    return (parties, {party.selector: party for party in parties},
+            {party._id: party for party in parties})
+
+
+@db.connect_with_cursor
+def _current_version(cursor: sqlite3.Cursor) -> int:
+    return _version(cursor)
+
+
+class PartyCatalog:
+    """In-memory party list with lookup by selector and ID.
+
+    Loaded once and shared by all voting sessions. Parties rarely change
+      during an election, so a lookup only checks PRAGMA data_version,
+      and when another connection has committed, the catalog version
+      kept by triggers on the parties table. Ballots and vote folds
+      don't change that version and never cause a reload.
+
+    With a storage engine other than SQLite, lookups use that engine's
+      parties instead, see storage module. They are fixed once the
+      engine is set up and read once per engine.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._provider: Optional[db.ConnectionProvider] = None
+        self._parties: Tuple[PartyRecord, ...] = ()
+        self._by_selector: Dict[str, PartyRecord] = {}
+        self._by_id: Dict[int, PartyRecord] = {}
+        self.version: int = -1
+        # Listing by storage engine, dropped with the engine.
+        self._engines: weakref.WeakKeyDictionary = (
+            weakref.WeakKeyDictionary())
+
+    def invalidate(self) -> None:
+        """Drop cached parties, next lookup reloads from database."""
+        with self._lock:
+            self._provider = None
+            self.version = -1
+            self._engines.clear()
+
+    def _engine_listing(self, engine: storage.Storage) -> Listing:
+        listing: Optional[Listing] = self._engines.get(engine)
+        if listing is None:
+            listing = _listing(_from_storage(engine))
+            if listing[0]:
+                # Not before the engine has parties, e.g. unpopulated
+                #   shards.
+                with self._lock:
+                    self._engines[engine] = listing
+        return listing
+
+    def _data_version(self) -> int:
+        return db.get_connection().execute(
+            'PRAGMA data_version').fetchone()[0]
+
+    def _reload(self) -> None:
+        self._provider = db.get_provider()
+        self._local.data_version = self._data_version()
+        parties, version = _load()
+        self._parties, self._by_selector, self._by_id = _listing(parties)
+        self.version = version
+
+    def _is_stale(self) -> bool:
+        if self.version < 0 or self._provider is not db.get_provider():
+            return True
+        data_version: int = self._data_version()
+        if getattr(self._local, 'data_version', None) == data_version:
+            return False
+        self._local.data_version = data_version
+        return _current_version() != self.version
+
+    def _validate(self) -> None:
+        with self._lock:
+            if self._is_stale():
+                self._reload()
+
+    def parties(self) -> Sequence[PartyRecord]:
+        """Get parties ordered by name, same order as party.select_all.
+
+        Returns:
+            Sequence[PartyRecord]: Parties with selectors
+        """
+        engine: storage.Storage = storage.get_storage()
+        if engine.routed:
+            return self._engine_listing(engine)[0]
+        self._validate()
+        return self._parties
+
+    def by_selector(self, selector: str) -> Optional[PartyRecord]:
+        """Get party by menu selector.
+
+        Args:
+            selector (str): Selector shown next to the party name
+
+        Returns:
+            Optional[PartyRecord]: Party if selector is valid
+        """
+        engine: storage.Storage = storage.get_storage()
+        if engine.routed:
+            return self._engine_listing(engine)[1].get(selector)
+        self._validate()
+        return self._by_selector.get(selector)
+
+    def by_id(self, _id: int) -> Optional[PartyRecord]:
+        """Get party by database ID.
+
+        Args:
+            _id (int): Party ID
+
+        Returns:
+            Optional[PartyRecord]: Party if it exists
+        """
+        engine: storage.Storage = storage.get_storage()
+        if engine.routed:
+            return self._engine_listing(engine)[2].get(_id)
+        self._validate()
+        return self._by_id.get(_id)
+
+
+# Shared catalog for voting screens and the API.
+CATALOG: PartyCatalog = PartyCatalog()
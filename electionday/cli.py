@@ -0,0 +1,258 @@
+from getpass import getpass
+import sys
+
+import click
+from colorama import Back, Fore, Style
+
+import electionday.catalog as catalog
+import electionday.config as config
+import electionday.district as district
+import electionday.screen as screen_model
+import electionday.voter as voter_model
+import electionday.database as db
+import electionday.metrics as metrics
+import electionday.party as party_model
+import electionday.replica as replica
+import electionday.results as results
+import electionday.voting as voting
+
+
+# Use UI menu.
+menu = config.MENU
+# All output goes through one buffered screen, flushed before input.
+screen = screen_model.Screen(padding=2)
+
+
+@click.command()
+@click.option('-o', '--option', default='',
+              help=f'Menu option selector ('
+              f"{', '.join(selector for  selector in menu.selectors)})")
+@click.option('-n', '--name', default='', help='Name of voter')
+@click.option('-d', '--district', 'district_name', default='',
+              help='Show results of this district or region')
+def main(option: str, name: str, district_name: str):
+    """Python voting system prototype
+
+    Login to vote on a party and view current results.
+    To vote you must be a registered voter and enter your name and voter ID.
+
+    You can run the application with or without any options.
+    Any option values will be reset inside the program loop after first iteration,
+    except the results district.
+    """
+    error_msg: str = ''
+    selected_option: str = ''
+    user_name: str = ''
+    screen_model.enable_ansi()
+    if config.DB_METRICS_PATH:
+        metrics.enable()
+    if config.REPLICA_READS:
+        replica.start()
+    try:
+        while True:
+            clear()
+            header('MAIN MENU')
+            screen.write(f'{menu.layout}\n\n')
+            if error_msg:
+                screen.line(error_msg, Fore.RED, Style.RESET_ALL)
+                screen.write('\n')
+                error_msg = ''
+            if option:
+                selected_option = option
+            else:
+                selected_option = get_option()
+            if selected_option not in menu.selectors:
+                error_msg = (f'Invalid selector ({selected_option}), please try'
+                            ' again.')
+                option = ''
+
+            elif selected_option == '3':
+                # Break out of loop to exit program.
+                break
+
+            elif selected_option == '1':
+                # Prompt user for name and voter ID.
+                if not name:
+                    user_name = prompt('Name: ')
+                else:
+                    user_name = name
+                screen.flush()
+                voter_id: str = getpass(pad('Voter ID: '))
+
+                # Validate user and check if voter has voted.
+                valid_voter = voter_model.authenticate(user_name, voter_id)
+                if isinstance(valid_voter, voter_model.AuthFailure):
+                    error_msg = valid_voter.message
+                    name, option = '', ''
+                    continue
+
+                clear()
+                # Display parties without votes.
+                parties = catalog.CATALOG.parties()
+                header('CAST VOTE')
+                for i, party in enumerate(parties):
+                    COLOR = Fore.CYAN if i % 2 == 0 else Fore.GREEN
+                    screen.line(f'{party.selector}  {party.name}', COLOR)
+                screen.write(f'{Style.RESET_ALL}\n')
+                while True:
+                    screen.line('Select a party to cast your vote.')
+                    screen.line('Enter C to cancel.')
+                    selector: str = prompt('').lower()
+                    confirm_cancel: bool = False
+                    if selector == 'c':
+                        confirm_cancel = prompt('Return to menu? Y/n ').lower() == 'y'
+                    if confirm_cancel:
+                        break
+                    selected_party = catalog.CATALOG.by_selector(selector)
+                    if selector == 'c':
+                        # User has regretted cancelling and should be
+                        #   prompted to select a party without seeing
+                        #   invalid selection message.
+                        continue
+                    elif selected_party is None:
+                        screen.line('Invalid selection.', Fore.RED,
+                                    Style.RESET_ALL)
+                        continue
+                    screen.line(
+                        f'You have selected: {selected_party.name.upper()}')
+                    confirm_selection: bool = prompt('Confirm vote? Y/n ').lower()
+                    if confirm_selection != 'y':
+                        continue
+                    break
+                if confirm_cancel:
+                    continue
+                try:
+                    voting.cast_vote(voter=valid_voter, party=selected_party)
+                except voter_model.AlreadyVotedError:
+                    error_msg = 'You have already voted.'
+                    name, option = '', ''
+                    continue
+                screen.line('Thank you for voting!')
+                screen.line(f'Use password "{config.PASSWORD}" to access'
+                            ' current results.')
+                screen.write('\n')
+                name, option = '', ''
+                go_back()
+
+            elif selected_option == '2':
+                # Prompt voter for password.
+                screen.flush()
+                password = getpass(pad('Enter password to view results: '))
+                if password != config.PASSWORD:
+                    error_msg = 'Invalid password.'
+                    option = ''
+                    continue
+                if district_name:
+                    scope = district.find_scope(district_name)
+                    if scope is None:
+                        error_msg = f'Unknown district or region: {district_name}'
+                        option = ''
+                        continue
+                    parties = party_model.select_results(scope)
+                    winning_parties = party_model.select_winners(scope)
+                    title = f'CURRENT RESULTS: {scope.name.upper()}'
+                else:
+                    parties = results.CACHE.results()
+                    winning_parties = results.CACHE.winners()
+                    title = 'CURRENT RESULTS'
+                clear()
+
+                header(title)
+                for i, party in enumerate(parties):
+                    COLOR = Fore.CYAN if i % 2 == 0 else Fore.GREEN
+                    screen.line(f'Votes: {party.votes}  {party.name}', COLOR)
+                screen.write(f'{Style.RESET_ALL}\n')
+                if winning_parties[0].votes:
+                    screen.line('Winning'
+                            f" part{'y' if len(winning_parties) == 1 else 'ies'}:"
+                            f" {', '.join(party.name for party in winning_parties)}")
+                else:
+                   screen.line('No votes')
+                screen.write('\n')
+                go_back()
+                password = ''
+                option = ''
+        exit_program()
+    except Exception as e:
+        print(repr(e))
+        raise e
+    except KeyboardInterrupt:
+        exit_program()
+
+
+def pad(string: str) -> str:
+    """Pad string with blank spaces.
+
+    Args:
+        string (str): String to pad
+
+    Returns:
+        str: Padded string
+    """
+    return screen.pad(string)
+
+
+def clear() -> None:
+    """Start a new screen, cleared with ANSI escapes when flushed."""
+    screen.clear()
+
+
+def prompt(string: str) -> str:
+    """Wrapper for padded input prompt.
+
+    Args:
+        string (str): Input message
+
+    Pending screen output is written first, in one call.
+
+    Returns:
+        string (str): User input value
+    """
+    screen.flush()
+    return input(pad(string))
+
+
+def go_back() -> None:
+    """Prompt user to return to main menu.
+
+    Temporarily halts program loop to keep any previously output data
+      visible until user chooses to return to menu.
+
+    Returns:
+        None
+    """
+    prompt('Back to main menu >')
+
+
+def get_option() -> str:
+    """Prompt user to select a menu option.
+
+    Returns:
+        str: Selected option selector
+    """
+    return prompt('Select menu option: ')
+
+
+def header(string: str) -> None:
+    """Wrapper function to add formatted header text to the screen."""
+    screen.header(string)
+
+
+def exit_program():
+    """Close database connection and exit program via sys.exit().
+
+    Metrics are written to config.DB_METRICS_PATH, if set.
+    """
+    screen.write('\n\n')
+    screen.line('Goodbye')
+    screen.write('\n')
+    screen.flush()
+    if config.DB_METRICS_PATH:
+        metrics.REGISTRY.write(config.DB_METRICS_PATH)
+    replica.stop()
+    db.close()
+    sys.exit()
+
+
+if __name__ == '__main__':
+    main()
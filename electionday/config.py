@@ -1,17 +1,9 @@
-import environs
 import pathlib
-
-import electionday.navigation as navigation
+from typing import Any, Optional
 
 
 ENCODING: str = 'utf-16'
 
-# Read environment variables.
-env: environs.Env = environs.Env()
-env.read_env()
-
-PASSWORD: str = env.str('PASSWORD')
-
 # App Name.
 APP_NAME: str = 'ElectionDay'
 APP_SLUG: str = APP_NAME.replace(' ', '_').lower()
@@ -23,10 +15,134 @@ DATA_DIR_PATH: pathlib.Path = BASE_PATH.joinpath('data')
 DATA_PATH: pathlib.Path = DATA_DIR_PATH.joinpath('data.json')
 DB_PATH: pathlib.Path = DATA_DIR_PATH.joinpath(f'{APP_SLUG}.db')
 
+# Storage engine behind the model functions, 'sqlite' or 'memory' (not
+#   persisted, loaded from DATA_PATH). See storage module.
+STORAGE_ENGINE: str = 'sqlite'
+
+# Database connections.
+DB_JOURNAL_MODE: str = 'WAL'
+DB_SYNCHRONOUS: str = 'NORMAL'
+# Milliseconds to wait for a lock before raising "database is locked".
+DB_BUSY_TIMEOUT: int = 5_000
+DB_MMAP_SIZE: int = 256 * 1024 * 1024
+# Instrument the database decorators and dump metrics to this file
+#   (.json or Prometheus text), None to disable. See metrics module.
+DB_METRICS_PATH: Optional[pathlib.Path] = None
+DB_METRICS_INTERVAL: float = 10.0
+# Statements taking at least this many milliseconds are logged with
+#   their SQL text, the most recent DB_SLOW_QUERY_LIMIT are kept.
+DB_SLOW_QUERY_MS: float = 50.0
+DB_SLOW_QUERY_LIMIT: int = 100
+
+# Read replica: with REPLICA_READS the CLI and server publish a
+#   snapshot of the database every REPLICA_INTERVAL seconds, stored next
+#   to it with REPLICA_SUFFIX, and read-only model functions read the
+#   newest one unless it is older than REPLICA_MAX_STALENESS seconds.
+#   See replica module.
+REPLICA_READS: bool = False
+REPLICA_SUFFIX: str = '.replica'
+REPLICA_INTERVAL: float = 5.0
+REPLICA_MAX_STALENESS: float = 30.0
+
+# Voter registry shards, 0 keeps all voters in DB_PATH. When set, the
+#   sqlite storage engine uses the shard databases. See shard module.
+SHARD_COUNT: int = 0
+
+# Recount: ballot/voter rows counted per worker task.
+RECOUNT_CHUNK_SIZE: int = 1_000_000
+
+# Voter roll import.
+IMPORT_BATCH_SIZE: int = 10_000
+
+# Schema migrations: rows copied per transaction and seconds to pause
+#   between transactions so terminals get the write lock. See migrate
+#   module.
+MIGRATION_BATCH_SIZE: int = 10_000
+MIGRATION_PAUSE: float = 0.005
+
+# Eligibility index (voter ID table and has_voted bitmap), stored next
+#   to each database file with this suffix. See eligibility module.
+ELIGIBILITY_SUFFIX: str = '.idx'
+
+# Bloom filter of registered voter IDs, stored next to each database
+#   file. Sized for this share more voters than registered, so imports
+#   and syncs add voter IDs to it, and rebuilt by setup once it has no
+#   room left. See bloom module.
+BLOOM_SUFFIX: str = '.bloom'
+BLOOM_FALSE_POSITIVE_RATE: float = 0.01
+BLOOM_HEADROOM: float = 0.5
+
+# Ballot journal, appended and fsynced after each commit before the
+#   ballot is acknowledged, and stored next to each database file with
+#   this suffix. See journal module.
+JOURNAL_ENABLED: bool = True
+JOURNAL_SUFFIX: str = '.ballots'
+
+# Ballots appended between folds into the party vote totals.
+BALLOT_FOLD_INTERVAL: int = 1_000
+
+# Ranked ballots: longest preference list accepted. See ranked module.
+RANKED_MAX_PREFERENCES: int = 64
+
+# Group commit: ballots per transaction and seconds to wait for more.
+#   With no delay a batch is whatever queued up while the previous
+#   batch was committing.
+WRITER_BATCH_SIZE: int = 256
+WRITER_MAX_DELAY: float = 0.0
+
+# HTTP/JSON API server.
+SERVER_HOST: str = '127.0.0.1'
+SERVER_PORT: int = 8080
+SERVER_BACKLOG: int = 1024
+SERVER_READ_WORKERS: int = 8
+
+# Kiosk server for line-protocol terminals, see kiosk module. Sessions
+#   idle for KIOSK_IDLE_TIMEOUT seconds are disconnected.
+KIOSK_HOST: str = '127.0.0.1'
+KIOSK_PORT: int = 8023
+KIOSK_WORKERS: int = 8
+KIOSK_MAX_SESSIONS: int = 1_000
+KIOSK_IDLE_TIMEOUT: float = 300.0
+
+# Live results feed: versions kept for deltas (older subscribers get a
+#   full update), longest long-poll wait in seconds, and how often the
+#   server checks for votes from other processes while anyone is
+#   subscribed. See feed module.
+RESULTS_FEED_HISTORY: int = 1_000
+RESULTS_POLL_TIMEOUT: float = 30.0
+RESULTS_CHECK_INTERVAL: float = 1.0
+
+# Milliseconds allowed to import the CLI in a fresh interpreter, see the
+#   startup module.
+STARTUP_BUDGET_MS: int = 150
+
 # Menu.
 options = ['Login & Vote', 'View Results', 'Quit']
 selectors = [1, 2, 3]
-MENU: navigation.Menu = navigation.Menu(
-    options, selectors, selector_padding=2, selector_punctuation='.',
-    left_padding=2,
-)
+
+
+def __getattr__(name: str) -> Any:
+    """Load settings that need I/O or heavy imports on first access.
+
+    PASSWORD is read from the environment (and .env file) with environs
+      and MENU is built from the options above. Each value is cached as
+      a module attribute so this only runs once per name.
+
+    Raises:
+        AttributeError: Unknown setting
+    """
+    if name == 'PASSWORD':
+        import environs
+        env: environs.Env = environs.Env()
+        env.read_env()
+        value: Any = env.str('PASSWORD')
+    elif name == 'MENU':
+        import electionday.navigation as navigation
+        value = navigation.Menu(
+            options, selectors, selector_padding=2, selector_punctuation='.',
+            left_padding=2,
+        )
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
@@ -1,32 +1,266 @@
+import contextlib
+import contextvars
+import functools
 import json
 import sqlite3
-from typing import Any, Callable, Generic, Optional, Sequence
+import threading
+from typing import Any, Callable, Generic, Iterator, List, Optional, Sequence
+import weakref
 
 import electionday.config as config
 
 
-# Create database connection.
-try:
-    CONNECTION: sqlite3.Connection = sqlite3.connect(config.DB_PATH)
-except sqlite3.Error as e:
-    print(repr(e))
-    raise e
+class _ThreadExit:
+    """Kept in a thread's locals only, collected when the thread exits.
+    """
+
+
+class ConnectionProvider:
+    """Lazily opened SQLite connections, one per thread.
+
+    Connections are opened on first use in each thread and configured
+      with the journal mode, synchronous level, busy timeout and mmap
+      size given to the constructor. In WAL mode readers don't block the
+      writer and vice versa, so many terminals can share one database
+      file, and writers wait up to busy_timeout for the write lock rather
+      than failing with "database is locked". A thread's connection is
+      closed when the thread exits, the rest by close.
+    """
+
+    def __init__(self,
+                 path: Any = None,
+                 journal_mode: str = config.DB_JOURNAL_MODE,
+                 synchronous: str = config.DB_SYNCHRONOUS,
+                 busy_timeout: int = config.DB_BUSY_TIMEOUT,
+                 mmap_size: int = config.DB_MMAP_SIZE,
+    ):
+        self.path = config.DB_PATH if path is None else path
+        self.journal_mode: str = journal_mode
+        self.synchronous: str = synchronous
+        self.busy_timeout: int = int(busy_timeout)
+        self.mmap_size: int = int(mmap_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection for the calling thread, opened on first access."""
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, 'connection', None)
+        if connection is None:
+            connection = self.open()
+            self._local.connection = connection
+            self._local.exit = _ThreadExit()
+            weakref.finalize(self._local.exit, self._release, connection)
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _release(self, connection: sqlite3.Connection) -> None:
+        """Close the connection of a thread that has exited."""
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        connection.close()
+
+    def open(self) -> sqlite3.Connection:
+        """Open and configure a new connection.
+
+        Raises:
+            sqlite3.Error: Database exception
+
+        Returns:
+            sqlite3.Connection: New connection, not tracked by provider
+        """
+        try:
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout / 1000,
+                check_same_thread=False)
+            connection.execute(f'PRAGMA busy_timeout = {self.busy_timeout}')
+            connection.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+            connection.execute(f'PRAGMA synchronous = {self.synchronous}')
+            connection.execute(f'PRAGMA mmap_size = {self.mmap_size}')
+        except sqlite3.Error as e:
+            print(repr(e))
+            raise e
+        return connection
+
+    def close(self) -> None:
+        """Close all connections opened by provider, in any thread."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+_provider: Optional[ConnectionProvider] = None
+_provider_lock = threading.Lock()
+# Provider temporarily used instead of the configured one, see using.
+_override: contextvars.ContextVar = contextvars.ContextVar(
+    'provider', default=None)
+# Hooks called around every decorated function, see set_instrumentation.
+_instrumentation: Optional[Any] = None
+# Returns provider for functions decorated with read_only, see
+#   set_read_provider.
+_read_provider: Optional[Callable[[], Optional['ConnectionProvider']]] = None
+
+
+def configure(path: Any = None, **options) -> ConnectionProvider:
+    """Replace the connection provider used by the decorators.
+
+    Connections of the previous provider are closed.
+
+    Args:
+        path (Any, optional): Database path. Defaults to None, the path
+          in the config module.
+        **options: Other ConnectionProvider arguments
+
+    Returns:
+        ConnectionProvider: New provider
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is not None:
+            _provider.close()
+        _provider = ConnectionProvider(path, **options)
+        return _provider
+
+
+def get_provider() -> ConnectionProvider:
+    """Get connection provider, created from config on first call.
+
+    Returns:
+        ConnectionProvider: Provider set by using, if any, otherwise the
+          configured provider
+    """
+    global _provider
+    override: Optional[ConnectionProvider] = _override.get()
+    if override is not None:
+        return override
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = ConnectionProvider()
+    return _provider
+
+
+@contextlib.contextmanager
+def using(provider: ConnectionProvider) -> Iterator[ConnectionProvider]:
+    """Context manager routing decorated functions called in the block,
+      in the current thread or task, to another provider.
+
+    Args:
+        provider (ConnectionProvider): Provider to use
+
+    Yields:
+        ConnectionProvider: The provider
+    """
+    token = _override.set(provider)
+    try:
+        yield provider
+    finally:
+        _override.reset(token)
+
+
+def get_connection() -> sqlite3.Connection:
+    """Get connection of the current provider for the calling thread.
+
+    Returns:
+        sqlite3.Connection: Database connection
+    """
+    return get_provider().connection
+
+
+def close() -> None:
+    """Close all connections of the current provider."""
+    if _provider is not None:
+        _provider.close()
+
+
+def set_instrumentation(instrumentation: Optional[Any]) -> None:
+    """Instrument calls of functions decorated with connect and
+      connect_with_cursor.
+
+    The decorators call instrumentation.start(name, connection) before
+      the decorated function and instrumentation.finish(call,
+      connection, failed) with start's return value once the
+      transaction has been committed or rolled back. See
+      metrics.Registry.
+
+    Args:
+        instrumentation (Optional[Any]): Hooks, None to remove them
+    """
+    global _instrumentation
+    _instrumentation = instrumentation
+
+
+def get_instrumentation() -> Optional[Any]:
+    """Get hooks installed with set_instrumentation, if any."""
+    return _instrumentation
+
+
+def set_read_provider(
+        read_provider: Optional[Callable[[], Optional[ConnectionProvider]]]
+) -> None:
+    """Send functions decorated with read_only to another database,
+      e.g. a read replica, see replica module.
+
+    Args:
+        read_provider (Optional[Callable[[], Optional[
+          ConnectionProvider]]]): Called on every read-only call, returns
+          the provider to read from or None for the current one. None to
+          read the current provider again.
+    """
+    global _read_provider
+    _read_provider = read_provider
+
+
+def read_only(fn: Callable) -> Callable:
+    """Decorator marking a function decorated with connect or
+      connect_with_cursor as read-only, so it can be served from a read
+      replica, see set_read_provider.
+
+    Calls inside a using block keep the provider set there.
+
+    Args:
+        fn (Callable): Decorated function
+
+    Returns:
+        Callable: Decorator wrapper function
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs) -> Any:
+        read_provider = _read_provider
+        if read_provider is None or _override.get() is not None:
+            return fn(*args, **kwargs)
+        provider: Optional[ConnectionProvider] = read_provider()
+        if provider is None:
+            return fn(*args, **kwargs)
+        with using(provider):
+            return fn(*args, **kwargs)
+    # __wrapped__ is the undecorated function, like the other decorators.
+    wrapper.__wrapped__ = getattr(fn, '__wrapped__', fn)
+    return wrapper
+
+
+def _function_name(fn: Callable) -> str:
+    return f"{fn.__module__.rpartition('.')[2]}.{fn.__qualname__}"
 
 
 def connect(fn: Callable) -> Callable:
     """Decorator to create and close connection while passing the
       connection to the decorated function.
 
-    Creates connection using db path in the config module by default.
+    Uses the calling thread's connection from the connection provider,
+      see configure to use another database path.
 
     Pass connection rather than cursor; Enables decorated function to
       use commit etc and can choose not to create an explicit cursor.
       However if a cursor is created, it needs to be closed inside the
       decorated function.
 
-    Could take database path as argument, might be merit to do so for
-      soliciting testing.
-
     Args:
         fn (Callable): Decorated function
 
@@ -37,6 +271,7 @@ def connect(fn: Callable) -> Callable:
     Returns:
         Callable: Decorator wrapper function
     """
+    @functools.wraps(fn)
     def wrapper(*args, **kwargs) -> Any:
         """Decorator wrapper function.
 
@@ -49,20 +284,30 @@ def connect(fn: Callable) -> Callable:
         Returns:
             Any: Query result, if any, or None
         """
-        connection: optional[sqlit3.Connection] = None
+        connection: sqlite3.Connection = get_connection()
+        instrumentation: Optional[Any] = _instrumentation
+        call: Any = (instrumentation.start(name, connection)
+                     if instrumentation is not None else None)
+        failed: bool = False
         try:
-            with CONNECTION as connection:
+            with connection:
                 if args:
                     args = (connection, *args)
                 else:
                     kwargs['connection'] = connection
                 return fn(*args, **kwargs)
         except sqlite3.Error as e:
+            failed = True
             print(repr(e))
             raise e
         except Exception as e:
+            failed = True
             print(repr(e))
             raise e
+        finally:
+            if instrumentation is not None:
+                instrumentation.finish(call, connection, failed)
+    name: str = _function_name(fn)
     return wrapper
 
 
@@ -70,19 +315,18 @@ def connect_with_cursor(fn: Callable):
     """Decorator to create and close connection while passing the
       connection cursor to the decorated function.
 
-    Creates connection using db path in the config module by default.
+    Uses the calling thread's connection from the connection provider,
+      see configure to use another database path.
 
     Pass connection rather than cursor; Enables decorated function to
       use commit etc and can choose not to create an explicit cursor.
       However if a cursor is created, it needs to be closed inside the
       decorated function.
 
-    Could take database path as argument, might be merit to do so for
-      soliciting testing.
-
     Args:
         fn (Callable): Decorated function
     """
+    @functools.wraps(fn)
     def wrapper(*args, **kwargs) -> Any:
         """Decorator wrapper function.
 
@@ -94,8 +338,13 @@ def connect_with_cursor(fn: Callable):
             Any: Query result, if any, or None
         """
         cursor: Optional[sqlite3.Cursor] = None
+        connection: sqlite3.Connection = get_connection()
+        instrumentation: Optional[Any] = _instrumentation
+        call: Any = (instrumentation.start(name, connection)
+                     if instrumentation is not None else None)
+        failed: bool = False
         try:
-            with CONNECTION as connection:
+            with connection:
                 cursor = connection.cursor()
                 if args:
                     args = (cursor, *args)
@@ -103,17 +352,59 @@ def connect_with_cursor(fn: Callable):
                     kwargs['cursor'] = cursor
                 return fn(*args, **kwargs)
         except sqlite3.Error as e:
+            failed = True
             print(repr(e))
             raise e
         except Exception as e:
+            failed = True
             print(repr(e))
             raise e
         finally:
             if cursor:
                 cursor.close()
+            if instrumentation is not None:
+                instrumentation.finish(call, connection, failed)
+    name: str = _function_name(fn)
     return wrapper
 
 
+def table_options(*options: str) -> str:
+    """Table options for CREATE TABLE, with STRICT where supported.
+
+    STRICT tables need SQLite 3.37, older versions create the same
+      table with type affinity only.
+
+    Args:
+        *options (str): Other options, e.g. 'WITHOUT ROWID'
+
+    Returns:
+        str: Comma separated options, to follow the column definitions
+    """
+    if sqlite3.sqlite_version_info >= (3, 37, 0):
+        options = (*options, 'STRICT')
+    return ', '.join(options)
+
+
+def add_column(cursor: sqlite3.Cursor, table: str, column: str,
+               definition: str) -> bool:
+    """Add a column to a table created by an earlier version, if missing.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        table (str): Table name
+        column (str): Column name
+        definition (str): Column type and constraints
+
+    Returns:
+        bool: True if the column was added
+    """
+    columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    if column in columns:
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+
 @connect
 def create_tables(
     connection: sqlite3.Connection,
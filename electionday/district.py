@@ -0,0 +1,227 @@
+from dataclasses import dataclass
+import sqlite3
+from typing import Iterable, Optional, Sequence, Tuple
+
+import electionday.database as db
+import electionday.storage as storage
+
+
+NATIONAL: str = 'national'
+REGION: str = 'region'
+DISTRICT: str = 'district'
+
+
+@dataclass(frozen=True)
+class Scope:
+    """Level results are reported at, national or one region or district.
+    """
+    level: str = NATIONAL
+    _id: Optional[int] = None
+    name: str = ''
+
+
+def create_table(cursor: sqlite3.Cursor) -> None:
+    """Create regions, districts and their vote tallies if they don't
+      exist.
+
+    Tallies hold votes per party of each district and region up to the
+      ballot tally watermark, they are maintained by ballot.fold along
+      with the national party totals so no read has to aggregate raw
+      ballots beyond the ones not folded yet.
+
+    To be called from a create_tables function in setup, before the
+      ballots table is created.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+
+    Raises:
+        sqlite3.Error: SQLite exception
+        Exception: Generic exception
+    """
+    queries: tuple = (
+        '''CREATE TABLE IF NOT EXISTS regions(
+            id INTEGER PRIMARY KEY NOT NULL,
+            name VARCHAR(60) NOT NULL UNIQUE
+        )''',
+        '''CREATE TABLE IF NOT EXISTS districts(
+            id INTEGER PRIMARY KEY NOT NULL,
+            name VARCHAR(60) NOT NULL UNIQUE,
+            region_id INTEGER NOT NULL REFERENCES regions(id)
+        )''',
+        '''CREATE INDEX IF NOT EXISTS districts_region_id
+            ON districts(region_id)''',
+        '''CREATE TABLE IF NOT EXISTS district_tally(
+            district_id INTEGER NOT NULL REFERENCES districts(id),
+            party_id INTEGER NOT NULL REFERENCES parties(id),
+            votes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (district_id, party_id)
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS region_tally(
+            region_id INTEGER NOT NULL REFERENCES regions(id),
+            party_id INTEGER NOT NULL REFERENCES parties(id),
+            votes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (region_id, party_id)
+        ) WITHOUT ROWID''',
+    )
+    try:
+        for query in queries:
+            cursor.execute(query)
+    except sqlite3.OperationalError as e:
+        print(repr(e))
+        raise e
+    except Exception as e:
+        print(repr(e))
+        raise e
+
+
+def populate_table(cursor: sqlite3.Cursor,
+                   districts: Iterable[Sequence[str]]) -> None:
+    """Insert districts and their regions, skipping existing names.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        districts (Iterable[Sequence[str]]): (district, region) name
+          pairs, the "districts" array in the data file
+
+    Raises:
+        sqlite3.Error: SQLite exception
+        Exception: Generic exception
+    """
+    try:
+        for district_name, region_name in districts:
+            cursor.execute('INSERT OR IGNORE INTO regions(name) VALUES(?)',
+                           (region_name,))
+            cursor.execute('''INSERT OR IGNORE INTO districts(name, region_id)
+                SELECT ?, id FROM regions WHERE name = ?''',
+                           (district_name, region_name))
+    except sqlite3.Error as e:
+        print(repr(e))
+        raise e
+    except Exception as e:
+        print(repr(e))
+        raise e
+
+
+def fold(cursor: sqlite3.Cursor, folded: int, latest: int) -> None:
+    """Add ballots in (folded, latest] to the district and region
+      tallies, called by ballot.fold in the same transaction.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        folded (int): Current tally watermark
+        latest (int): ID of latest ballot to fold
+    """
+    params: dict = {'folded': folded, 'latest': latest}
+    cursor.execute('''INSERT INTO district_tally(district_id, party_id, votes)
+        SELECT district_id, party_id, COUNT(*) FROM ballots
+        WHERE id > :folded AND id <= :latest AND district_id IS NOT NULL
+        GROUP BY district_id, party_id
+        ON CONFLICT(district_id, party_id)
+        DO UPDATE SET votes = votes + excluded.votes''', params)
+    cursor.execute('''INSERT INTO region_tally(region_id, party_id, votes)
+        SELECT districts.region_id, ballots.party_id, COUNT(*)
+        FROM ballots JOIN districts ON districts.id = ballots.district_id
+        WHERE ballots.id > :folded AND ballots.id <= :latest
+        GROUP BY districts.region_id, ballots.party_id
+        ON CONFLICT(region_id, party_id)
+        DO UPDATE SET votes = votes + excluded.votes''', params)
+
+
+def reset(cursor: sqlite3.Cursor) -> None:
+    """Empty district and region tallies, e.g. before refolding all
+      ballots.
+    """
+    cursor.execute('DELETE FROM district_tally')
+    cursor.execute('DELETE FROM region_tally')
+
+
+def standings_query(scope: Optional[Scope]) -> Tuple[str, dict]:
+    """Query with the same columns as the standings view (id, name,
+      symbol, votes) for a scope.
+
+    Folded votes come from the scope's tally, one row per party, and
+      ballots after the tally watermark are counted on read, so the
+      cost depends on the number of parties and unfolded ballots, not
+      on the number of ballots cast.
+
+    Args:
+        scope (Optional[Scope]): Scope, None for national
+
+    Returns:
+        Tuple[str, dict]: Query and its parameters
+    """
+    if scope is None or scope.level == NATIONAL:
+        return 'SELECT id, name, symbol, votes FROM standings', {}
+    if scope.level == DISTRICT:
+        tally: str = '''SELECT party_id, votes FROM district_tally
+            WHERE district_id = :scope_id'''
+        pending: str = '''SELECT party_id, COUNT(*) AS votes FROM ballots
+            WHERE id > (SELECT folded_ballot_id FROM tally)
+            AND district_id = :scope_id
+            GROUP BY party_id'''
+    elif scope.level == REGION:
+        tally = '''SELECT party_id, votes FROM region_tally
+            WHERE region_id = :scope_id'''
+        pending = '''SELECT party_id, COUNT(*) AS votes
+            FROM ballots JOIN districts ON districts.id = ballots.district_id
+            WHERE ballots.id > (SELECT folded_ballot_id FROM tally)
+            AND districts.region_id = :scope_id
+            GROUP BY party_id'''
+    else:
+        raise ValueError(f'Unknown scope level: {scope.level}')
+    query: str = f'''WITH scope_tally AS ({tally}), pending AS ({pending})
+        SELECT parties.id AS id, name, symbol,
+            COALESCE(scope_tally.votes, 0) + COALESCE(pending.votes, 0)
+                AS votes
+        FROM parties
+        LEFT JOIN scope_tally ON scope_tally.party_id = parties.id
+        LEFT JOIN pending ON pending.party_id = parties.id'''
+    return query, {'scope_id': scope._id}
+
+
+@storage.routed
+@db.read_only
+@db.connect_with_cursor
+def find_scope(cursor: sqlite3.Cursor, name: str) -> Optional[Scope]:
+    """Look up a district, or else a region, by name (case-insensitive).
+
+    Args:
+        cursor (sqlite3.Cursor): Passed via decorator
+        name (str): District or region name
+
+    Returns:
+        Optional[Scope]: Scope, None if there's no such district or region
+    """
+    for level, table in ((DISTRICT, 'districts'), (REGION, 'regions')):
+        row = cursor.execute(
+            f'SELECT id, name FROM {table} WHERE name = ? COLLATE NOCASE',
+            (name,)).fetchone()
+        if row is not None:
+            return Scope(level, *row)
+    return None
+
+
+@db.read_only
+@db.connect_with_cursor
+def select_children(cursor: sqlite3.Cursor, scope: Optional[Scope] = None
+                    ) -> Sequence[Scope]:
+    """Regions of the nation or districts of a region, by name.
+
+    Args:
+        cursor (sqlite3.Cursor): Passed via decorator
+        scope (Optional[Scope], optional): Parent scope. Defaults to
+          None, national.
+
+    Returns:
+        Sequence[Scope]: Child scopes, none for a district
+    """
+    if scope is None or scope.level == NATIONAL:
+        query: str = 'SELECT id, name FROM regions ORDER BY name'
+        return [Scope(REGION, *row) for row in cursor.execute(query)]
+    if scope.level == REGION:
+        query = '''SELECT id, name FROM districts WHERE region_id = ?
+            ORDER BY name'''
+        return [Scope(DISTRICT, *row)
+                for row in cursor.execute(query, (scope._id,))]
+    return []
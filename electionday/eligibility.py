@@ -0,0 +1,335 @@
+import array
+import bisect
+import hashlib
+import mmap
+import os
+import pathlib
+import secrets
+import sqlite3
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import electionday.config as config
+import electionday.database as db
+
+
+MAGIC: bytes = b'EDELIG01'
+# Magic, hash salt and voter count, followed by count sorted 64-bit
+#   voter ID hashes and a bitmap of count has_voted bits.
+HEADER = struct.Struct('=8sqq')
+HASH = struct.Struct('=q')
+# Salts tried before giving up on a collision free hash table.
+MAX_ATTEMPTS: int = 8
+
+# Index file identity (device, inode) when it was opened. Votes are
+#   written to the mapping in place, only a replaced file is a new one.
+Signature = Tuple[int, int]
+
+_indexes: Dict[Any, Tuple[Optional[Signature],
+                          Optional['EligibilityIndex']]] = {}
+_lock = threading.Lock()
+
+
+def _hash(voter_id: Any, key: bytes) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(str(voter_id).encode(), digest_size=8,
+                        key=key).digest(),
+        'little', signed=True)
+
+
+def _key(salt: int) -> bytes:
+    return salt.to_bytes(8, 'little', signed=True)
+
+
+def index_path(path: Any) -> Optional[pathlib.Path]:
+    """Eligibility index file of a database, None for in-memory ones."""
+    if str(path) == ':memory:':
+        return None
+    return pathlib.Path(path).with_suffix(config.ELIGIBILITY_SUFFIX)
+
+
+class EligibilityIndex:
+    """Memory-mapped voter ID table and has_voted bitmap.
+
+    Voter IDs are stored as sorted 64-bit keyed hashes, the position of
+      a hash is the voter's ordinal in the has_voted bitmap. 10M voters
+      take 80MB of hashes, paged in on demand, and a 1.25MB bitmap. The
+      file is mapped shared, so terminal processes on the same database
+      see each other's votes without asking SQLite.
+
+    The index only ever errs towards asking the database: a voter ID
+      missing from the table is not registered, but a clear bit may be
+      a vote not yet recorded here. Bits are set after commit, see
+      mark_voted.
+    """
+
+    def __init__(self, path: Any):
+        self.path = pathlib.Path(path)
+        with open(self.path, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0)
+        magic, salt, count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f'Not an eligibility index: {self.path}')
+        self.salt: int = salt
+        self._key: bytes = _key(salt)
+        self.count: int = count
+        self._hashes = memoryview(self._mmap)[
+            HEADER.size:HEADER.size + 8 * count].cast('q')
+        self._bitmap_offset: int = HEADER.size + 8 * count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def has_voted_bits(self) -> int:
+        """has_voted bitmap as an integer, bit i for ordinal i."""
+        return int.from_bytes(self._mmap[
+            self._bitmap_offset:self._bitmap_offset + (self.count + 7) // 8],
+            'little')
+
+    def ordinal(self, voter_id: str) -> Optional[int]:
+        """Dense ordinal of a voter, None if voter ID is not registered."""
+        key: int = _hash(voter_id, self._key)
+        i: int = bisect.bisect_left(self._hashes, key)
+        if i < self.count and self._hashes[i] == key:
+            return i
+        return None
+
+    def lookup(self, voter_id: str) -> Optional[bool]:
+        """Check a voter ID without touching the database.
+
+        Args:
+            voter_id (str): Voter ID
+
+        Returns:
+            Optional[bool]: None if not registered, otherwise True if
+              voter has voted
+        """
+        i: Optional[int] = self.ordinal(voter_id)
+        if i is None:
+            return None
+        return bool(self._mmap[self._bitmap_offset + (i >> 3)]
+                    & (1 << (i & 7)))
+
+    def mark(self, voter_id: str) -> bool:
+        """Set has_voted bit of a voter.
+
+        Returns:
+            bool: False if voter ID is not registered
+        """
+        i: Optional[int] = self.ordinal(voter_id)
+        if i is None:
+            return False
+        offset: int = self._bitmap_offset + (i >> 3)
+        self._mmap[offset] = self._mmap[offset] | (1 << (i & 7))
+        return True
+
+
+def _signature(file_path: pathlib.Path) -> Optional[Signature]:
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def open_index(path: Any) -> Optional[EligibilityIndex]:
+    """Open the eligibility index of a database.
+
+    Opened once per process and opened again when the file has been
+      replaced or removed since, e.g. by an import or sync in another
+      process, which costs a stat per call.
+
+    Args:
+        path (Any): Database path
+
+    Returns:
+        Optional[EligibilityIndex]: Index, None if it hasn't been built
+    """
+    file_path: Optional[pathlib.Path] = index_path(path)
+    if file_path is None:
+        return None
+    signature: Optional[Signature] = _signature(file_path)
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with _lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != signature:
+            try:
+                index: Optional[EligibilityIndex] = (
+                    EligibilityIndex(file_path) if signature else None)
+            except FileNotFoundError:
+                # Removed since the stat, checked again on next call.
+                signature, index = None, None
+            cached = _indexes[path] = signature, index
+        return cached[1]
+
+
+def current() -> Optional[EligibilityIndex]:
+    """Eligibility index of the database used by the decorators."""
+    return open_index(db.get_provider().path)
+
+
+def mark_voted(voter_id: str) -> None:
+    """Record a committed vote in the current eligibility index, if any.
+
+    Call after the vote transaction has committed. A bit set for a
+      rolled back vote would turn a voter away, a bit lost to a
+      concurrent update in another process only costs a database read.
+    """
+    index: Optional[EligibilityIndex] = current()
+    if index is not None:
+        index.mark(voter_id)
+
+
+def remove() -> None:
+    """Delete the current database's index, e.g. before importing voters.
+
+    Other processes notice on their next lookup, see open_index.
+    """
+    path = db.get_provider().path
+    file_path = index_path(path)
+    with _lock:
+        _indexes[path] = None, None
+    if file_path is not None:
+        file_path.unlink(missing_ok=True)
+
+
+def patch(index: EligibilityIndex, inserted: Iterable[str],
+          deleted: Iterable[str]) -> Optional[pathlib.Path]:
+    """Write a copy of index with voter IDs inserted and deleted.
+
+    Runs of unchanged hashes and their has_voted bits are copied as they
+      are, so a small sync costs a copy of the file instead of reading
+      and hashing the voters table like build. The copy atomically
+      replaces the current database's index. Votes recorded in index
+      since it was read are lost, which only costs a database read.
+
+    Args:
+        index (EligibilityIndex): Index before the changes, may have
+          been removed since
+        inserted (Iterable[str]): Voter IDs registered since
+        deleted (Iterable[str]): Voter IDs no longer registered
+
+    Returns:
+        Optional[pathlib.Path]: Index path, None if an inserted voter ID
+          collides with another's hash or for in-memory databases,
+          build a new index then
+    """
+    path = db.get_provider().path
+    file_path = index_path(path)
+    if file_path is None:
+        return None
+    hashes = index._hashes
+    added: List[int] = sorted(_hash(voter_id, index._key)
+                              for voter_id in inserted)
+    removed: Set[int] = {i for i in map(index.ordinal, deleted)
+                         if i is not None}
+    # Inserts before the old hash at the same position, then removals.
+    changes: List[Tuple[int, int, int]] = [(i, 1, 0) for i in removed]
+    previous: Optional[int] = None
+    for key_hash in added:
+        i: int = bisect.bisect_left(hashes, key_hash)
+        if key_hash == previous or (i < index.count
+                                    and hashes[i] == key_hash):
+            return None
+        previous = key_hash
+        changes.append((i, 0, key_hash))
+    changes.sort()
+    count: int = index.count + len(added) - len(removed)
+    old_bits: int = index.has_voted_bits()
+    bits: int = 0
+    written: int = 0
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, index.salt, count))
+
+        def copy(start: int, stop: int) -> None:
+            nonlocal bits, written
+            run: int = (old_bits >> start) & ((1 << (stop - start)) - 1)
+            bits |= run << written
+            f.write(hashes[start:stop])
+            written += stop - start
+
+        start: int = 0
+        for i, removal, key_hash in changes:
+            copy(start, i)
+            if removal:
+                start = i + 1
+            else:
+                start = i
+                f.write(HASH.pack(key_hash))
+                written += 1
+        copy(start, index.count)
+        f.write(bits.to_bytes((count + 7) // 8, 'little'))
+    os.replace(tmp_path, file_path)
+    with _lock:
+        _indexes[path] = (_signature(file_path), EligibilityIndex(file_path))
+    return file_path
+
+
+@db.connect
+def build(connection: sqlite3.Connection) -> Optional[pathlib.Path]:
+    """Build eligibility index from the voters table.
+
+    Hashes are computed by a SQLite function and sorted by SQLite, so
+      memory use is the bitmap plus one write buffer. The file is
+      written next to the database and atomically replaces any previous
+      index.
+
+    Args:
+        connection (sqlite3.Connection): Passed via decorator
+
+    Raises:
+        RuntimeError: No collision free salt found
+
+    Returns:
+        Optional[pathlib.Path]: Index path, None for in-memory databases
+    """
+    path = db.get_provider().path
+    file_path = index_path(path)
+    if file_path is None:
+        return None
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    connection.execute('BEGIN')
+    count: int = connection.execute(
+        'SELECT COUNT(*) FROM voters').fetchone()[0]
+    for _ in range(MAX_ATTEMPTS):
+        salt: int = secrets.randbits(63)
+        key: bytes = _key(salt)
+        connection.create_function(
+            'eligibility_hash', 1, lambda voter_id: _hash(voter_id, key),
+            deterministic=True)
+        query: str = '''SELECT eligibility_hash(voter_id) AS key, has_voted
+            FROM voters ORDER BY key'''
+        bitmap = bytearray((count + 7) // 8)
+        buffer = array.array('q')
+        previous: Optional[int] = None
+        collided: bool = False
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, salt, count))
+            for i, (key_hash, has_voted) in enumerate(
+                    connection.execute(query)):
+                if key_hash == previous:
+                    collided = True
+                    break
+                previous = key_hash
+                buffer.append(key_hash)
+                if int(has_voted):
+                    bitmap[i >> 3] |= 1 << (i & 7)
+                if len(buffer) >= 1 << 16:
+                    buffer.tofile(f)
+                    del buffer[:]
+            else:
+                buffer.tofile(f)
+                f.write(bitmap)
+        if collided:
+            continue
+        os.replace(tmp_path, file_path)
+        with _lock:
+            _indexes[path] = (_signature(file_path),
+                              EligibilityIndex(file_path))
+        return file_path
+    tmp_path.unlink(missing_ok=True)
+    raise RuntimeError('Could not build a collision free eligibility index')
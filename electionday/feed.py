@@ -0,0 +1,205 @@
+import collections
+import json
+import threading
+import time
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+
+import electionday.config as config
+import electionday.results as results
+import electionday.storage as storage
+
+
+class Update(NamedTuple):
+    """Votes per party and winning party IDs as of one feed version.
+    """
+    version: int
+    votes: Dict[int, int]
+    winners: Tuple[int, ...]
+
+
+def _winners(votes: Dict[int, int]) -> Tuple[int, ...]:
+    top: int = max(votes.values(), default=0)
+    return tuple(sorted(_id for _id, count in votes.items()
+                        if count == top))
+
+
+def _standings(engine: storage.Storage) -> Optional[Dict[int, int]]:
+    if engine.routed:
+        # Not held by the results cache, see results.ResultsCache.
+        return {party._id: party.votes for party in engine.select_results()}
+    return results.CACHE.standings()
+
+
+def _resolve(future: Any) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ResultsFeed:
+    """Versioned results updates for live subscribers.
+
+    The vote write path calls publish after each commit, which compares
+      the results cache's in-memory standings with the latest update
+      and adds a version if anything changed, so no query runs while
+      nothing changes. Subscribers ask for changes since the version
+      they have and get the parties whose counts changed, and the
+      winners if they changed. Counts are absolute, so applying a delta
+      twice is harmless.
+
+    A delta is computed and encoded once per (since, latest version)
+      and shared by every subscriber asking for it. Waiting subscribers
+      in one event loop share one future, resolved from the writer
+      thread when a version is published.
+    """
+
+    def __init__(self, history: int = config.RESULTS_FEED_HISTORY):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._history: Deque[Update] = collections.deque(
+            maxlen=max(int(history), 1))
+        self._deltas: Dict[int, bytes] = {}
+        # Waiting future per event loop. asyncio is imported on first
+        #   wait_async, the CLI never needs it.
+        self._futures: Dict[Any, Any] = {}
+        self.subscribers: int = 0
+
+    @property
+    def version(self) -> int:
+        """Latest published version, 0 before the first."""
+        return self._history[-1].version if self._history else 0
+
+    def publish(self, engine: Optional[storage.Storage] = None) -> bool:
+        """Add a version if the cached standings changed.
+
+        Only reads the results cache, never the database. Does nothing
+          until the cache has been loaded, see refresh. Engines other
+          than SQLite bypass the cache, their results are read instead,
+          a query per shard for the shard databases.
+
+        Args:
+            engine (Optional[storage.Storage], optional): Engine the
+              votes were cast on. Defaults to None, the current engine.
+
+        Returns:
+            bool: True if a new version was published
+        """
+        votes: Optional[Dict[int, int]] = _standings(
+            engine or storage.get_storage())
+        if votes is None:
+            return False
+        with self._lock:
+            if self._history and self._history[-1].votes == votes:
+                return False
+            self._history.append(
+                Update(self.version + 1, votes, _winners(votes)))
+            self._deltas = {}
+            futures = list(self._futures.items())
+            self._futures = {}
+            self._changed.notify_all()
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # Event loop closed.
+                pass
+        return True
+
+    def refresh(self) -> int:
+        """Bring the results cache up to date and publish any change,
+          e.g. votes committed by other processes.
+
+        Costs one PRAGMA data_version while nothing changed. Run it off
+          the event loop.
+
+        Returns:
+            int: Latest version
+        """
+        engine: storage.Storage = storage.get_storage()
+        if not engine.routed:
+            results.CACHE.results()
+        self.publish(engine)
+        return self.version
+
+    def _delta(self, since: int) -> dict:
+        latest: Update = self._history[-1]
+        oldest: int = self._history[0].version
+        if not oldest <= since <= latest.version:
+            return {'version': latest.version, 'since': since, 'full': True,
+                    'votes': {str(_id): count
+                              for _id, count in latest.votes.items()},
+                    'winners': list(latest.winners)}
+        base: Update = self._history[since - oldest]
+        delta: dict = {'version': latest.version, 'since': since,
+                       'full': False,
+                       'votes': {str(_id): count
+                                 for _id, count in latest.votes.items()
+                                 if base.votes.get(_id) != count}}
+        if base.winners != latest.winners:
+            delta['winners'] = list(latest.winners)
+        return delta
+
+    def changes(self, since: int) -> Optional[bytes]:
+        """Changes from version since to the latest version.
+
+        Versions older than the kept history (or 0) and unknown ones,
+          e.g. from before a server restart, get a full update.
+
+        Args:
+            since (int): Version the subscriber has
+
+        Returns:
+            Optional[bytes]: JSON encoded delta, None if nothing changed
+        """
+        with self._lock:
+            if not self._history or since == self.version:
+                return None
+            delta: Optional[bytes] = self._deltas.get(since)
+            if delta is None:
+                delta = self._deltas[since] = json.dumps(
+                    self._delta(since)).encode()
+            return delta
+
+    def wait(self, since: int, timeout: Optional[float] = None
+             ) -> Optional[bytes]:
+        """Block until there are changes since version since.
+
+        Returns:
+            Optional[bytes]: See changes, None on timeout
+        """
+        deadline: Optional[float] = (
+            None if timeout is None else time.monotonic() + timeout)
+        with self._lock:
+            while self.version == since:
+                remaining: Optional[float] = (
+                    None if deadline is None
+                    else deadline - time.monotonic())
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+        return self.changes(since)
+
+    async def wait_async(self, since: int, timeout: Optional[float] = None
+                         ) -> Optional[bytes]:
+        """Await changes since version since, see wait."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.version == since:
+                future: Optional[Any] = self._futures.get(loop)
+                if future is None:
+                    future = self._futures[loop] = loop.create_future()
+            else:
+                future = None
+        if future is not None:
+            self.subscribers += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.subscribers -= 1
+        return self.changes(since)
+
+
+# Shared feed, published to by voting.record_committed.
+FEED: ResultsFeed = ResultsFeed()
@@ -0,0 +1,303 @@
+import atexit
+import os
+import pathlib
+import struct
+import threading
+import time
+from typing import (
+    Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple)
+import zlib
+
+import electionday.config as config
+import electionday.database as db
+import electionday.ranked as ranked
+
+
+MAGIC: bytes = b'EDJRNL02'
+# Journals written before preferences were journaled, still read and
+#   appended to in their own format.
+MAGIC_V1: bytes = b'EDJRNL01'
+# Frame: payload length and CRC-32 of payload.
+FRAME = struct.Struct('<II')
+# Payload: ballot ID, commit time (ns since epoch), party ID and number
+#   of preferences, followed by the preferences packed as in
+#   ranked_ballots and the UTF-8 voter ID.
+BALLOT = struct.Struct('<qqiH')
+# Payload of MAGIC_V1 journals: no preferences.
+BALLOT_V1 = struct.Struct('<qqi')
+MAX_PAYLOAD_SIZE: int = BALLOT.size + 2 * 0xffff + 1024
+
+_journals: Dict[Any, Optional['Journal']] = {}
+_lock = threading.Lock()
+
+
+class JournalError(Exception):
+    """Raised when a journal file can't be read.
+    """
+
+
+class JournalEntry(NamedTuple):
+    """One committed ballot.
+    """
+    ballot_id: int
+    party_id: int
+    voter_id: str
+    timestamp_ns: int
+    # Party IDs of a ranked ballot, most preferred first. None when read
+    #   from a MAGIC_V1 journal, which doesn't record them.
+    preferences: Optional[Tuple[int, ...]] = ()
+
+
+def encode(entry: JournalEntry, magic: bytes = MAGIC) -> bytes:
+    """Frame an entry for appending to a journal in magic's format."""
+    if magic == MAGIC_V1:
+        payload: bytes = BALLOT_V1.pack(
+            entry.ballot_id, entry.timestamp_ns, entry.party_id
+        ) + str(entry.voter_id).encode()
+    else:
+        preferences: Tuple[int, ...] = entry.preferences or ()
+        payload = BALLOT.pack(
+            entry.ballot_id, entry.timestamp_ns, entry.party_id,
+            len(preferences)
+        ) + ranked.encode(preferences) + str(entry.voter_id).encode()
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _create(path: pathlib.Path) -> None:
+    # Write the magic to a private file and link it into place, so
+    #   processes racing to create the journal never see it empty.
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_bytes(MAGIC)
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        tmp_path.unlink()
+
+
+class Journal:
+    """Append-only, CRC-framed file of committed ballots.
+
+    Entries are appended with one write per batch on a file opened in
+      append mode, so terminals in several processes can share a
+      journal without interleaving frames. append returns once the
+      entries are fsynced, so an acknowledged ballot is never missing
+      after a crash. Threads appending while another thread fsyncs wait
+      for the next fsync, which covers all their entries, so concurrent
+      ballots share fsyncs the way a batch shares a commit.
+
+    An existing MAGIC_V1 journal is appended to in its own format, so
+      its ballots are replayed without preferences.
+    """
+
+    def __init__(self, path: Any):
+        self.path = pathlib.Path(path)
+        if not self.path.exists():
+            _create(self.path)
+        with open(self.path, 'rb') as f:
+            self.magic: bytes = f.read(len(MAGIC))
+        flags: int = os.O_WRONLY | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+        self._fd: Optional[int] = os.open(self.path, flags)
+        self._lock = threading.Condition()
+        self._syncing: bool = False
+        # Entries written and entries known to be on disk.
+        self.written: int = 0
+        self.synced: int = 0
+        self.syncs: int = 0
+
+    @property
+    def pending(self) -> int:
+        """Entries written but not yet fsynced."""
+        return self.written - self.synced
+
+    def append(self, entries: Iterable[JournalEntry]) -> None:
+        """Append entries in one write and wait until they are fsynced.
+
+        Raises:
+            JournalError: Journal is closed
+            OSError: Write or fsync failed
+        """
+        frames: List[bytes] = [encode(entry, self.magic)
+                               for entry in entries]
+        if not frames:
+            return
+        with self._lock:
+            if self._fd is None:
+                raise JournalError(f'Journal is closed: {self.path}')
+            os.write(self._fd, b''.join(frames))
+            self.written += len(frames)
+            self._sync_through(self.written)
+
+    def _sync_through(self, target: int) -> None:
+        """Return once the first target entries are fsynced, called with
+          the lock held."""
+        while self.synced < target:
+            if self._syncing:
+                self._lock.wait()
+                continue
+            self._syncing = True
+            end: int = self.written
+            fd: int = self._fd
+            # Others keep appending during the fsync, their entries go
+            #   in the next one.
+            self._lock.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._lock.acquire()
+                self._syncing = False
+                self._lock.notify_all()
+            self.synced = max(self.synced, end)
+            self.syncs += 1
+
+    def sync(self) -> None:
+        """Fsync entries written so far, if any aren't yet."""
+        with self._lock:
+            if self._fd is not None:
+                self._sync_through(self.written)
+
+    def close(self) -> None:
+        """Fsync pending entries and close the file."""
+        with self._lock:
+            if self._fd is None:
+                return
+            self._sync_through(self.written)
+            while self._syncing:
+                self._lock.wait()
+            os.close(self._fd)
+            self._fd = None
+
+
+class JournalReader:
+    """Iterate over the entries of a journal file.
+
+    Reading stops at the first frame that is truncated or fails its CRC,
+      normally a write torn by a crash, and error describes it. Entries
+      of a MAGIC_V1 journal have preferences None.
+    """
+
+    def __init__(self, path: Any, chunk_size: int = 1 << 20):
+        self.path = pathlib.Path(path)
+        self.chunk_size: int = chunk_size
+        self.entries: int = 0
+        self.offset: int = 0
+        self.error: Optional[str] = None
+        self.magic: Optional[bytes] = None
+
+    def __iter__(self) -> Iterator[JournalEntry]:
+        # Enough buffered bytes for the largest frame.
+        lookahead: int = FRAME.size + MAX_PAYLOAD_SIZE
+        unpack_frame = FRAME.unpack_from
+        crc32 = zlib.crc32
+        with open(self.path, 'rb') as f:
+            self.magic = f.read(len(MAGIC))
+            if self.magic not in (MAGIC, MAGIC_V1):
+                raise JournalError(f'Not a ballot journal: {self.path}')
+            header = BALLOT if self.magic == MAGIC else BALLOT_V1
+            unpack_ballot = header.unpack_from
+            self.offset = len(MAGIC)
+            data: bytes = b''
+            pos: int = 0
+            eof: bool = False
+            while True:
+                if len(data) - pos < lookahead and not eof:
+                    chunks: List[bytes] = [data[pos:]]
+                    buffered: int = len(data) - pos
+                    while buffered < lookahead:
+                        chunk: bytes = f.read(self.chunk_size)
+                        if not chunk:
+                            eof = True
+                            break
+                        chunks.append(chunk)
+                        buffered += len(chunk)
+                    data = b''.join(chunks)
+                    pos = 0
+                if pos == len(data):
+                    return
+                if len(data) - pos < FRAME.size:
+                    self.error = 'truncated frame header'
+                    return
+                length, crc = unpack_frame(data, pos)
+                start: int = pos + FRAME.size
+                end: int = start + length
+                if not header.size <= length <= MAX_PAYLOAD_SIZE:
+                    self.error = f'invalid frame length {length}'
+                    return
+                if end > len(data):
+                    self.error = 'truncated frame'
+                    return
+                payload = memoryview(data)[start:end]
+                if crc32(payload) != crc:
+                    self.error = 'checksum mismatch'
+                    return
+                preferences: Optional[Tuple[int, ...]] = None
+                if header is BALLOT:
+                    ballot_id, timestamp_ns, party_id, count = (
+                        unpack_ballot(payload))
+                    voter_start: int = header.size + 2 * count
+                    if voter_start > length:
+                        self.error = f'invalid preference count {count}'
+                        return
+                    preferences = ranked.decode(
+                        bytes(payload[header.size:voter_start]))
+                else:
+                    ballot_id, timestamp_ns, party_id = unpack_ballot(payload)
+                    voter_start = header.size
+                voter_id: str = str(payload[voter_start:], 'utf-8')
+                pos = end
+                self.offset += FRAME.size + length
+                self.entries += 1
+                yield JournalEntry(ballot_id, party_id, voter_id,
+                                   timestamp_ns, preferences)
+
+
+def journal_path(path: Any) -> Optional[pathlib.Path]:
+    """Ballot journal file of a database, None for in-memory ones."""
+    if str(path) == ':memory:':
+        return None
+    return pathlib.Path(path).with_suffix(config.JOURNAL_SUFFIX)
+
+
+def current() -> Optional[Journal]:
+    """Journal of the database used by the decorators, opened once per
+      process. None if journaling is disabled.
+    """
+    path = db.get_provider().path
+    try:
+        return _journals[path]
+    except KeyError:
+        pass
+    with _lock:
+        if path not in _journals:
+            file_path = journal_path(path)
+            _journals[path] = (Journal(file_path) if (
+                config.JOURNAL_ENABLED and file_path) else None)
+        return _journals[path]
+
+
+def record(ballots: Iterable[Any]) -> None:
+    """Append committed ballots to the current journal, if enabled, and
+      wait until they are on disk.
+
+    Args:
+        ballots (Iterable[Any]): (ballot ID, voter, party, preferences)
+          tuples, see voting.record_committed
+    """
+    journal: Optional[Journal] = current()
+    if journal is None:
+        return
+    timestamp_ns: int = time.time_ns()
+    journal.append(JournalEntry(ballot_id, party._id, voter.voter_id,
+                                timestamp_ns, preferences)
+                   for ballot_id, voter, party, preferences in ballots)
+
+
+@atexit.register
+def close() -> None:
+    """Fsync and close all journals opened by this process."""
+    with _lock:
+        journals = [journal for journal in _journals.values() if journal]
+        _journals.clear()
+    for journal in journals:
+        journal.close()
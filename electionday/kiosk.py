@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+from typing import Any, Callable, Dict, Optional, Sequence, Union
+
+from colorama import Fore, Style
+
+import electionday.catalog as catalog
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.party as party_model
+import electionday.replica as replica
+import electionday.results as results
+import electionday.screen as screen_model
+import electionday.voter as voter_model
+import electionday.writer as ballot_writer
+
+
+class SessionClosed(Exception):
+    """Raised when a terminal disconnects or stays idle too long.
+    """
+
+
+class _Output:
+    """Text stream writing a screen to a connection, with the CRLF line
+      endings telnet-style terminals expect.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def write(self, text: str) -> int:
+        self.writer.write(text.replace('\n', '\r\n').encode('utf-8'))
+        return len(text)
+
+    def flush(self) -> None:
+        # Sent by the event loop, Session.prompt waits for the drain.
+        pass
+
+
+class Session:
+    """One terminal connected to the kiosk server.
+
+    Holds what a terminal process keeps in local variables of cli.main:
+      its screen, the error shown above the menu and the results
+      district. A session costs a coroutine, a socket and a screen
+      buffer instead of an interpreter with its own imports and
+      database connection.
+    """
+
+    def __init__(self, number: int, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter,
+                 idle_timeout: float = config.KIOSK_IDLE_TIMEOUT,
+                 district_name: str = ''):
+        self.number: int = number
+        self.reader = reader
+        self.writer = writer
+        self.idle_timeout: float = idle_timeout
+        self.district_name: str = district_name
+        self.screen = screen_model.Screen(padding=2, stream=_Output(writer))
+        self.error_msg: str = ''
+        self.peer: Any = writer.get_extra_info('peername')
+
+    async def prompt(self, string: str) -> str:
+        """Send the screen and a padded prompt, then wait for a line.
+
+        Like cli.prompt, pending screen output goes out in one write.
+
+        Raises:
+            SessionClosed: Terminal disconnected or idle too long
+
+        Returns:
+            str: Input line without line ending
+        """
+        self.screen.write(self.screen.pad(string))
+        self.screen.flush()
+        try:
+            await self.writer.drain()
+            line: bytes = await asyncio.wait_for(
+                self.reader.readline(), self.idle_timeout)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            raise SessionClosed(self.number) from e
+        if not line:
+            raise SessionClosed(self.number)
+        return line.decode('utf-8', 'replace').strip()
+
+    async def go_back(self) -> None:
+        """Keep the screen visible until the voter returns to the menu."""
+        await self.prompt('Back to main menu >')
+
+    async def close(self) -> None:
+        """Say goodbye and close the connection."""
+        self.screen.write('\n\n')
+        self.screen.line('Goodbye')
+        self.screen.write('\n')
+        self.screen.flush()
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+
+class KioskServer:
+    """Menu, voting and results screens of the CLI served to many
+      line-oriented terminals (telnet, netcat or a kiosk client) over
+      TCP, from one asyncio event loop.
+
+    Every connection is a Session running the CLI flow with the same
+      navigation.Menu and model functions. Database reads run on a
+      thread pool of workers threads, so at most that many queries run
+      at once however many terminals are connected, and ballots go
+      through a group-commit BallotWriter as with the HTTP server.
+
+    Voter IDs and passwords are read like any other line, terminals are
+      expected to mask them locally.
+    """
+
+    def __init__(self,
+                 workers: int = config.KIOSK_WORKERS,
+                 max_sessions: int = config.KIOSK_MAX_SESSIONS,
+                 idle_timeout: float = config.KIOSK_IDLE_TIMEOUT,
+                 district_name: str = ''):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='kiosk')
+        self.ballots = ballot_writer.BallotWriter()
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        self.district_name: str = district_name
+        self.menu = config.MENU
+        self.sessions: Dict[int, Session] = {}
+        self._numbers = itertools.count(1)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a model function on the worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Serve a terminal until it quits, disconnects or idles out."""
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b'All terminals are busy, please try again.\r\n')
+            writer.close()
+            return
+        session = Session(next(self._numbers), reader, writer,
+                          self.idle_timeout, self.district_name)
+        self.sessions[session.number] = session
+        try:
+            await self.main_menu(session)
+            await session.close()
+        except SessionClosed:
+            writer.close()
+        except Exception as e:
+            print(repr(e))
+            writer.close()
+        finally:
+            del self.sessions[session.number]
+
+    async def main_menu(self, session: Session) -> None:
+        """Main menu loop, see cli.main."""
+        screen = session.screen
+        while True:
+            screen.clear()
+            screen.header('MAIN MENU')
+            screen.write(f'{self.menu.layout}\n\n')
+            if session.error_msg:
+                screen.line(session.error_msg, Fore.RED, Style.RESET_ALL)
+                screen.write('\n')
+                session.error_msg = ''
+            selected_option: str = await session.prompt(
+                'Select menu option: ')
+            if selected_option not in self.menu.selectors:
+                session.error_msg = (f'Invalid selector ({selected_option}),'
+                                     ' please try again.')
+            elif selected_option == '3':
+                return
+            elif selected_option == '1':
+                await self.vote(session)
+            elif selected_option == '2':
+                await self.results(session)
+
+    async def vote(self, session: Session) -> None:
+        """Login and voting screens."""
+        screen = session.screen
+        user_name: str = await session.prompt('Name: ')
+        voter_id: str = await session.prompt('Voter ID: ')
+        valid_voter: Union[voter_model.Voter, voter_model.AuthFailure] = (
+            await self.run(voter_model.authenticate, user_name, voter_id))
+        if isinstance(valid_voter, voter_model.AuthFailure):
+            session.error_msg = valid_voter.message
+            return
+        parties: Sequence[party_model.PartyRecord] = await self.run(
+            catalog.CATALOG.parties)
+        screen.clear()
+        screen.header('CAST VOTE')
+        for i, party in enumerate(parties):
+            COLOR = Fore.CYAN if i % 2 == 0 else Fore.GREEN
+            screen.line(f'{party.selector}  {party.name}', COLOR)
+        screen.write(f'{Style.RESET_ALL}\n')
+        while True:
+            screen.line('Select a party to cast your vote.')
+            screen.line('Enter C to cancel.')
+            selector: str = (await session.prompt('')).lower()
+            if selector == 'c':
+                if (await session.prompt('Return to menu? Y/n ')
+                        ).lower() == 'y':
+                    return
+                # Regretted cancelling, no invalid selection message.
+                continue
+            selected_party: Optional[party_model.PartyRecord] = (
+                await self.run(catalog.CATALOG.by_selector, selector))
+            if selected_party is None:
+                screen.line('Invalid selection.', Fore.RED, Style.RESET_ALL)
+                continue
+            screen.line(f'You have selected: {selected_party.name.upper()}')
+            if (await session.prompt('Confirm vote? Y/n ')).lower() == 'y':
+                break
+        try:
+            await self.ballots.cast_async(valid_voter, selected_party)
+        except voter_model.AlreadyVotedError:
+            session.error_msg = 'You have already voted.'
+            return
+        screen.line('Thank you for voting!')
+        screen.line(f'Use password "{config.PASSWORD}" to access'
+                    ' current results.')
+        screen.write('\n')
+        await session.go_back()
+
+    async def results(self, session: Session) -> None:
+        """Results screen, of the session's district or region if set."""
+        screen = session.screen
+        password: str = await session.prompt(
+            'Enter password to view results: ')
+        if password != config.PASSWORD:
+            session.error_msg = 'Invalid password.'
+            return
+        if session.district_name:
+            scope: Optional[district.Scope] = await self.run(
+                district.find_scope, session.district_name)
+            if scope is None:
+                session.error_msg = ('Unknown district or region:'
+                                     f' {session.district_name}')
+                return
+            parties, winning_parties = await self.run(
+                lambda: (party_model.select_results(scope),
+                         party_model.select_winners(scope)))
+            title: str = f'CURRENT RESULTS: {scope.name.upper()}'
+        else:
+            parties, winning_parties = await self.run(
+                lambda: (results.CACHE.results(), results.CACHE.winners()))
+            title = 'CURRENT RESULTS'
+        screen.clear()
+        screen.header(title)
+        for i, party in enumerate(parties):
+            COLOR = Fore.CYAN if i % 2 == 0 else Fore.GREEN
+            screen.line(f'Votes: {party.votes}  {party.name}', COLOR)
+        screen.write(f'{Style.RESET_ALL}\n')
+        if winning_parties[0].votes:
+            names: str = ', '.join(party.name for party in winning_parties)
+            screen.line('Winning'
+                        f" part{'y' if len(winning_parties) == 1 else 'ies'}:"
+                        f' {names}')
+        else:
+            screen.line('No votes')
+        screen.write('\n')
+        await session.go_back()
+
+    async def start(self, host: str = config.KIOSK_HOST,
+                    port: int = config.KIOSK_PORT) -> asyncio.AbstractServer:
+        """Start listening, returns the asyncio server."""
+        return await asyncio.start_server(
+            self.handle, host, port, backlog=config.SERVER_BACKLOG)
+
+    def close(self) -> None:
+        """Shut down executors and close database connections."""
+        self.ballots.close()
+        self.executor.shutdown(wait=True)
+        db.close()
+
+
+async def serve(host: str, port: int, workers: int,
+                district_name: str = '') -> None:
+    """Run kiosk server until cancelled.
+
+    With config.REPLICA_READS read-only queries are served from a read
+      replica, see replica module.
+    """
+    if config.REPLICA_READS:
+        replica.start()
+    server = KioskServer(workers, district_name=district_name)
+    listener = await server.start(host, port)
+    addresses = ', '.join(
+        str(sock.getsockname()) for sock in listener.sockets)
+    print(f'Serving {config.APP_NAME} terminals on {addresses}')
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        replica.stop()
+        server.close()
+
+
+def main() -> None:
+    """Run kiosk server from the command line."""
+    parser = argparse.ArgumentParser(
+        description=f'{config.APP_NAME} server for line-protocol terminals')
+    parser.add_argument('--host', default=config.KIOSK_HOST)
+    parser.add_argument('--port', type=int, default=config.KIOSK_PORT)
+    parser.add_argument('--workers', type=int, default=config.KIOSK_WORKERS,
+                        help='Threads running database queries')
+    parser.add_argument('-d', '--district', dest='district_name', default='',
+                        help='Show results of this district or region')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers,
+                          args.district_name))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import array
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import electionday.config as config
+import electionday.district as district
+import electionday.party as party_model
+import electionday.roll as roll
+import electionday.storage as storage
+import electionday.voter as voter_model
+
+
+# SQLite's NOCASE collation only folds ASCII letters, district and
+#   region names are looked up with it.
+_NOCASE = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                        'abcdefghijklmnopqrstuvwxyz')
+
+
+def _nocase(text: str) -> str:
+    return text.translate(_NOCASE)
+
+
+class MemoryStorage(storage.Storage):
+    """Voters, parties and ballots held in process memory.
+
+    Same results and errors as the SQLite engine, for tests and
+      simulations that shouldn't wait for disk. Voters are numbered in
+      registration order like voters.id and stored in flat arrays
+      indexed by that number, so a million voters cost a dict entry and
+      a few bytes each. Votes are counted per party and per district as
+      they are cast, ballots are kept as an array of party IDs.
+
+    Nothing is persisted, and the post-commit hooks of the SQLite
+      engine (results cache, eligibility index, ballot journal and
+      results feed) are not run.
+    """
+    name: str = 'memory'
+
+    def __init__(self, path: Any = config.DATA_PATH):
+        """Create engine, populated from a data file unless path is None.
+
+        Args:
+            path (Any, optional): JSON data file with parties, districts
+              and voters, see setup_db.py. Defaults to config.DATA_PATH.
+        """
+        # Cast votes are checked and counted under the lock, like the
+        #   write lock of a vote transaction.
+        self._lock = threading.Lock()
+        self._parties: Dict[int, party_model.PartyRecord] = {}
+        self._party_names: Dict[str, int] = {}
+        self._votes: Dict[int, int] = {}
+        self._regions: Dict[int, str] = {}
+        self._region_names: Dict[str, int] = {}
+        self._districts: Dict[int, Tuple[str, int]] = {}
+        self._district_names: Dict[str, int] = {}
+        self._district_votes: Dict[Tuple[int, int], int] = {}
+        # Voter number (voters.id - 1) by voter ID.
+        self._voter_numbers: Dict[str, int] = {}
+        self._voter_ids: List[str] = []
+        self._voter_names: List[str] = []
+        # District ID of each voter, 0 for none.
+        self._voter_districts = array.array('q')
+        self._voted = bytearray()
+        # Party ID of each ballot, ballot ID - 1 is the index.
+        self._ballots = array.array('q')
+        if path is not None:
+            self.load(path)
+
+    def load(self, path: Any) -> int:
+        """Add parties, districts and voters from a JSON data file.
+
+        Returns:
+            int: Number of added voters
+        """
+        self.add_parties(roll.iter_json_array(path, 'parties'))
+        self.add_districts(roll.iter_json_array(path, 'districts'))
+        return self.add_voters(roll.iter_voters(path))
+
+    def add_parties(self, names: Iterable[str]) -> None:
+        """Add parties, skipping existing names, see party.populate_table.
+        """
+        for name in names:
+            if name in self._party_names:
+                continue
+            _id: int = len(self._parties) + 1
+            self._parties[_id] = party_model.PartyRecord(
+                _id, name, party_model.default_symbol(name), '')
+            self._party_names[name] = _id
+            self._votes[_id] = 0
+
+    def add_districts(self, districts: Iterable[Sequence[str]]) -> None:
+        """Add (district, region) pairs, see district.populate_table."""
+        for district_name, region_name in districts:
+            region_id: Optional[int] = self._region_names.get(region_name)
+            if region_id is None:
+                region_id = len(self._regions) + 1
+                self._regions[region_id] = region_name
+                self._region_names[region_name] = region_id
+            if district_name not in self._district_names:
+                _id: int = len(self._districts) + 1
+                self._districts[_id] = (district_name, region_id)
+                self._district_names[district_name] = _id
+
+    def add_voters(self, voters: Iterable[Sequence[str]]) -> int:
+        """Register voters, skipping registered voter IDs, see
+          voter.populate_table.
+
+        Args:
+            voters (Iterable[Sequence[str]]): (voter_id, name) pairs or
+              (voter_id, name, district) rows
+
+        Returns:
+            int: Number of added voters
+        """
+        inserted: int = 0
+        with self._lock:
+            for row in voters:
+                voter_id, name, district_name = (*row, None)[:3]
+                if voter_id in self._voter_numbers:
+                    continue
+                self._voter_numbers[voter_id] = len(self._voter_ids)
+                self._voter_ids.append(voter_id)
+                self._voter_names.append(name)
+                self._voter_districts.append(
+                    self._district_names.get(district_name, 0))
+                self._voted.append(0)
+                inserted += 1
+        return inserted
+
+    def _voter(self, number: int) -> voter_model.Voter:
+        return voter_model.Voter(
+            _id=number + 1, name=self._voter_names[number],
+            voter_id=self._voter_ids[number],
+            has_voted=bool(self._voted[number]),
+            district_id=self._voter_districts[number] or None)
+
+    def is_valid(self, name: str, voter_id: str) -> bool:
+        number: Optional[int] = self._voter_numbers.get(voter_id)
+        return (number is not None
+                and voter_model.names_match(name, self._voter_names[number]))
+
+    def get_by_voter_id(self, voter_id: str
+                        ) -> Optional[voter_model.Voter]:
+        number: Optional[int] = self._voter_numbers.get(voter_id)
+        return None if number is None else self._voter(number)
+
+    def authenticate(self, name: str, voter_id: str
+                     ) -> Union[voter_model.Voter, voter_model.AuthFailure]:
+        number: Optional[int] = self._voter_numbers.get(voter_id)
+        if number is None:
+            return voter_model.AuthFailure.UNKNOWN_ID
+        if not voter_model.names_match(name, self._voter_names[number]):
+            return voter_model.AuthFailure.NAME_MISMATCH
+        if self._voted[number]:
+            return voter_model.AuthFailure.ALREADY_VOTED
+        return self._voter(number)
+
+    def cast_vote(self, voter: voter_model.Voter,
+                  party: Union[party_model.Party, party_model.PartyRecord]
+                  ) -> int:
+        """Mark voter as having voted and add a ballot for the party.
+
+        Raises:
+            voter_model.AlreadyVotedError: Voter has already voted
+
+        Returns:
+            int: Ballot ID
+        """
+        with self._lock:
+            number: Optional[int] = self._voter_numbers.get(voter.voter_id)
+            if number is None or self._voted[number]:
+                raise voter_model.AlreadyVotedError(voter.voter_id)
+            self._voted[number] = 1
+            voter.has_voted = True
+            self._votes[party._id] = self._votes.get(party._id, 0) + 1
+            if voter.district_id is not None:
+                key: Tuple[int, int] = (voter.district_id, party._id)
+                self._district_votes[key] = (
+                    self._district_votes.get(key, 0) + 1)
+            self._ballots.append(party._id)
+            return len(self._ballots)
+
+    def _standings(self, scope: Optional[district.Scope]
+                   ) -> List[party_model.Party]:
+        """Parties with their votes in scope, by ID."""
+        if scope is None or scope.level == district.NATIONAL:
+            votes: Dict[int, int] = self._votes
+        elif scope.level == district.DISTRICT:
+            votes = {party_id: count for (district_id, party_id), count
+                     in self._district_votes.items()
+                     if district_id == scope._id}
+        elif scope.level == district.REGION:
+            votes = {}
+            for (district_id, party_id), count in (
+                    self._district_votes.items()):
+                if self._districts.get(district_id, ('', 0))[1] == scope._id:
+                    votes[party_id] = votes.get(party_id, 0) + count
+        else:
+            raise ValueError(f'Unknown scope level: {scope.level}')
+        return [party_model.Party(_id=_id, name=party.name,
+                                  symbol=party.symbol,
+                                  votes=votes.get(_id, 0))
+                for _id, party in self._parties.items()]
+
+    @staticmethod
+    def _select(parties: List[party_model.Party]
+                ) -> List[party_model.Party]:
+        for i, party in enumerate(parties):
+            party.selector = str(i + 1)
+        return parties
+
+    def select_all(self) -> Sequence[party_model.Party]:
+        return self._select(
+            sorted(self._standings(None), key=lambda party: party.name))
+
+    def select_results(self, scope: Optional[district.Scope] = None
+                       ) -> Sequence[party_model.Party]:
+        return self._select(sorted(
+            self._standings(scope),
+            key=lambda party: (-party.votes, party.name)))
+
+    def select_winners(self, scope: Optional[district.Scope] = None
+                       ) -> Sequence[party_model.Party]:
+        parties: List[party_model.Party] = self._standings(scope)
+        most: int = max((party.votes for party in parties), default=0)
+        return self._select(sorted(
+            (party for party in parties if party.votes == most),
+            key=lambda party: party.name))
+
+    def get_by_id(self, _id: int) -> Optional[party_model.Party]:
+        if _id not in self._parties:
+            return None
+        party: party_model.PartyRecord = self._parties[_id]
+        return party_model.Party(_id=_id, name=party.name,
+                                 symbol=party.symbol, votes=self._votes[_id])
+
+    def find_scope(self, name: str) -> Optional[district.Scope]:
+        for level, names in ((district.DISTRICT, self._districts),
+                             (district.REGION, self._regions)):
+            for _id, scope_name in names.items():
+                if level == district.DISTRICT:
+                    scope_name = scope_name[0]
+                if _nocase(scope_name) == _nocase(name):
+                    return district.Scope(level, _id, scope_name)
+        return None
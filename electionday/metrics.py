@@ -0,0 +1,267 @@
+import bisect
+import collections
+from dataclasses import asdict, dataclass
+import json
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import electionday.config as config
+import electionday.database as db
+
+
+# Latency bucket upper bounds in seconds.
+BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX: str = 'electionday_db'
+
+# String and number literals, replaced in logged SQL so voter names and
+#   IDs bound as parameters don't end up in the slow query log.
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class Histogram:
+    """Counts of observations in fixed latency buckets.
+    """
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        # One count per bucket plus one for values above the last bound.
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(upper bound, observations up to bound) pairs, as Prometheus
+          buckets, ending with +Inf.
+        """
+        total: int = 0
+        pairs: List[Tuple[str, int]] = []
+        for bound, count in zip((*map(repr, self.buckets), '+Inf'),
+                                self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'sum': round(self.sum, 6),
+                'buckets': dict(self.cumulative())}
+
+
+class FunctionMetrics:
+    """Calls and timings of one decorated database function.
+    """
+
+    def __init__(self):
+        self.calls: int = 0
+        self.errors: int = 0
+        self.statements: int = 0
+        self.latency = Histogram()
+        self.commit = Histogram()
+        self.lock_wait = Histogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'calls': self.calls, 'errors': self.errors,
+                'statements': self.statements,
+                'latency': self.latency.to_dict(),
+                'commit': self.commit.to_dict(),
+                'lock_wait': self.lock_wait.to_dict()}
+
+
+@dataclass
+class SlowQuery:
+    """Statement that took at least the slow query threshold.
+    """
+    function: str
+    sql: str
+    seconds: float
+    timestamp: float
+
+
+class _Call:
+    __slots__ = ('name', 'started', 'statements', 'commit', 'lock_wait')
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self.started: float = time.perf_counter()
+        self.statements: int = 0
+        self.commit: float = 0.0
+        self.lock_wait: float = 0.0
+
+
+class Registry:
+    """In-process metrics of the database decorators.
+
+    Installed with enable, the decorators report every call to start
+      and finish, and SQLite reports every statement to trace. A
+      statement is timed until the next statement starts or the
+      decorated call finishes, so its time includes any Python work in
+      between. COMMIT statements count as commit time and BEGIN
+      IMMEDIATE/EXCLUSIVE as lock wait, since that is where a writer
+      waits for the write lock.
+    """
+
+    def __init__(self,
+                 slow_query_ms: float = config.DB_SLOW_QUERY_MS,
+                 slow_query_limit: int = config.DB_SLOW_QUERY_LIMIT):
+        self.slow_query_seconds: float = slow_query_ms / 1000
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.functions: Dict[str, FunctionMetrics] = {}
+        self.slow_queries: Deque[SlowQuery] = collections.deque(
+            maxlen=slow_query_limit)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.functions = {}
+            self.slow_queries.clear()
+
+    def _calls(self) -> List[_Call]:
+        try:
+            return self._local.calls
+        except AttributeError:
+            self._local.calls = []
+            self._local.pending = None
+            return self._local.calls
+
+    def start(self, name: str, connection: sqlite3.Connection) -> _Call:
+        """Called by the decorators before the decorated function."""
+        calls: List[_Call] = self._calls()
+        self._close_statement(time.perf_counter())
+        connection.set_trace_callback(self.trace)
+        call = _Call(name)
+        calls.append(call)
+        return call
+
+    def finish(self, call: _Call, connection: sqlite3.Connection,
+               failed: bool) -> None:
+        """Called by the decorators after commit or rollback."""
+        finished: float = time.perf_counter()
+        self._close_statement(finished)
+        calls: List[_Call] = self._calls()
+        if calls and calls[-1] is call:
+            calls.pop()
+        if not calls:
+            connection.set_trace_callback(None)
+        with self._lock:
+            metrics = self.functions.get(call.name)
+            if metrics is None:
+                metrics = self.functions[call.name] = FunctionMetrics()
+            metrics.calls += 1
+            metrics.errors += failed
+            metrics.statements += call.statements
+            metrics.latency.observe(finished - call.started)
+            metrics.commit.observe(call.commit)
+            metrics.lock_wait.observe(call.lock_wait)
+
+    def trace(self, sql: str) -> None:
+        """SQLite trace callback, called as each statement starts."""
+        now: float = time.perf_counter()
+        self._close_statement(now)
+        calls: List[_Call] = self._calls()
+        if calls:
+            self._local.pending = (now, sql, calls[-1])
+
+    def _close_statement(self, now: float) -> None:
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            return
+        self._local.pending = None
+        started, sql, call = pending
+        seconds: float = now - started
+        call.statements += 1
+        keyword: str = sql[:15].upper()
+        if keyword.startswith(('COMMIT', 'END')):
+            call.commit += seconds
+        elif keyword.startswith(('BEGIN IMMEDIATE', 'BEGIN EXCLUSIVE')):
+            call.lock_wait += seconds
+        if seconds >= self.slow_query_seconds:
+            with self._lock:
+                self.slow_queries.append(SlowQuery(
+                    call.name, _LITERALS.sub('?', sql),
+                    round(seconds, 6), time.time()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'functions': {name: metrics.to_dict() for name, metrics
+                              in sorted(self.functions.items())},
+                'slow_queries': [asdict(query)
+                                 for query in self.slow_queries],
+            }
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            functions = sorted(self.functions.items())
+            for metric, help_text in (
+                    ('calls', 'Calls of decorated database functions.'),
+                    ('errors', 'Calls that raised an exception.'),
+                    ('statements', 'SQL statements executed.')):
+                lines.append(f'# HELP {PREFIX}_{metric}_total {help_text}')
+                lines.append(f'# TYPE {PREFIX}_{metric}_total counter')
+                lines.extend(
+                    f'{PREFIX}_{metric}_total{{function="{name}"}}'
+                    f' {getattr(metrics, metric)}'
+                    for name, metrics in functions)
+            for metric, help_text in (
+                    ('latency', 'Call latency including commit.'),
+                    ('commit', 'Time spent committing per call.'),
+                    ('lock_wait', 'Time waiting for the write lock per'
+                     ' call.')):
+                lines.append(f'# HELP {PREFIX}_{metric}_seconds {help_text}')
+                lines.append(f'# TYPE {PREFIX}_{metric}_seconds histogram')
+                for name, metrics in functions:
+                    histogram: Histogram = getattr(metrics, metric)
+                    lines.extend(
+                        f'{PREFIX}_{metric}_seconds_bucket'
+                        f'{{function="{name}",le="{bound}"}} {count}'
+                        for bound, count in histogram.cumulative())
+                    lines.append(f'{PREFIX}_{metric}_seconds_sum'
+                                 f'{{function="{name}"}} {histogram.sum!r}')
+                    lines.append(f'{PREFIX}_{metric}_seconds_count'
+                                 f'{{function="{name}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Any) -> pathlib.Path:
+        """Dump metrics to a file, JSON for a .json suffix, otherwise
+          Prometheus text format (e.g. for the node exporter textfile
+          collector).
+        """
+        path = pathlib.Path(path)
+        text: str = (json.dumps(self.to_dict(), indent=2) + '\n'
+                     if path.suffix == '.json' else self.to_prometheus())
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(text)
+        tmp_path.replace(path)
+        return path
+
+
+# Shared registry, installed by enable.
+REGISTRY: Registry = Registry()
+
+
+def enable(registry: Optional[Registry] = None) -> Registry:
+    """Start instrumenting the database decorators.
+
+    Returns:
+        Registry: Registry receiving the metrics
+    """
+    registry = registry or REGISTRY
+    db.set_instrumentation(registry)
+    return registry
+
+
+def disable() -> None:
+    """Stop instrumenting the database decorators."""
+    db.set_instrumentation(None)
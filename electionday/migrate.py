@@ -0,0 +1,327 @@
+import argparse
+from dataclasses import dataclass
+import pathlib
+import sqlite3
+import sys
+import time
+from typing import Callable, List, Optional
+
+import electionday.ballot as ballot
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.voter as voter_model
+
+
+# Called with the migration version and rows copied so far.
+Progress = Callable[[int, int], None]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Schema change applied once to move a database to version.
+
+    apply moves the database to the new layout and sets PRAGMA
+      user_version in its final transaction, so a migration interrupted
+      part way is run again on the next migrate.
+    """
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection, int, float, Optional[Progress]],
+                    None]
+
+
+def _table_sql(connection: sqlite3.Connection, table: str) -> Optional[str]:
+    row = connection.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (table,)).fetchone()
+    return None if row is None else row[0]
+
+
+def _set_version(connection: sqlite3.Connection, version: int) -> None:
+    connection.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def _forget_sequence(connection: sqlite3.Connection, table: str) -> None:
+    """Remove AUTOINCREMENT counter of a dropped table."""
+    if _table_sql(connection, 'sqlite_sequence') is not None:
+        connection.execute('DELETE FROM sqlite_sequence WHERE name = ?',
+                           (table,))
+
+
+def _compact_parties(connection: sqlite3.Connection, batch_size: int,
+                     pause: float, progress: Optional[Progress]) -> None:
+    """Rebuild parties as a STRICT table with INTEGER votes and without
+      AUTOINCREMENT, which wrote sqlite_sequence on every insert.
+
+    Parties are few, so they are copied in one transaction.
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        sql: Optional[str] = _table_sql(connection, 'parties')
+        if sql is not None and 'AUTOINCREMENT' in sql.upper():
+            cursor = connection.cursor()
+            # Recreated by ballot.create_table once parties are copied.
+            cursor.execute('DROP VIEW IF EXISTS standings')
+            cursor.execute('ALTER TABLE parties RENAME TO parties_old')
+            # Triggers and indexes moved with the table, free their names.
+            for kind, name in cursor.execute(
+                    """SELECT type, name FROM sqlite_master
+                    WHERE tbl_name = 'parties_old'
+                    AND type IN ('index', 'trigger') AND sql IS NOT NULL
+                    """).fetchall():
+                cursor.execute(f'DROP {kind.upper()} {name}')
+            party_model.create_table(cursor)
+            cursor.execute('''INSERT INTO parties(id, name, symbol, votes)
+                SELECT id, name, symbol, CAST(votes AS INTEGER)
+                FROM parties_old''')
+            copied: int = cursor.rowcount
+            cursor.execute('DROP TABLE parties_old')
+            _forget_sequence(connection, 'parties')
+            ballot.create_table(cursor)
+            cursor.close()
+            if progress is not None:
+                progress(1, copied)
+        _set_version(connection, 1)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+# Legacy voters keep receiving votes and registrations while they are
+#   copied, these triggers apply every change to the copy as well.
+_VOTER_TRIGGERS: List[str] = [
+    '''CREATE TRIGGER IF NOT EXISTS voters_migrate_insert
+        AFTER INSERT ON voters
+        BEGIN
+            DELETE FROM voters_compact WHERE voter_id = NEW.voter_id;
+            INSERT INTO voters_compact(
+                voter_id, id, name, has_voted, district_id)
+            VALUES(NEW.voter_id, NEW.id, NEW.name,
+                CAST(NEW.has_voted AS INTEGER), NEW.district_id);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS voters_migrate_update
+        AFTER UPDATE ON voters
+        BEGIN
+            DELETE FROM voters_compact
+            WHERE voter_id IN (OLD.voter_id, NEW.voter_id);
+            INSERT INTO voters_compact(
+                voter_id, id, name, has_voted, district_id)
+            VALUES(NEW.voter_id, NEW.id, NEW.name,
+                CAST(NEW.has_voted AS INTEGER), NEW.district_id);
+        END''',
+    '''CREATE TRIGGER IF NOT EXISTS voters_migrate_delete
+        AFTER DELETE ON voters
+        BEGIN
+            DELETE FROM voters_compact WHERE voter_id = OLD.voter_id;
+        END''',
+]
+
+
+def _compact_voters(connection: sqlite3.Connection, batch_size: int,
+                    pause: float, progress: Optional[Progress]) -> None:
+    """Copy voters into a WITHOUT ROWID table keyed by voter_id.
+
+    The copy is made in id order, batch_size voters per transaction, so
+      terminals only wait for one batch at a time. Triggers keep copied
+      voters up to date until the copy replaces the legacy table in a
+      final short transaction. A copy interrupted part way is continued
+      by running the migration again.
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        sql: Optional[str] = _table_sql(connection, 'voters')
+        if sql is None or 'WITHOUT ROWID' in sql.upper():
+            _set_version(connection, 2)
+            connection.commit()
+            return
+        if _table_sql(connection, 'voters_compact') is None:
+            # Created by voter.create_table so the layouts can't drift.
+            cursor = connection.cursor()
+            cursor.execute('ALTER TABLE voters RENAME TO voters_legacy')
+            voter_model.create_table(cursor)
+            cursor.execute('ALTER TABLE voters RENAME TO voters_compact')
+            cursor.execute('ALTER TABLE voters_legacy RENAME TO voters')
+            cursor.close()
+        for trigger in _VOTER_TRIGGERS:
+            connection.execute(trigger)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    batch_query: str = '''SELECT COUNT(*), MAX(id) FROM (
+        SELECT id FROM voters WHERE id > ? ORDER BY id LIMIT ?)'''
+    copy_query: str = '''INSERT OR IGNORE INTO voters_compact(
+            voter_id, id, name, has_voted, district_id)
+        SELECT voter_id, id, name, CAST(has_voted AS INTEGER), district_id
+        FROM voters WHERE id > ? ORDER BY id LIMIT ?'''
+    last_id: int = 0
+    copied: int = 0
+    while True:
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows, batch_end = connection.execute(
+                batch_query, (last_id, batch_size)).fetchone()
+            if not rows:
+                # Keep the write lock for the switch below.
+                break
+            connection.execute(copy_query, (last_id, batch_size))
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        copied += rows
+        last_id = batch_end
+        if progress is not None:
+            progress(2, copied)
+        if pause:
+            time.sleep(pause)
+    try:
+        for name in ('insert', 'update', 'delete'):
+            connection.execute(f'DROP TRIGGER voters_migrate_{name}')
+        legacy: int = connection.execute(
+            'SELECT COUNT(*) FROM voters').fetchone()[0]
+        compact: int = connection.execute(
+            'SELECT COUNT(*) FROM voters_compact').fetchone()[0]
+        if legacy != compact:
+            raise RuntimeError(
+                f'Copied {compact:,} of {legacy:,} voters, not migrated')
+        connection.execute('DROP TABLE voters')
+        connection.execute('ALTER TABLE voters_compact RENAME TO voters')
+        _forget_sequence(connection, 'voters')
+        _set_version(connection, 2)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+# Table functions of setup_db.py, in dependency order. They create
+#   tables missing from earlier versions and add missing columns, e.g.
+#   voters.district_id, which the migrations expect to exist.
+TABLES: List[Callable[[sqlite3.Cursor], None]] = [
+    party_model.create_table,
+    district.create_table,
+    voter_model.create_table,
+    ballot.create_table,
+    ranked.create_table,
+]
+
+
+def _upgrade_tables(connection: sqlite3.Connection) -> None:
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = connection.cursor()
+        for create_table in TABLES:
+            create_table(cursor)
+        cursor.close()
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'STRICT parties without AUTOINCREMENT', _compact_parties),
+    Migration(2, 'WITHOUT ROWID voters keyed by voter_id', _compact_voters),
+]
+SCHEMA_VERSION: int = MIGRATIONS[-1].version
+
+
+@db.connect
+def get_version(connection: sqlite3.Connection) -> int:
+    """Get schema version of the current database."""
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+@db.connect
+def migrate(connection: sqlite3.Connection,
+            target: int = SCHEMA_VERSION,
+            batch_size: int = config.MIGRATION_BATCH_SIZE,
+            pause: float = config.MIGRATION_PAUSE,
+            progress: Optional[Progress] = None,
+            ) -> List[int]:
+    """Apply migrations newer than the database's schema version.
+
+    Safe to run against a live database, each migration holds the write
+      lock for at most one batch at a time, see the migration functions.
+      Missing tables and columns are added first, see TABLES, so
+      databases of any earlier version can be migrated on their own.
+      Databases created by the current version are already in the
+      latest layout and are only marked with its version.
+
+    Args:
+        connection (sqlite3.Connection): Passed via decorator
+        target (int, optional): Version to migrate to.
+          Defaults to SCHEMA_VERSION.
+        batch_size (int, optional): Rows copied per transaction.
+          Defaults to config.MIGRATION_BATCH_SIZE.
+        pause (float, optional): Seconds between transactions.
+          Defaults to config.MIGRATION_PAUSE.
+        progress (Optional[Progress], optional): Called with migration
+          version and rows copied after each batch. Defaults to None.
+
+    Raises:
+        sqlite3.Error: Database exception
+        RuntimeError: Copied table doesn't match the original
+
+    Returns:
+        List[int]: Versions applied
+    """
+    current: int = connection.execute('PRAGMA user_version').fetchone()[0]
+    applied: List[int] = []
+    batch_size = max(int(batch_size), 1)
+    # Rename tables without rewriting references to them in other
+    #   tables, e.g. ballots.party_id must keep pointing at parties.
+    connection.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        if current < target:
+            _upgrade_tables(connection)
+        for migration in MIGRATIONS:
+            if current < migration.version <= target:
+                migration.apply(connection, batch_size, pause, progress)
+                applied.append(migration.version)
+    finally:
+        connection.execute('PRAGMA legacy_alter_table = OFF')
+    return applied
+
+
+def main() -> None:
+    """Migrate a database to the latest schema from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Upgrade an ElectionDay database to the latest schema')
+    parser.add_argument('--db', type=pathlib.Path, default=config.DB_PATH,
+                        help='Database file')
+    parser.add_argument('--target', type=int, default=SCHEMA_VERSION,
+                        help='Schema version to migrate to')
+    parser.add_argument('--batch-size', type=int,
+                        default=config.MIGRATION_BATCH_SIZE,
+                        help='Rows copied per transaction')
+    parser.add_argument('--pause', type=float,
+                        default=config.MIGRATION_PAUSE,
+                        help='Seconds to pause between transactions')
+    args = parser.parse_args()
+
+    def report_progress(version: int, copied: int) -> None:
+        print(f'\rVersion {version}: copied {copied:,} rows', end='',
+              file=sys.stderr, flush=True)
+
+    provider = db.configure(args.db)
+    try:
+        started: float = time.perf_counter()
+        before: int = get_version()
+        applied: List[int] = migrate(args.target, args.batch_size,
+                                     args.pause, report_progress)
+        if applied:
+            print(file=sys.stderr)
+        print(f'Schema version {before} -> {get_version()}'
+              f' ({time.perf_counter() - started:.1f}s)')
+    finally:
+        provider.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
 
 def add_padding(padding: int, direction: str = 'both') -> Callable:
@@ -51,15 +51,11 @@ class Menu:
         self.selector_punctuation: str = str(selector_punctuation)
         self._left_padding = int(left_padding)
         self.pad = add_padding(self.left_padding, 'left')
+        self._layout: str = ''
+        self._layout_key: Optional[Tuple] = None
 
     def __str__(self) -> str:
-        if self.selectors:
-            return '\n'.join(
-                self.pad(f"{selector}{self.selector_punctuation}"
-                f"{' '*(self.selector_padding or 1)}{option}")
-                for option, selector in zip(self.options, self.selectors))
-        return '\n'.join(self.pad(option)
-                         for option in self.options)
+        return self.layout
 
     @property
     def left_padding(self) -> int:
@@ -72,7 +68,24 @@ class Menu:
 
     @property
     def layout(self) -> str:
-        return str(self)
+        """Menu as a string, rebuilt only when options or format change.
+        """
+        key: Tuple = (tuple(self.options), tuple(self.selectors),
+                      self.selector_padding, self.selector_punctuation,
+                      self._left_padding)
+        if key != self._layout_key:
+            self._layout = self._render()
+            self._layout_key = key
+        return self._layout
+
+    def _render(self) -> str:
+        if self.selectors:
+            return '\n'.join(
+                self.pad(f"{selector}{self.selector_punctuation}"
+                f"{' '*(self.selector_padding or 1)}{option}")
+                for option, selector in zip(self.options, self.selectors))
+        return '\n'.join(self.pad(option)
+                         for option in self.options)
 
     def view(self) -> None:
         print('', self.layout, sep='', end='\n\n')
@@ -1,9 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
 import sqlite3
-from typing import Iterable
+from typing import Iterable, List, Union
 
+import electionday.ballot as ballot
 import electionday.database as db
+import electionday.district as district
+import electionday.storage as storage
 
 
 @dataclass
@@ -17,10 +20,22 @@ class Party:
     selector: str = ''
 
 
+@dataclass(frozen=True)
+class PartyRecord:
+    """Immutable party listing without votes, held by the party catalog.
+    """
+    __slots__ = ('_id', 'name', 'symbol', 'selector')
+    _id: int
+    name: str
+    symbol: str
+    selector: str
+
+
 def create_table(cursor: sqlite3.Cursor) -> None:
     """Create parties table if it doesn't exist.
 
-    To be called from a create_tables function in setup.
+    To be called from a create_tables function in setup. Tables created
+      by earlier versions are upgraded by the migrate module.
 
     Args:
         cursor (sqlite3.Cursor): Connection cursor
@@ -29,14 +44,39 @@ def create_table(cursor: sqlite3.Cursor) -> None:
         sqlite3.Error: SQLite exception
         Exception: Generic exception
     """
-    query: str = '''CREATE TABLE IF NOT EXISTS parties(
-        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-        name VARCHAR(30) NOT NULL UNIQUE,
-        symbol VARCHAR(60),
-        votes NUMERIC(10) NOT NULL DEFAULT 0
+    query: str = f'''CREATE TABLE IF NOT EXISTS parties(
+        id INTEGER PRIMARY KEY NOT NULL,
+        name TEXT NOT NULL UNIQUE,
+        symbol TEXT,
+        votes INTEGER NOT NULL DEFAULT 0
+    ) {db.table_options()}'''
+    # Dropped from databases created by earlier versions, no query ranks
+    #   parties by this column and folds had to keep the index current.
+    drop_index_query: str = 'DROP INDEX IF EXISTS parties_votes'
+    # Catalog version, bumped by triggers whenever the party list
+    #   changes but not when votes are folded into parties.votes.
+    version_query: str = '''CREATE TABLE IF NOT EXISTS parties_version(
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL DEFAULT 0
     )'''
+    version_row_query: str = '''INSERT OR IGNORE INTO parties_version(id)
+        VALUES(0)'''
+    trigger_queries: List[str] = [
+        f'''CREATE TRIGGER IF NOT EXISTS parties_version_{event}
+            AFTER {statement} ON parties
+            BEGIN
+                UPDATE parties_version SET version = version + 1;
+            END'''
+        for event, statement in (('insert', 'INSERT'),
+                                 ('delete', 'DELETE'),
+                                 ('update', 'UPDATE OF name, symbol'))]
     try:
         cursor.execute(query)
+        cursor.execute(drop_index_query)
+        cursor.execute(version_query)
+        cursor.execute(version_row_query)
+        for trigger_query in trigger_queries:
+            cursor.execute(trigger_query)
     except sqlite3.OperationalError as e:
         print(repr(e))
         raise e
@@ -45,6 +85,11 @@ def create_table(cursor: sqlite3.Cursor) -> None:
         raise e
 
 
+def default_symbol(name: str) -> str:
+    """Symbol image file of a party, from the first word of its name."""
+    return f"{name.lower().split(' ')[0]}.png"
+
+
 def populate_table(cursor: sqlite3.Cursor, parties: Iterable):
     """[summary]
 
@@ -61,8 +106,7 @@ def populate_table(cursor: sqlite3.Cursor, parties: Iterable):
             query: str = '''INSERT INTO parties(name, symbol)
                 VALUES(?, ?)'''
             try:
-                cursor.execute(query,
-                    (party, f"{party.lower().split(' ')[0]}.png"))
+                cursor.execute(query, (party, default_symbol(party)))
             except sqlite3.IntegrityError as e:
                 print(repr(e))
                 continue
@@ -74,10 +118,12 @@ def populate_table(cursor: sqlite3.Cursor, parties: Iterable):
         raise e
 
 
+@storage.routed
+@db.read_only
 @db.connect_with_cursor
 def select_all(cursor: sqlite3.Cursor) -> Sequence[Party]:
 
-    query: str = 'SELECT id, name, symbol, votes from parties ORDER BY name ASC'
+    query: str = 'SELECT id, name, symbol, votes from standings ORDER BY name ASC'
     return [
         Party(
             _id=_id, name=name, selector=str(i+1), symbol=symbol, votes=votes)
@@ -85,15 +131,22 @@ def select_all(cursor: sqlite3.Cursor) -> Sequence[Party]:
     ]
 
 
+@storage.routed
+@db.read_only
 @db.connect_with_cursor
-def select_results(cursor: sqlite3.Cursor) -> Sequence[Party]:
-
-    query: str = '''SELECT id, name, symbol, votes from parties
-                    ORDER BY votes DESC'''
+def select_results(cursor: sqlite3.Cursor,
+                   scope: Optional[district.Scope] = None) -> Sequence[Party]:
+    """Get parties ranked by votes, nationally or in a region or district.
+    """
+    standings, params = district.standings_query(scope)
+    query: str = f'''WITH scoped AS ({standings})
+                     SELECT id, name, symbol, votes FROM scoped
+                     ORDER BY votes DESC, name ASC'''
     return [
         Party(
             _id=_id, name=name, selector=str(i+1), symbol=symbol, votes=votes)
-        for i, (_id, name, symbol, votes) in enumerate(cursor.execute(query))
+        for i, (_id, name, symbol, votes) in enumerate(
+            cursor.execute(query, params))
     ]
 
 
@@ -104,33 +157,58 @@ def get_by_selector(parties: Sequence[Party], selector: str) -> optional[Party]:
     return None
 
 
+@storage.routed
+@db.read_only
 @db.connect_with_cursor
-def select_winners(cursor: sqlite3.Cursor) -> Sequence[Party]:
-
-    query: str = 'SELECT MAX(votes) FROM parties'
-    max_vote_count: int = cursor.execute(query).fetchone()[0]
-    query: str = f'''SELECT id, name, symbol, votes from parties
-                     WHERE votes = {max_vote_count}'''
+def select_winners(cursor: sqlite3.Cursor,
+                   scope: Optional[district.Scope] = None) -> Sequence[Party]:
+    """Get parties with most votes, nationally or in a region or district.
+    """
+    standings, params = district.standings_query(scope)
+    query: str = f'''WITH scoped AS ({standings})
+                     SELECT id, name, symbol, votes FROM scoped
+                     WHERE votes = (SELECT MAX(votes) FROM scoped)
+                     ORDER BY name ASC'''
     return [
         Party(
             _id=_id, name=name, selector=str(i+1), symbol=symbol, votes=votes)
-        for i, (_id, name, symbol, votes) in enumerate(cursor.execute(query))
+        for i, (_id, name, symbol, votes) in enumerate(
+            cursor.execute(query, params))
     ]
 
 
+@storage.routed
+@db.read_only
 @db.connect_with_cursor
 def get_by_id(cursor: sqlite3.Cursor, _id: int) -> Optional[Party]:
 
-    query: str = 'SELECT id, name, symbol, votes FROM parties WHERE id = ?'
-    _id, name, symbol, votes = cursor.execute(query, (_id,)).fetchone()
+    query: str = 'SELECT id, name, symbol, votes FROM standings WHERE id = ?'
+    row = cursor.execute(query, (_id,)).fetchone()
+    if row is None:
+        return None
+    _id, name, symbol, votes = row
     return Party(_id=_id, name=name, symbol=symbol, votes=votes)
 
 
-def add_vote(cursor: sqlite3.Cursor, party: Party) -> None:
+def add_vote(cursor: sqlite3.Cursor,
+             party: Union[Party, PartyRecord],
+             district_id: Optional[int] = None) -> int:
+    """Add a vote for party by appending a ballot to the ledger.
+
+    The party object itself is not changed, current votes are read from
+      the standings view or the results cache.
 
-    query: str = '''UPDATE parties SET votes = votes + 1 WHERE id = ?'''
-    cursor.execute(query, (party._id,))
-    party.votes += 1
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor, inside the vote
+          transaction
+        party (Union[Party, PartyRecord]): Party voted for
+        district_id (Optional[int], optional): District of voter.
+          Defaults to None.
+
+    Returns:
+        int: Ballot ID
+    """
+    return ballot.record(cursor, party._id, district_id)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+import array
+import sqlite3
+import sys
+from typing import Iterable, Sequence, Tuple
+
+import electionday.config as config
+
+
+# Preferences are stored as unsigned 16-bit little-endian party IDs.
+_TYPECODE: str = 'H'
+
+
+class InvalidPreferencesError(ValueError):
+    """Raised when a ranked ballot's preference list can't be counted.
+    """
+
+
+class MissingPreferencesError(Exception):
+    """Raised when ranked ballots are counted after a journal replay that
+      couldn't restore their preferences.
+    """
+
+
+def create_table(cursor: sqlite3.Cursor) -> None:
+    """Create ranked ballots table if it doesn't exist.
+
+    A ranked ballot is an ordinary ballot for its first preference, so
+      live results, the ballot journal and turnout work unchanged, plus
+      a row here with the full preference list as a packed array of
+      party IDs. The array layout is what the counting engine loads
+      without per-preference rows, see stv module.
+
+    ranked_state records whether every ranked ballot has its row, which
+      is no longer known after replaying a journal written without
+      preferences, see replay module.
+
+    To be called from a create_tables function in setup, after the
+      ballots table has been created.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+
+    Raises:
+        sqlite3.Error: SQLite exception
+        Exception: Generic exception
+    """
+    queries: tuple = (
+        '''CREATE TABLE IF NOT EXISTS ranked_ballots(
+            id INTEGER PRIMARY KEY NOT NULL REFERENCES ballots(id),
+            preferences BLOB NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS ranked_state(
+            id INTEGER PRIMARY KEY NOT NULL CHECK (id = 0),
+            complete NUMERIC(1) NOT NULL DEFAULT 1
+        )''',
+        'INSERT OR IGNORE INTO ranked_state(id) VALUES(0)',
+    )
+    try:
+        for query in queries:
+            cursor.execute(query)
+    except sqlite3.OperationalError as e:
+        print(repr(e))
+        raise e
+    except Exception as e:
+        print(repr(e))
+        raise e
+
+
+def validate(party_ids: Iterable[int],
+             max_preferences: int = config.RANKED_MAX_PREFERENCES
+             ) -> Tuple[int, ...]:
+    """Check a preference list, most preferred party first.
+
+    Raises:
+        InvalidPreferencesError: Empty, too long, repeated parties or
+          party IDs out of range
+
+    Returns:
+        Tuple[int, ...]: Party IDs
+    """
+    preferences: Tuple[int, ...] = tuple(int(_id) for _id in party_ids)
+    if not preferences:
+        raise InvalidPreferencesError('At least one preference is required')
+    if len(preferences) > max_preferences:
+        raise InvalidPreferencesError(
+            f'At most {max_preferences} preferences are allowed')
+    if len(set(preferences)) != len(preferences):
+        raise InvalidPreferencesError('A party can only be ranked once')
+    if not all(0 < _id < 1 << 16 for _id in preferences):
+        raise InvalidPreferencesError('Invalid party ID')
+    return preferences
+
+
+def encode(party_ids: Sequence[int]) -> bytes:
+    """Pack party IDs as stored in ranked_ballots.preferences."""
+    packed = array.array(_TYPECODE, party_ids)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def decode(preferences: bytes) -> Tuple[int, ...]:
+    """Unpack stored preferences into party IDs."""
+    packed = array.array(_TYPECODE, preferences)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return tuple(packed)
+
+
+def record(cursor: sqlite3.Cursor, ballot_id: int,
+           party_ids: Sequence[int]) -> None:
+    """Store the preference list of a ballot, inside its vote transaction.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        ballot_id (int): ID of the first preference ballot
+        party_ids (Sequence[int]): Validated preferences, see validate
+    """
+    cursor.execute('INSERT INTO ranked_ballots(id, preferences) VALUES(?, ?)',
+                   (ballot_id, encode(party_ids)))
+
+
+def set_complete(cursor: sqlite3.Cursor, complete: bool) -> None:
+    """Record whether ranked_ballots holds every ranked ballot's
+      preferences, inside the transaction that made it so."""
+    cursor.execute('UPDATE ranked_state SET complete = ?', (int(complete),))
+
+
+def check_complete(cursor: sqlite3.Cursor) -> None:
+    """Raise unless ranked_ballots holds every ranked ballot's preferences.
+
+    Raises:
+        MissingPreferencesError: Votes were replayed from a journal
+          without preferences
+    """
+    complete, = cursor.execute(
+        'SELECT complete FROM ranked_state').fetchone()
+    if not complete:
+        raise MissingPreferencesError(
+            'Votes were replayed from a journal without preferences,'
+            ' ranked ballots can\'t be counted')
@@ -0,0 +1,203 @@
+import argparse
+import collections
+import concurrent.futures
+from dataclasses import asdict, dataclass, field
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import time
+from typing import Any, Counter, Dict, List, Optional, Sequence, Tuple
+
+import electionday.config as config
+
+
+@dataclass
+class PartyRecount:
+    """Recounted votes for a party compared with its vote counter.
+    """
+    _id: int
+    name: str
+    recounted: int
+    recorded: int
+
+    @property
+    def difference(self) -> int:
+        return self.recorded - self.recounted
+
+
+@dataclass
+class RecountReport:
+    """Result of a full recount of one or more databases.
+    """
+    parties: List[PartyRecount] = field(default_factory=list)
+    ballots: int = 0
+    voters_voted: int = 0
+    seconds: float = 0.0
+
+    @property
+    def discrepancies(self) -> List[PartyRecount]:
+        return [party for party in self.parties if party.difference]
+
+    @property
+    def ok(self) -> bool:
+        """True if every counter and the voter count match the ballots."""
+        return not self.discrepancies and self.ballots == self.voters_voted
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for party, row in zip(self.parties, data['parties']):
+            row['difference'] = party.difference
+        data['ok'] = self.ok
+        return data
+
+
+def _connect(path: Any) -> sqlite3.Connection:
+    uri: str = pathlib.Path(path).resolve().as_uri() + '?mode=ro'
+    return sqlite3.connect(uri, uri=True)
+
+
+def _count_chunk(path: Any, table: str, first: int, last: int
+                 ) -> Counter[int]:
+    """Count ballots per party, or voters who voted, in a rowid range.
+
+    Run in a worker process with its own read-only connection.
+
+    Returns:
+        Counter[int]: Votes per party ID, or voted count under key 0
+    """
+    connection = _connect(path)
+    try:
+        if table == 'ballots':
+            query: str = '''SELECT party_id, COUNT(*) FROM ballots
+                WHERE id >= ? AND id <= ? GROUP BY party_id'''
+            return collections.Counter(
+                dict(connection.execute(query, (first, last))))
+        query: str = '''SELECT COUNT(*) FROM voters
+            WHERE id >= ? AND id <= ? AND has_voted = 1'''
+        return collections.Counter(
+            {0: connection.execute(query, (first, last)).fetchone()[0]})
+    finally:
+        connection.close()
+
+
+def _chunks(first: int, last: int, size: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + size - 1, last))
+            for start in range(first, last + 1, size)]
+
+
+def _snapshot(path: Any) -> Tuple[List[Tuple[int, str, int]], int, int, int]:
+    """Read party counters and table bounds in one read transaction."""
+    connection = _connect(path)
+    try:
+        connection.execute('BEGIN')
+        parties = connection.execute(
+            'SELECT id, name, votes FROM parties ORDER BY id').fetchall()
+        folded: int = connection.execute(
+            'SELECT folded_ballot_id FROM tally').fetchone()[0]
+        last_ballot: int = connection.execute(
+            'SELECT COALESCE(MAX(id), 0) FROM ballots').fetchone()[0]
+        last_voter: int = connection.execute(
+            'SELECT COALESCE(MAX(id), 0) FROM voters').fetchone()[0]
+        connection.rollback()
+        return parties, folded, last_ballot, last_voter
+    finally:
+        connection.close()
+
+
+def recount(paths: Sequence[Any],
+            workers: Optional[int] = None,
+            chunk_size: int = config.RECOUNT_CHUNK_SIZE) -> RecountReport:
+    """Recount all ballots from the ledger and audit the party counters.
+
+    Ballot and voter rowid ranges are split into chunks and counted in
+      parallel by a process pool, partial counts are merged at the end.
+      Ballots up to the tally watermark are compared with parties.votes,
+      which holds exactly those ballots, so any difference means the
+      counter has drifted from the ledger. Party and voter counts of
+      several databases (shards) are summed by party name.
+
+    Args:
+        paths (Sequence[Any]): Database files to recount
+        workers (Optional[int], optional): Worker processes.
+          Defaults to None, the CPU count.
+        chunk_size (int, optional): Rows per chunk.
+          Defaults to config.RECOUNT_CHUNK_SIZE.
+
+    Returns:
+        RecountReport: Recounted and recorded votes per party
+    """
+    started: float = time.perf_counter()
+    report = RecountReport()
+    parties: Dict[str, PartyRecount] = {}
+    with concurrent.futures.ProcessPoolExecutor(
+            workers or os.cpu_count() or 1) as pool:
+        for path in paths:
+            party_rows, folded, last_ballot, last_voter = _snapshot(path)
+            folded_chunks = _chunks(1, folded, chunk_size)
+            pending_chunks = _chunks(folded + 1, last_ballot, chunk_size)
+            folded_futures = [pool.submit(_count_chunk, path, 'ballots', *c)
+                              for c in folded_chunks]
+            pending_futures = [pool.submit(_count_chunk, path, 'ballots', *c)
+                               for c in pending_chunks]
+            voter_futures = [pool.submit(_count_chunk, path, 'voters', *c)
+                             for c in _chunks(1, last_voter, chunk_size)]
+            folded_counts: Counter[int] = sum(
+                (future.result() for future in folded_futures),
+                collections.Counter())
+            pending_counts: Counter[int] = sum(
+                (future.result() for future in pending_futures),
+                collections.Counter())
+            report.voters_voted += sum(
+                future.result()[0] for future in voter_futures)
+            report.ballots += sum(folded_counts.values()) + sum(
+                pending_counts.values())
+            for _id, name, votes in party_rows:
+                party = parties.setdefault(
+                    name, PartyRecount(_id=_id, name=name,
+                                       recounted=0, recorded=0))
+                # Recorded is what the results show: the counter plus
+                #   ballots not yet folded into it.
+                party.recorded += int(votes) + pending_counts[_id]
+                party.recounted += folded_counts[_id] + pending_counts[_id]
+    report.parties = sorted(parties.values(),
+                            key=lambda party: (-party.recounted, party.name))
+    report.seconds = round(time.perf_counter() - started, 3)
+    return report
+
+
+def main() -> None:
+    """Run a recount from the command line.
+
+    Exits with status 1 if any discrepancy is found.
+    """
+    parser = argparse.ArgumentParser(
+        description='Recount ballots and audit party vote counters')
+    parser.add_argument('--db', action='append', type=pathlib.Path,
+                        help='Database file, repeat for shards.'
+                        f' Defaults to {config.DB_PATH}')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int,
+                        default=config.RECOUNT_CHUNK_SIZE)
+    parser.add_argument('--json', action='store_true',
+                        help='Print report as JSON')
+    args = parser.parse_args()
+    report = recount(args.db or [config.DB_PATH], args.workers,
+                     args.chunk_size)
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        for party in report.parties:
+            flag: str = f'  MISMATCH {party.difference:+d}' if (
+                party.difference) else ''
+            print(f'{party.recounted:>12,}  {party.name}{flag}')
+        print(f'{report.ballots:,} ballots, {report.voters_voted:,} voters'
+              f' voted, recounted in {report.seconds}s')
+        if report.ballots != report.voters_voted:
+            print('MISMATCH: ballot count differs from voters who voted')
+    sys.exit(0 if report.ok else 1)
+
+
+if __name__ == '__main__':
+    main()
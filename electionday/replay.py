@@ -0,0 +1,243 @@
+import argparse
+from dataclasses import asdict, dataclass
+import json
+import pathlib
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, List, Optional
+
+import electionday.ballot as ballot
+import electionday.bench as bench
+import electionday.catalog as catalog
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.eligibility as eligibility
+import electionday.journal as journal
+import electionday.ranked as ranked
+import electionday.results as results
+import electionday.roll as roll
+import electionday.voter as voter_model
+import electionday.writer as ballot_writer
+
+
+@dataclass
+class ReplayReport:
+    """Outcome of rebuilding a database from a ballot journal.
+    """
+    ballots: int = 0
+    voters: int = 0
+    unknown_voters: int = 0
+    unknown_parties: int = 0
+    # Ballots from a journal written without preferences, after which
+    #   ranked ballots can't be counted.
+    missing_preferences: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    offset: int = 0
+
+
+@db.connect
+def _rebuild(connection: sqlite3.Connection, reader: journal.JournalReader,
+             batch_size: int) -> ReplayReport:
+    """Replace ballots, ranked preferences and has_voted flags with the
+      journal's, in one transaction.
+    """
+    report = ReplayReport()
+    cursor: Optional[sqlite3.Cursor] = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('DELETE FROM ranked_ballots')
+        cursor.execute('DELETE FROM ballots')
+        cursor.execute('UPDATE voters SET has_voted = 0 WHERE has_voted != 0')
+        cursor.execute('UPDATE parties SET votes = 0')
+        cursor.execute('UPDATE tally SET folded_ballot_id = 0')
+        district.reset(cursor)
+        cursor.execute('''CREATE TEMP TABLE replay_voters(
+            voter_id TEXT PRIMARY KEY NOT NULL) WITHOUT ROWID''')
+        for batch in roll.batched(reader, batch_size):
+            # Ballots are counted in their voter's current district.
+            cursor.executemany(
+                '''INSERT OR IGNORE INTO ballots(id, party_id, district_id)
+                VALUES(?, ?, (SELECT district_id FROM voters
+                              WHERE voter_id = ?))''',
+                [(entry.ballot_id, entry.party_id, entry.voter_id)
+                 for entry in batch])
+            report.ballots += cursor.rowcount
+            # Ballot IDs are unique in a journal, so a ballot's
+            #   preferences are those of the entry that inserted it.
+            cursor.executemany(
+                '''INSERT OR IGNORE INTO ranked_ballots(id, preferences)
+                VALUES(?, ?)''',
+                [(entry.ballot_id, ranked.encode(entry.preferences))
+                 for entry in batch if entry.preferences])
+            report.missing_preferences += sum(
+                entry.preferences is None for entry in batch)
+            cursor.executemany(
+                'INSERT OR IGNORE INTO temp.replay_voters VALUES(?)',
+                [(entry.voter_id,) for entry in batch])
+        report.voters = cursor.execute('''UPDATE voters SET has_voted = 1
+            WHERE voter_id IN (SELECT voter_id FROM temp.replay_voters)'''
+                                       ).rowcount
+        report.unknown_voters = cursor.execute(
+            'SELECT COUNT(*) FROM temp.replay_voters').fetchone()[0] - (
+                report.voters)
+        report.unknown_parties = cursor.execute('''SELECT COUNT(*)
+            FROM ballots WHERE party_id NOT IN (SELECT id FROM parties)'''
+                                                ).fetchone()[0]
+        ranked.set_complete(cursor, not report.missing_preferences)
+        ballot.fold(cursor)
+        cursor.execute('DROP TABLE temp.replay_voters')
+    finally:
+        if cursor:
+            cursor.close()
+    return report
+
+
+def rebuild(path: Any, batch_size: int = config.IMPORT_BATCH_SIZE
+            ) -> ReplayReport:
+    """Rebuild ballots, party and district totals and has_voted flags
+      from a journal.
+
+    The journal is authoritative: existing ballots, preferences and
+      flags are replaced. A journal written before preferences were
+      journaled restores first preferences only, and ranked ballots
+      of the rebuilt database can't be counted.
+
+    The database must already hold the parties and voters, e.g. freshly
+      created by setup_db from the same data. Ballots are inserted with
+      executemany and voters are flagged with one UPDATE joined against
+      a temporary table, then the totals are folded once.
+
+    Args:
+        path (Any): Journal file
+        batch_size (int, optional): Ballots per executemany call.
+          Defaults to config.IMPORT_BATCH_SIZE.
+
+    Returns:
+        ReplayReport: Counts, and where reading stopped if the journal
+          ends in a torn write
+    """
+    started: float = time.perf_counter()
+    reader = journal.JournalReader(path)
+    report: ReplayReport = _rebuild(reader, batch_size)
+    report.error, report.offset = reader.error, reader.offset
+    if eligibility.current() is not None:
+        eligibility.build()
+    results.CACHE.invalidate()
+    report.seconds = round(time.perf_counter() - started, 3)
+    return report
+
+
+def load_test(path: Any, speed: float = 1.0) -> dict:
+    """Re-cast a journal's ballots through the group-commit writer, paced
+      at speed times the recorded rate.
+
+    Use on a database set up with the same voters and parties but no
+      votes. The report shows whether the write path keeps up: how far
+      submissions fell behind schedule and commit latency per ballot.
+
+    Args:
+        path (Any): Journal file
+        speed (float, optional): Replay rate relative to the recorded
+          rate, 0 for as fast as possible. Defaults to 1.0.
+
+    Raises:
+        ValueError: Journal is the one the database appends to
+
+    Returns:
+        dict: Machine-readable load test report
+    """
+    if journal.journal_path(db.get_provider().path) == pathlib.Path(path):
+        raise ValueError('Cannot load test into the journal being read')
+    reader = journal.JournalReader(path)
+    ballots = ballot_writer.BallotWriter()
+    latencies: List[float] = []
+    errors: List[int] = [0]
+    skipped: int = 0
+    lock = threading.Lock()
+    clock = time.perf_counter
+    lag: float = 0.0
+    first_ns: Optional[int] = None
+    started: float = clock()
+
+    def done(future, submitted: float) -> None:
+        with lock:
+            latencies.append(clock() - submitted)
+            if future.exception() is not None:
+                errors[0] += 1
+
+    try:
+        for entry in reader:
+            if first_ns is None:
+                first_ns = entry.timestamp_ns
+            if speed > 0:
+                due: float = (entry.timestamp_ns - first_ns) / 1e9 / speed
+                delay: float = due - (clock() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    lag = max(lag, -delay)
+            voter = voter_model.get_by_voter_id(entry.voter_id)
+            party = catalog.CATALOG.by_id(entry.party_id)
+            if voter is None or party is None:
+                skipped += 1
+                continue
+            submitted: float = clock()
+            ballots.submit(voter, party, entry.preferences or ()
+                           ).add_done_callback(
+                lambda future, submitted=submitted: done(future, submitted))
+    finally:
+        ballots.close()
+    elapsed: float = clock() - started
+    return {
+        'ballots': len(latencies) - errors[0],
+        'errors': errors[0],
+        'skipped': skipped,
+        'commits': ballots.batches,
+        'speed': speed,
+        'seconds': round(elapsed, 3),
+        'ballots_per_sec': round(len(latencies) / elapsed, 1),
+        'max_lag_ms': round(lag * 1000, 3),
+        'latency': bench.percentiles(latencies),
+        'journal_error': reader.error,
+    }
+
+
+def main() -> None:
+    """Rebuild a database from its ballot journal, or replay the journal
+      as a load test, from the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description='Rebuild votes from a ballot journal')
+    parser.add_argument('journal', type=pathlib.Path,
+                        help='Ballot journal file')
+    parser.add_argument('--db', type=pathlib.Path, default=config.DB_PATH,
+                        help=f'Database file. Defaults to {config.DB_PATH}')
+    parser.add_argument('--batch-size', type=int,
+                        default=config.IMPORT_BATCH_SIZE)
+    parser.add_argument('--speed', type=float, default=None,
+                        help='Re-cast ballots at this multiple of the'
+                        ' recorded rate (0 for unpaced) as a load test,'
+                        ' instead of rebuilding')
+    args = parser.parse_args()
+    provider = db.configure(args.db)
+    try:
+        if args.speed is None:
+            report: dict = asdict(rebuild(args.journal, args.batch_size))
+        else:
+            report = load_test(args.journal, args.speed)
+    finally:
+        provider.close()
+    print(json.dumps(report, indent=2))
+    error: Optional[str] = report.get('error') or report.get('journal_error')
+    if error:
+        print(f'Journal ends with {error}, later entries were skipped',
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+import electionday.config as config
+import electionday.database as db
+
+
+def replica_path(path: Any) -> Optional[pathlib.Path]:
+    """Default replica file of a database, None for in-memory databases.
+    """
+    if path is None or str(path) in ('', ':memory:'):
+        return None
+    path = pathlib.Path(path)
+    return path.with_name(path.name + config.REPLICA_SUFFIX)
+
+
+class ReplicaProvider(db.ConnectionProvider):
+    """Connections to the newest published replica.
+
+    The replica file is never written in place, a new snapshot replaces
+      it with a rename, so connections open it immutable: SQLite takes
+      no locks and doesn't check for changes. Each thread reopens its
+      connection on first use after a new snapshot was published, until
+      then it keeps reading the previous one.
+    """
+
+    def __init__(self, path: Any):
+        super().__init__(path)
+        self.generation: int = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if getattr(self._local, 'generation', None) != self.generation:
+            connection: Optional[sqlite3.Connection] = getattr(
+                self._local, 'connection', None)
+            if connection is not None:
+                with self._lock:
+                    self._connections.remove(connection)
+                connection.close()
+            self._local.connection = None
+            self._local.generation = self.generation
+        return super().connection
+
+    def open(self) -> sqlite3.Connection:
+        uri: str = (pathlib.Path(self.path).resolve().as_uri()
+                    + '?mode=ro&immutable=1')
+        try:
+            connection = sqlite3.connect(uri, uri=True,
+                                         check_same_thread=False)
+            connection.execute(f'PRAGMA mmap_size = {self.mmap_size}')
+        except sqlite3.Error as e:
+            print(repr(e))
+            raise e
+        return connection
+
+
+class ReplicaPublisher:
+    """Copy the live database into a read-only replica file every
+      interval seconds.
+
+    Each snapshot is one online backup (Connection.backup) of the whole
+      database, made in a single read transaction so it is consistent.
+      In WAL mode that read doesn't block ballot writers. The copy is
+      switched to rollback journaling and renamed over the replica, so
+      readers see either the previous snapshot or the new one.
+
+    While the publisher keeps up, replica reads are at most
+      staleness_bound seconds behind the primary.
+    """
+
+    def __init__(self,
+                 source: Any = None,
+                 path: Any = None,
+                 interval: float = config.REPLICA_INTERVAL):
+        self.source = db.get_provider().path if source is None else source
+        self.path: Optional[pathlib.Path] = (
+            replica_path(self.source) if path is None
+            else pathlib.Path(path))
+        if self.path is None:
+            raise ValueError('In-memory databases have no replica')
+        self.interval: float = max(float(interval), 0.0)
+        self.provider = ReplicaProvider(self.path)
+        # Time of the read snapshot behind the newest replica, 0 if none.
+        self.published_at: float = 0.0
+        # Seconds the newest snapshot took to copy.
+        self.seconds: float = 0.0
+        self.snapshots: int = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def staleness(self) -> float:
+        """Age in seconds of the data in the newest replica, infinite
+          before the first snapshot."""
+        if not self.published_at:
+            return float('inf')
+        return time.time() - self.published_at
+
+    @property
+    def staleness_bound(self) -> float:
+        """Most seconds replica reads lag the primary while snapshots
+          are published on schedule: the interval plus a copy."""
+        return self.interval + self.seconds
+
+    @property
+    def fresh(self) -> bool:
+        """True while the replica is within config.REPLICA_MAX_STALENESS.
+        """
+        return self.staleness <= config.REPLICA_MAX_STALENESS
+
+    def publish(self) -> pathlib.Path:
+        """Take a snapshot of the database and publish it as the replica.
+
+        Raises:
+            sqlite3.Error: Database exception
+
+        Returns:
+            pathlib.Path: Replica file
+        """
+        with self._lock:
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            tmp_path.unlink(missing_ok=True)
+            started: float = time.perf_counter()
+            source = db.ConnectionProvider(self.source).open()
+            target = sqlite3.connect(tmp_path)
+            try:
+                snapshot_at: float = time.time()
+                source.backup(target)
+                target.execute('PRAGMA journal_mode = DELETE')
+            except sqlite3.Error as e:
+                print(repr(e))
+                raise e
+            finally:
+                target.close()
+                source.close()
+            os.replace(tmp_path, self.path)
+            self.seconds = time.perf_counter() - started
+            self.published_at = snapshot_at
+            self.snapshots += 1
+            self.provider.generation += 1
+            return self.path
+
+    def start(self) -> None:
+        """Publish a snapshot now and then every interval seconds from a
+          background thread, until close."""
+        self.publish()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='replica-publisher', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                # Keep publishing, readers fall back once it's stale.
+                print(repr(e))
+
+    def close(self) -> None:
+        """Stop publishing and close replica connections."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.provider.close()
+
+
+_publisher: Optional[ReplicaPublisher] = None
+
+
+def _read_provider() -> Optional[db.ConnectionProvider]:
+    """Replica provider for read-only model functions, None to read the
+      primary because the replica is missing or too stale."""
+    publisher: Optional[ReplicaPublisher] = _publisher
+    if publisher is None or not publisher.fresh:
+        return None
+    return publisher.provider
+
+
+def start(source: Any = None, path: Any = None,
+          interval: float = config.REPLICA_INTERVAL) -> ReplicaPublisher:
+    """Start publishing replicas and send read-only model functions
+      (see database.read_only) to the newest one.
+
+    Args:
+        source (Any, optional): Database to copy. Defaults to None, the
+          database of the connection provider.
+        path (Any, optional): Replica file. Defaults to None, next to
+          the database with config.REPLICA_SUFFIX.
+        interval (float, optional): Seconds between snapshots.
+          Defaults to config.REPLICA_INTERVAL.
+
+    Returns:
+        ReplicaPublisher: Running publisher
+    """
+    global _publisher
+    stop()
+    publisher = ReplicaPublisher(source, path, interval)
+    publisher.start()
+    _publisher = publisher
+    db.set_read_provider(_read_provider)
+    return publisher
+
+
+def stop() -> None:
+    """Stop publishing, read-only model functions read the primary again.
+    """
+    global _publisher
+    publisher, _publisher = _publisher, None
+    if publisher is not None:
+        db.set_read_provider(None)
+        publisher.close()
+
+
+def current() -> Optional[ReplicaPublisher]:
+    """Get running publisher, if any."""
+    return _publisher
+
+
+def main() -> None:
+    """Publish replicas of a database from the command line, for readers
+      in other processes."""
+    parser = argparse.ArgumentParser(
+        description='Publish read-only replicas of an ElectionDay database')
+    parser.add_argument('--db', type=pathlib.Path, default=config.DB_PATH,
+                        help='Database file')
+    parser.add_argument('--replica', type=pathlib.Path, default=None,
+                        help='Replica file, defaults to the database file'
+                        f' with suffix {config.REPLICA_SUFFIX}')
+    parser.add_argument('--interval', type=float,
+                        default=config.REPLICA_INTERVAL,
+                        help='Seconds between snapshots')
+    args = parser.parse_args()
+    publisher = ReplicaPublisher(args.db, args.replica, args.interval)
+    print(f'Publishing {publisher.path} every {publisher.interval}s')
+    try:
+        while True:
+            publisher.publish()
+            print(f'Snapshot {publisher.snapshots} in'
+                  f' {publisher.seconds:.3f}s, staleness bound'
+                  f' {publisher.staleness_bound:.3f}s', flush=True)
+            time.sleep(publisher.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import dataclasses
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import electionday.database as db
+from electionday.party import Party
+import electionday.storage as storage
+
+
+@db.connect_with_cursor
+def _load(cursor: sqlite3.Cursor) -> Tuple[List[Party], int]:
+    """Read standings and the latest ballot ID from one snapshot.
+
+    Args:
+        cursor (sqlite3.Cursor): Passed via decorator
+
+    Returns:
+        Tuple[List[Party], int]: Ranked parties and latest ballot ID
+    """
+    cursor.execute('BEGIN')
+    query: str = '''SELECT id, name, symbol, votes FROM standings
+                    ORDER BY votes DESC, name ASC'''
+    parties: List[Party] = [
+        Party(_id=_id, name=name, symbol=symbol, votes=votes)
+        for _id, name, symbol, votes in cursor.execute(query)
+    ]
+    query: str = 'SELECT COALESCE(MAX(id), 0) FROM ballots'
+    latest_ballot_id: int = cursor.execute(query).fetchone()[0]
+    return parties, latest_ballot_id
+
+
+@db.connect_with_cursor
+def _latest_ballot_id(cursor: sqlite3.Cursor) -> int:
+    query: str = 'SELECT COALESCE(MAX(id), 0) FROM ballots'
+    return cursor.execute(query).fetchone()[0]
+
+
+class ResultsCache:
+    """In-memory ranked standings and winners.
+
+    Votes cast in this process are applied incrementally with
+      record_vote once committed. Writes from other connections or
+      processes are detected with PRAGMA data_version, which only
+      changes when another connection commits, and compared against the
+      latest ballot ID the cache has seen before reloading. While
+      nothing changes a read costs one pragma and no table access.
+
+    With a storage engine other than SQLite, results and winners are
+      read from that engine instead, see storage module.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._provider: Optional[db.ConnectionProvider] = None
+        self._ranking: List[Party] = []
+        self._parties: Dict[int, Party] = {}
+        # Ballots recorded out of order, waiting for the ones before them.
+        self._pending: Dict[int, int] = {}
+        self.ballot_id: int = -1
+        self.version: int = 0
+
+    def invalidate(self) -> None:
+        """Drop cached standings, next read reloads from database."""
+        with self._lock:
+            self._provider = None
+            self.ballot_id = -1
+            self._pending.clear()
+
+    def _data_version(self) -> int:
+        return db.get_connection().execute(
+            'PRAGMA data_version').fetchone()[0]
+
+    def _reload(self) -> None:
+        self._provider = db.get_provider()
+        self._local.data_version = self._data_version()
+        parties, ballot_id = _load()
+        self._ranking = parties
+        self._parties = {party._id: party for party in parties}
+        self._pending = {
+            _id: party_id for _id, party_id in self._pending.items()
+            if _id > ballot_id}
+        self.ballot_id = ballot_id
+        self.version += 1
+        self._drain()
+
+    def _is_stale(self) -> bool:
+        if self.ballot_id < 0 or self._provider is not db.get_provider():
+            return True
+        data_version: int = self._data_version()
+        if getattr(self._local, 'data_version', None) == data_version:
+            return False
+        self._local.data_version = data_version
+        return _latest_ballot_id() != self.ballot_id
+
+    def _validate(self) -> None:
+        with self._lock:
+            if self._is_stale():
+                self._reload()
+
+    def record_vote(self, ballot_id: int, party_id: int) -> None:
+        """Apply a committed ballot to the cached standings.
+
+        Args:
+            ballot_id (int): ID of committed ballot
+            party_id (int): ID of party voted for
+        """
+        with self._lock:
+            if (self.ballot_id < 0 or ballot_id <= self.ballot_id
+                    or self._provider is not db.get_provider()):
+                # Not loaded, already applied or another database.
+                return
+            self._pending[ballot_id] = party_id
+            self._drain()
+
+    def _drain(self) -> None:
+        while self.ballot_id + 1 in self._pending:
+            self.ballot_id += 1
+            party = self._parties.get(self._pending.pop(self.ballot_id))
+            if party is None:
+                # Unknown party, parties changed since last load.
+                self.invalidate()
+                return
+            party.votes += 1
+            self._promote(party)
+            self.version += 1
+
+    def _promote(self, party: Party) -> None:
+        i: int = self._ranking.index(party)
+        while i > 0 and (
+                (self._ranking[i-1].votes, party.name)
+                < (party.votes, self._ranking[i-1].name)):
+            self._ranking[i-1], self._ranking[i] = party, self._ranking[i-1]
+            i -= 1
+
+    def results(self) -> Sequence[Party]:
+        """Get parties ranked by votes, same as party.select_results.
+
+        Returns:
+            Sequence[Party]: Copies of cached parties with rank selectors
+        """
+        engine: storage.Storage = storage.get_storage()
+        if engine.routed:
+            return engine.select_results()
+        self._validate()
+        with self._lock:
+            return [dataclasses.replace(party, selector=str(i+1))
+                    for i, party in enumerate(self._ranking)]
+
+    def standings(self) -> Optional[Dict[int, int]]:
+        """Get cached votes per party ID without checking the database.
+
+        Returns:
+            Optional[Dict[int, int]]: Votes by party ID, None if not loaded
+        """
+        with self._lock:
+            if self.ballot_id < 0:
+                return None
+            return {party._id: party.votes for party in self._ranking}
+
+    def winners(self) -> Sequence[Party]:
+        """Get parties with most votes, same as party.select_winners.
+
+        Returns:
+            Sequence[Party]: Copies of cached winning parties
+        """
+        engine: storage.Storage = storage.get_storage()
+        if engine.routed:
+            return engine.select_winners()
+        self._validate()
+        with self._lock:
+            if not self._ranking:
+                return []
+            top: int = self._ranking[0].votes
+            winners: List[Party] = []
+            for party in self._ranking:
+                if party.votes != top:
+                    break
+                winners.append(dataclasses.replace(
+                    party, selector=str(len(winners)+1)))
+            return winners
+
+
+# Shared cache for results screens.
+CACHE: ResultsCache = ResultsCache()
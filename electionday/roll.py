@@ -0,0 +1,306 @@
+import csv
+import itertools
+import json
+import pathlib
+import re
+from typing import Any, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+
+# Voter roll rows are (voter_id, name) pairs, same as the sample data,
+#   or (voter_id, name, district) if the roll assigns districts.
+Row = Tuple[str, ...]
+
+FORMATS: Tuple[str, ...] = ('json', 'ndjson', 'csv')
+
+_WHITESPACE = re.compile(r'\s*')
+# Skipping a value only looks for strings, brackets and braces. A run of
+#   other characters, whole strings and whole innermost arrays or objects
+#   is matched in one go, see _JSONStream._skip.
+_STRING_BODY = r'[^"\\]*(?:\\.[^"\\]*)*'
+_STRING_REST = re.compile(_STRING_BODY)
+_FLAT_ITEM = rf'[^\[\]{{}}"]|"{_STRING_BODY}"'
+_FLAT_RUN = re.compile(
+    rf'(?:{_FLAT_ITEM}|\[(?:{_FLAT_ITEM})*\]|\{{(?:{_FLAT_ITEM})*\}})*')
+_NUMBER_CHARS = re.compile(r'[-+.0-9eE]*')
+
+
+class _JSONStream:
+    """Incremental reader for large JSON documents.
+
+    Only the part of the document not yet consumed is kept in the buffer
+      so memory use is bounded by the chunk size and the largest single
+      value read, not by the size of the file.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer: str = ''
+        self.pos: int = 0
+        # Start of a value being scanned, kept in the buffer by _fill.
+        self.mark: Optional[int] = None
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        start: int = self.pos if self.mark is None else self.mark
+        self.buffer = self.buffer[start:] + chunk
+        self.pos -= start
+        if self.mark is not None:
+            self.mark = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise ValueError(f'Expected {char!r} at position {self.pos}')
+        self.pos += 1
+
+    def _decode(self) -> Any:
+        first: str = self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if first in '[{"':
+                    return self._decode_scanned()
+                # Literal or number cut off by the end of the buffer.
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer, or cut off after its
+            #   point or exponent, may continue in the next chunk, decode
+            #   it again once more data is available.
+            if (first in '-0123456789' and _NUMBER_CHARS.match(
+                    self.buffer, end).end() == len(self.buffer)
+                    and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+    def _decode_scanned(self) -> Any:
+        """Decode a string, array or object running past the buffer.
+
+        Its end is found first with _skip, which carries its state over
+          chunks, so the value is decoded once rather than again after
+          every chunk.
+        """
+        self.mark = self.pos
+        try:
+            self._skip()
+        finally:
+            start, self.mark = self.mark, None
+        value, self.pos = self.decoder.raw_decode(self.buffer, start)
+        return value
+
+    def _more(self) -> None:
+        if not self._fill():
+            raise ValueError('Unexpected end of JSON document')
+
+    def _skip_string(self) -> None:
+        self.pos += 1
+        while True:
+            self.pos = _STRING_REST.match(self.buffer, self.pos).end()
+            # Stops at the closing quote, or at the end of the buffer or
+            #   an escape cut off by it.
+            if self.pos < len(self.buffer) and self.buffer[self.pos] == '"':
+                self.pos += 1
+                return
+            self._more()
+
+    def _skip(self) -> None:
+        """Move past the value at the current position without decoding
+          it, keeping no more than a chunk in the buffer."""
+        char: str = self._peek()
+        if char == '"':
+            self._skip_string()
+            return
+        if char not in '[{':
+            self._decode()
+            return
+        self.pos += 1
+        depth: int = 1
+        while True:
+            self.pos = _FLAT_RUN.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer):
+                self._more()
+                continue
+            char = self.buffer[self.pos]
+            if char == '"':
+                # String running past the end of the buffer.
+                self._skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if char in '[{' else -1
+            if depth == 0:
+                return
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the elements of the array at the current position."""
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._decode()
+            char = self._peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" at position {self.pos}')
+
+    def iter_member(self, key: str) -> Iterator[Any]:
+        """Yield elements of the array stored under key in a top level
+          object.
+
+        Members before the requested one are skipped without decoding
+          them, so memory use stays flat whatever they hold.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            name = self._decode()
+            self._expect(':')
+            if name == key:
+                yield from self.iter_array()
+                return
+            self._skip()
+            char = self._peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f'Expected "," or "}}" at position {self.pos}')
+
+
+def iter_json_array(path: pathlib.Path, key: Optional[str] = None,
+                    chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Stream the elements of a JSON array from file.
+
+    Args:
+        path (pathlib.Path): Path to JSON file
+        key (Optional[str], optional): Top level object key holding the
+          array. Defaults to None, the document itself is the array.
+        chunk_size (int, optional): Characters read per chunk.
+          Defaults to 64k.
+
+    Yields:
+        Any: Decoded array element
+    """
+    with open(path) as f:
+        stream = _JSONStream(f, chunk_size)
+        if key is None:
+            yield from stream.iter_array()
+        else:
+            yield from stream.iter_member(key)
+
+
+def _to_row(record: Any) -> Row:
+    if isinstance(record, dict):
+        if record.get('district') is not None:
+            return (str(record['voter_id']), str(record['name']),
+                    str(record['district']))
+        return str(record['voter_id']), str(record['name'])
+    if len(record) > 2 and record[2] not in (None, ''):
+        voter_id, name, district = record[:3]
+        return str(voter_id), str(name), str(district)
+    voter_id, name = record[:2]
+    return str(voter_id), str(name)
+
+
+def iter_voters(path: pathlib.Path, fmt: Optional[str] = None
+                ) -> Iterator[Row]:
+    """Stream voters from a voter roll file as (voter_id, name) rows,
+      with the voter's district name as a third column if given.
+
+    Supported formats:
+      json: Object with a "voters" array (the data.json layout) or a
+        bare array of [voter_id, name(, district)] arrays or objects.
+      ndjson: One [voter_id, name(, district)] array or object per line.
+      csv: voter_id,name(,district) rows with an optional header row.
+
+    Args:
+        path (pathlib.Path): Path to voter roll file
+        fmt (Optional[str], optional): File format. Defaults to None,
+          guessed from the file suffix.
+
+    Raises:
+        ValueError: Unknown file format
+
+    Yields:
+        Row: Voter (voter_id, name) pair or (voter_id, name, district)
+    """
+    path = pathlib.Path(path)
+    fmt = (fmt or guess_format(path)).lower()
+    if fmt == 'json':
+        with open(path) as f:
+            top_level_array = f.read(1024).lstrip().startswith('[')
+        records = iter_json_array(path, None if top_level_array else 'voters')
+        yield from map(_to_row, records)
+    elif fmt == 'ndjson':
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield _to_row(json.loads(line))
+    elif fmt == 'csv':
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            for record in reader:
+                if record and record[0] != 'voter_id':
+                    yield _to_row(record[:3])
+                if record:
+                    break
+            for record in reader:
+                # Fields are strings already, see _to_row for the rest.
+                if len(record) == 2:
+                    yield record[0], record[1]
+                elif record:
+                    yield _to_row(record[:3])
+    else:
+        raise ValueError(f'Unknown voter roll format: {fmt}')
+
+
+def guess_format(path: pathlib.Path) -> str:
+    """Guess voter roll file format from file suffix.
+
+    Args:
+        path (pathlib.Path): Path to voter roll file
+
+    Returns:
+        str: One of FORMATS, defaults to json
+    """
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if suffix in ('.csv', '.txt'):
+        return 'csv'
+    return 'json'
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size items.
+
+    Args:
+        iterable (Iterable): Items to batch
+        size (int): Batch size
+
+    Yields:
+        List: Batch of items
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, max(size, 1)))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,65 @@
+import sys
+from typing import List, Optional, TextIO
+
+import colorama
+
+
+# Cursor home, clear screen and clear scrollback.
+CLEAR: str = '\x1b[H\x1b[2J\x1b[3J'
+
+
+class Screen:
+    """Buffered terminal output, written in one call per frame.
+
+    Text is collected until flush, so a whole screen (clear, header,
+      menu, messages) reaches the terminal in a single write instead of
+      one write per line and a subprocess to clear. Clearing uses ANSI
+      escape sequences, supported by terminals on all platforms the app
+      runs on once enable_ansi has been called.
+    """
+
+    def __init__(self, padding: int = 2, stream: Optional[TextIO] = None):
+        self.indent: str = ' ' * padding
+        self.stream: Optional[TextIO] = stream
+        self._parts: List[str] = []
+
+    def pad(self, string: str) -> str:
+        """Indent string by the screen padding."""
+        return self.indent + string
+
+    def clear(self) -> None:
+        """Start a new frame, dropping anything not yet flushed."""
+        self._parts = [CLEAR]
+
+    def write(self, text: str) -> None:
+        """Add raw text to the frame."""
+        self._parts.append(text)
+
+    def line(self, text: str = '', color: str = '', reset: str = '') -> None:
+        """Add a padded line, optionally wrapped in colour codes."""
+        self._parts.append(f'{color}{self.indent}{text}{reset}\n')
+
+    def header(self, text: str) -> None:
+        """Add a header line with a blank line above and below."""
+        self._parts.append(f'\n{self.indent}{text}\n\n')
+
+    def render(self) -> str:
+        """Frame composed so far."""
+        return ''.join(self._parts)
+
+    def flush(self) -> None:
+        """Write frame to the terminal in one call and start a new one."""
+        if not self._parts:
+            return
+        stream: TextIO = self.stream or sys.stdout
+        stream.write(self.render())
+        stream.flush()
+        self._parts = []
+
+
+def enable_ansi() -> None:
+    """Make legacy Windows consoles interpret the escape sequences Screen
+      writes (CLEAR and colours), call once before the first frame.
+      Does nothing on other terminals or when called again.
+    """
+    colorama.just_fix_windows_console()
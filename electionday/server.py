@@ -0,0 +1,451 @@
+import argparse
+import asyncio
+import concurrent.futures
+from http import HTTPStatus
+import json
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Sequence, Tuple,
+    Union)
+import urllib.parse
+
+import electionday.catalog as catalog
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.feed as feed
+import electionday.metrics as metrics
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.replica as replica
+import electionday.results as results
+import electionday.voter as voter_model
+import electionday.writer as ballot_writer
+
+
+Response = Tuple[HTTPStatus, Any]
+Handler = Callable[[Dict[str, str], Any, Dict[str, str]],
+                   Awaitable[Response]]
+
+MAX_HEADER_LINES: int = 100
+MAX_BODY_SIZE: int = 64 * 1024
+
+
+class HTTPError(Exception):
+    """Raised by handlers to send an error response.
+    """
+
+    def __init__(self, status: HTTPStatus, message: str = ''):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+
+
+def _party_to_dict(party: Union[party_model.Party, party_model.PartyRecord],
+                   votes: bool = False) -> dict:
+    data: dict = {'id': party._id, 'name': party.name,
+                  'symbol': party.symbol, 'selector': party.selector}
+    if votes:
+        data['votes'] = party.votes
+    return data
+
+
+def _credentials(body: Any) -> Tuple[str, str]:
+    if not isinstance(body, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Expected JSON object')
+    try:
+        return str(body['name']), str(body['voter_id'])
+    except KeyError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f'Missing field {e}')
+
+
+def _auth_error(failure: voter_model.AuthFailure) -> HTTPError:
+    if failure is voter_model.AuthFailure.ALREADY_VOTED:
+        return HTTPError(HTTPStatus.CONFLICT, failure.message)
+    return HTTPError(HTTPStatus.UNAUTHORIZED, failure.message)
+
+
+def _check_password(headers: Dict[str, str]) -> None:
+    if headers.get('x-password') != config.PASSWORD:
+        raise HTTPError(HTTPStatus.FORBIDDEN, 'Invalid password.')
+
+
+def _content_length(headers: Dict[str, str]) -> int:
+    value: str = headers.get('content-length', '') or '0'
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+    length: int = int(value)
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Body too large')
+    return length
+
+
+def _version(query: Dict[str, str]) -> int:
+    try:
+        return int(query.get('since', 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid since')
+
+
+def _prepare(name: str, voter_id: str, party_id: int,
+             preferences: Sequence[int] = ()
+             ) -> Tuple[voter_model.Voter, party_model.PartyRecord]:
+    """Authenticate voter and look up party, and any lower preferences,
+      before queueing a ballot.
+
+    Raises:
+        HTTPError: Invalid credentials, already voted or unknown party
+
+    Returns:
+        Tuple[voter_model.Voter, party_model.PartyRecord]: Voter and party
+    """
+    voter = voter_model.authenticate(name, voter_id)
+    if isinstance(voter, voter_model.AuthFailure):
+        raise _auth_error(voter)
+    party = catalog.CATALOG.by_id(party_id)
+    if party is None or any(catalog.CATALOG.by_id(_id) is None
+                            for _id in preferences):
+        raise HTTPError(HTTPStatus.NOT_FOUND, 'Unknown party')
+    return voter, party
+
+
+class VotingServer:
+    """Headless HTTP/JSON voting and results API.
+
+    Connections are served by one asyncio event loop. Database reads run
+      on a bounded thread pool and all ballots go through a group-commit
+      BallotWriter, so the event loop never blocks on SQLite, writers
+      never contend with each other for the write lock and concurrent
+      ballots share commits.
+
+    Endpoints:
+      POST /auth      {"name", "voter_id"} -> voter
+      GET  /parties   -> parties
+      POST /ballots   {"name", "voter_id", "party_id"} or {"name",
+                      "voter_id", "preferences": [party_id, ...]} for a
+                      ranked ballot -> ballot ID
+      GET  /results?district=NAME  X-Password header -> standings and
+                      winners, nationally or of a district or region
+      GET  /results/changes?since=N&timeout=S  X-Password header ->
+                      changes since feed version N, waits up to S seconds
+      GET  /results/stream?since=N  X-Password header -> server-sent
+                      events, one per feed version
+      GET  /metrics   X-Password header -> database metrics, if enabled
+    """
+
+    def __init__(self, read_workers: int = config.SERVER_READ_WORKERS):
+        self.readers = concurrent.futures.ThreadPoolExecutor(
+            max_workers=read_workers, thread_name_prefix='reader')
+        self.ballots = ballot_writer.BallotWriter()
+        self.routes: Dict[Tuple[str, str], Handler] = {
+            ('POST', '/auth'): self.authenticate,
+            ('GET', '/parties'): self.parties,
+            ('POST', '/ballots'): self.cast_ballot,
+            ('GET', '/results'): self.results,
+            ('GET', '/results/changes'): self.results_changes,
+            ('GET', '/results/stream'): self.results_stream,
+            ('GET', '/metrics'): self.metrics,
+        }
+
+    async def read(self, fn: Callable, *args) -> Any:
+        """Run a read-only model function on the reader pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, fn, *args)
+
+    async def authenticate(self, headers: Dict[str, str], body: Any,
+                           query: Dict[str, str]) -> Response:
+        voter = await self.read(voter_model.authenticate, *_credentials(body))
+        if isinstance(voter, voter_model.AuthFailure):
+            raise _auth_error(voter)
+        return HTTPStatus.OK, {'name': voter.name, 'voter_id': voter.voter_id}
+
+    async def parties(self, headers: Dict[str, str], body: Any,
+                      query: Dict[str, str]) -> Response:
+        parties = await self.read(catalog.CATALOG.parties)
+        return HTTPStatus.OK, [_party_to_dict(party) for party in parties]
+
+    async def cast_ballot(self, headers: Dict[str, str], body: Any,
+                          query: Dict[str, str]) -> Response:
+        name, voter_id = _credentials(body)
+        preferences: Tuple[int, ...] = ()
+        try:
+            if 'preferences' in body:
+                preferences = ranked.validate(body['preferences'])
+                party_id = preferences[0]
+            else:
+                party_id = int(body['party_id'])
+        except ranked.InvalidPreferencesError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid party_id')
+        voter, party = await self.read(_prepare, name, voter_id, party_id,
+                                       preferences)
+        try:
+            ballot_id = await self.ballots.cast_async(voter, party,
+                                                      preferences)
+        except voter_model.AlreadyVotedError:
+            raise _auth_error(voter_model.AuthFailure.ALREADY_VOTED)
+        return HTTPStatus.CREATED, {'ballot_id': ballot_id}
+
+    async def results(self, headers: Dict[str, str], body: Any,
+                      query: Dict[str, str]) -> Response:
+        _check_password(headers)
+        if query.get('district'):
+            scope: Optional[district.Scope] = await self.read(
+                district.find_scope, query['district'])
+            if scope is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND,
+                                'Unknown district or region')
+            parties, winners = await self.read(
+                lambda: (party_model.select_results(scope),
+                         party_model.select_winners(scope)))
+            return HTTPStatus.OK, {
+                'scope': {'level': scope.level, 'name': scope.name},
+                'parties': [_party_to_dict(party, votes=True)
+                            for party in parties],
+                'winners': [_party_to_dict(party, votes=True)
+                            for party in winners],
+            }
+        # Feed version before reading standings, which may be newer.
+        version, parties, winners = await self.read(
+            lambda: (feed.FEED.refresh(), results.CACHE.results(),
+                     results.CACHE.winners()))
+        return HTTPStatus.OK, {
+            'scope': {'level': district.NATIONAL, 'name': ''},
+            'version': version,
+            'parties': [_party_to_dict(party, votes=True)
+                        for party in parties],
+            'winners': [_party_to_dict(party, votes=True)
+                        for party in winners],
+        }
+
+    async def results_changes(self, headers: Dict[str, str], body: Any,
+                              query: Dict[str, str]) -> Response:
+        _check_password(headers)
+        since: int = _version(query)
+        try:
+            timeout: float = min(
+                float(query.get('timeout', config.RESULTS_POLL_TIMEOUT)),
+                config.RESULTS_POLL_TIMEOUT)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid timeout')
+        if not feed.FEED.version:
+            await self.read(feed.FEED.refresh)
+        changes: Optional[bytes] = await feed.FEED.wait_async(
+            since, max(timeout, 0.0))
+        if changes is None:
+            return HTTPStatus.NO_CONTENT, None
+        return HTTPStatus.OK, changes
+
+    async def results_stream(self, headers: Dict[str, str], body: Any,
+                             query: Dict[str, str]) -> Response:
+        _check_password(headers)
+        since: int = _version(query)
+        if not feed.FEED.version:
+            await self.read(feed.FEED.refresh)
+
+        async def events() -> AsyncIterator[bytes]:
+            version: int = since
+            while True:
+                changes: Optional[bytes] = await feed.FEED.wait_async(
+                    version, config.RESULTS_POLL_TIMEOUT)
+                if changes is None:
+                    # Comment line, keeps proxies from closing the stream.
+                    yield b':\n\n'
+                    continue
+                version = json.loads(changes)['version']
+                yield b'id: %d\ndata: %s\n\n' % (version, changes)
+
+        return HTTPStatus.OK, events()
+
+    async def metrics(self, headers: Dict[str, str], body: Any,
+                      query: Dict[str, str]) -> Response:
+        _check_password(headers)
+        registry = db.get_instrumentation()
+        if not isinstance(registry, metrics.Registry):
+            raise HTTPError(HTTPStatus.NOT_FOUND, 'Metrics are disabled')
+        return HTTPStatus.OK, registry.to_dict()
+
+    async def dispatch(self, method: str, target: str,
+                       headers: Dict[str, str], raw_body: bytes) -> Response:
+        url = urllib.parse.urlsplit(target)
+        path: str = url.path.rstrip('/') or '/'
+        handler: Optional[Handler] = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+        try:
+            body: Any = json.loads(raw_body) if raw_body else None
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid JSON')
+        query: Dict[str, str] = dict(urllib.parse.parse_qsl(url.query))
+        return await handler(headers, body, query)
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Serve HTTP/1.1 requests on a connection until it is closed."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = (
+                        request_line.decode('latin-1').split())
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST,
+                                       {'error': 'Bad request line'}, False)
+                    break
+                headers: Dict[str, str] = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = (await reader.readline()).decode('latin-1')
+                    if not line.strip():
+                        break
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    length: int = _content_length(headers)
+                except HTTPError as e:
+                    # Body can't be skipped, the connection can't be reused.
+                    await self.respond(writer, e.status,
+                                       {'error': e.message}, False)
+                    break
+                keep_alive = (
+                    headers.get('connection', '').lower() != 'close'
+                    and version.upper() == 'HTTP/1.1')
+                raw_body = await reader.readexactly(length) if length else b''
+                try:
+                    status, payload = await self.dispatch(
+                        method.upper(), target, headers, raw_body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception as e:
+                    print(repr(e))
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {'error': status.phrase}
+                if hasattr(payload, '__aiter__'):
+                    await self.stream(writer, payload)
+                    break
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: HTTPStatus,
+                      payload: Any, keep_alive: bool) -> None:
+        # Pre-encoded JSON (shared feed updates) is sent as is.
+        body: bytes = (b'' if payload is None else payload
+                       if isinstance(payload, bytes)
+                       else json.dumps(payload).encode())
+        head: str = (
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def stream(self, writer: asyncio.StreamWriter,
+                     events: AsyncIterator[bytes]) -> None:
+        """Send server-sent events until the client disconnects."""
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Connection: close\r\n\r\n')
+        await writer.drain()
+        async for event in events:
+            writer.write(event)
+            await writer.drain()
+
+    async def start(self, host: str = config.SERVER_HOST,
+                    port: int = config.SERVER_PORT) -> asyncio.AbstractServer:
+        """Start listening, returns the asyncio server."""
+        return await asyncio.start_server(
+            self.handle, host, port, backlog=config.SERVER_BACKLOG)
+
+    def close(self) -> None:
+        """Shut down executors and close database connections."""
+        self.ballots.close()
+        self.readers.shutdown(wait=True)
+        db.close()
+
+
+async def dump_metrics(registry: metrics.Registry, path: Any,
+                       interval: float) -> None:
+    """Write metrics to path every interval seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        registry.write(path)
+
+
+async def watch_results(server: VotingServer, interval: float) -> None:
+    """Publish votes committed by other processes to the results feed
+      while anyone is subscribed, until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if feed.FEED.subscribers:
+            await server.read(feed.FEED.refresh)
+
+
+async def serve(host: str, port: int, read_workers: int,
+                metrics_path: Optional[Any] = None) -> None:
+    """Run voting server until cancelled.
+
+    If metrics_path is given the database decorators are instrumented
+      and metrics are written there periodically and on shutdown. With
+      config.REPLICA_READS read-only queries are served from a read
+      replica, see replica module.
+    """
+    registry: Optional[metrics.Registry] = (
+        metrics.enable() if metrics_path else None)
+    if config.REPLICA_READS:
+        replica.start()
+    server = VotingServer(read_workers)
+    listener = await server.start(host, port)
+    addresses = ', '.join(
+        str(sock.getsockname()) for sock in listener.sockets)
+    print(f'Serving {config.APP_NAME} API on {addresses}')
+    dumper: Optional[asyncio.Task] = asyncio.create_task(dump_metrics(
+        registry, metrics_path, config.DB_METRICS_INTERVAL)) if (
+            registry) else None
+    watcher: asyncio.Task = asyncio.create_task(
+        watch_results(server, config.RESULTS_CHECK_INTERVAL))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        watcher.cancel()
+        if dumper is not None:
+            dumper.cancel()
+        replica.stop()
+        server.close()
+        if registry is not None:
+            registry.write(metrics_path)
+
+
+def main() -> None:
+    """Run voting server from the command line."""
+    parser = argparse.ArgumentParser(
+        description=f'{config.APP_NAME} HTTP/JSON voting and results API')
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    parser.add_argument('--read-workers', type=int,
+                        default=config.SERVER_READ_WORKERS)
+    parser.add_argument('--metrics', default=config.DB_METRICS_PATH,
+                        help='Instrument database calls and write metrics'
+                        ' to this file (.json or Prometheus text)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.read_workers,
+                          args.metrics))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
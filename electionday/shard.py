@@ -0,0 +1,302 @@
+import concurrent.futures
+import contextlib
+import csv
+import os
+import pathlib
+import sqlite3
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+import zlib
+
+import electionday.ballot as ballot
+import electionday.bloom as bloom
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.eligibility as eligibility
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.results as results
+import electionday.roll as roll
+import electionday.storage as storage
+import electionday.voter as voter_model
+import electionday.voting as voting
+
+
+def shard_paths(count: Optional[int] = None,
+                directory: Optional[pathlib.Path] = None,
+                ) -> List[pathlib.Path]:
+    """Database file paths for count shards.
+
+    Args:
+        count (Optional[int], optional): Number of shards.
+          Defaults to None, config.SHARD_COUNT.
+        directory (Optional[pathlib.Path], optional): Directory of shard
+          files. Defaults to None, config.DATA_DIR_PATH.
+
+    Returns:
+        List[pathlib.Path]: One path per shard
+    """
+    if count is None:
+        count = config.SHARD_COUNT
+    if directory is None:
+        directory = config.DATA_DIR_PATH
+    return [pathlib.Path(directory).joinpath(f'{config.APP_SLUG}-{i}.db')
+            for i in range(count)]
+
+
+def shard_index(voter_id: str, count: int) -> int:
+    """Shard holding a voter, stable across processes and runs.
+
+    Args:
+        voter_id (str): Voter ID
+        count (int): Number of shards
+
+    Returns:
+        int: Shard index
+    """
+    return zlib.crc32(str(voter_id).encode()) % count
+
+
+@db.connect_with_cursor
+def _cast_vote(cursor: sqlite3.Cursor,
+               voter: voter_model.Voter,
+               party: party_model.Party) -> int:
+    cursor.execute('BEGIN IMMEDIATE')
+    voter_model.vote(cursor, voter)
+    return party_model.add_vote(cursor, party, voter.district_id)
+
+
+def _partition(roll_path: pathlib.Path, fmt: Optional[str], count: int,
+               directory: pathlib.Path) -> List[pathlib.Path]:
+    """Split a voter roll into one CSV file per shard in a single pass.
+
+    Returns:
+        List[pathlib.Path]: Roll file of each shard
+    """
+    paths: List[pathlib.Path] = [
+        pathlib.Path(directory).joinpath(f'roll-{i}.csv')
+        for i in range(count)]
+    with contextlib.ExitStack() as stack:
+        writers = []
+        for path in paths:
+            writer = csv.writer(stack.enter_context(
+                open(path, 'w', newline='', encoding='utf-8')))
+            writer.writerow(('voter_id', 'name', 'district'))
+            writers.append(writer)
+        for row in roll.iter_voters(roll_path, fmt):
+            writers[shard_index(row[0], count)].writerow(row)
+    return paths
+
+
+def _populate(path: pathlib.Path, parties: Sequence[str],
+              roll_path: pathlib.Path, batch_size: int,
+              districts: Sequence[Sequence[str]] = ()) -> int:
+    """Create one shard and import its voters, run in a worker process.
+
+    Args:
+        roll_path (pathlib.Path): CSV roll of this shard only, see
+          _partition
+
+    Returns:
+        int: Number of inserted voters
+    """
+    provider = db.ConnectionProvider(path)
+    try:
+        with db.using(provider):
+            db.create_tables(party_model.create_table,
+                             district.create_table, voter_model.create_table,
+                             ballot.create_table, ranked.create_table)
+            db.populate_tables((party_model.populate_table, parties),
+                               (district.populate_table, districts))
+            inserted: int = voter_model.bulk_import(
+                roll.iter_voters(roll_path, 'csv'), batch_size=batch_size)
+            bloom.rebuild()
+            eligibility.build()
+            return inserted
+    finally:
+        provider.close()
+
+
+class ShardRouter(storage.Storage):
+    """Voter registry partitioned across several SQLite files.
+
+    Voters are assigned to a shard by hashing their voter ID. Each shard
+      is a complete database with the same parties and districts, and a
+      ballot is written to the shard of its voter in one transaction, so
+      ballots for voters on different shards commit in parallel on
+      separate write locks. Party results are the sum over all shards.
+
+    Used as the storage engine when config.SHARD_COUNT is set, see
+      storage.create, so the CLI, servers and ballot writer look voters
+      up and cast votes on the voter's shard.
+    """
+    name: str = 'sharded'
+
+    def __init__(self, paths: Optional[Sequence[Any]] = None, **options):
+        paths = shard_paths() if paths is None else list(paths)
+        if not paths:
+            raise ValueError('At least one shard is required')
+        self.providers: List[db.ConnectionProvider] = [
+            db.ConnectionProvider(path, **options) for path in paths]
+        self._sqlite = storage.SQLiteStorage()
+        # National standings of each shard, see _cached_results.
+        self._results: Dict[db.ConnectionProvider, results.ResultsCache] = {
+            provider: results.ResultsCache() for provider in self.providers}
+
+    def __len__(self) -> int:
+        return len(self.providers)
+
+    def provider_for(self, voter_id: str) -> db.ConnectionProvider:
+        """Connection provider of the shard holding voter_id."""
+        return self.providers[shard_index(voter_id, len(self.providers))]
+
+    @contextlib.contextmanager
+    def on(self, provider: db.ConnectionProvider) -> Iterator[None]:
+        """Context manager running the model functions' own queries on
+          one shard."""
+        with storage.using(self._sqlite), db.using(provider):
+            yield
+
+    def populate(self, parties: Sequence[str], roll_path: pathlib.Path,
+                 fmt: Optional[str] = None,
+                 batch_size: int = config.IMPORT_BATCH_SIZE,
+                 processes: Optional[int] = None,
+                 districts: Sequence[Sequence[str]] = ()) -> int:
+        """Create and populate all shards concurrently in a process pool.
+
+        The roll is read once and split into a temporary CSV file per
+          shard next to the shard databases, then every worker imports
+          its own file.
+
+        Args:
+            parties (Sequence[str]): Party names, copied to every shard
+            roll_path (pathlib.Path): Voter roll file
+            fmt (Optional[str], optional): Voter roll format.
+              Defaults to None, guessed from suffix.
+            batch_size (int, optional): Voters per insert batch.
+              Defaults to config.IMPORT_BATCH_SIZE.
+            processes (Optional[int], optional): Worker processes.
+              Defaults to None, one per shard up to the CPU count.
+            districts (Sequence[Sequence[str]], optional): (district,
+              region) names, copied to every shard. Defaults to ().
+
+        Returns:
+            int: Number of inserted voters across shards
+        """
+        count: int = len(self.providers)
+        processes = processes or min(count, os.cpu_count() or 1)
+        directory = pathlib.Path(self.providers[0].path).parent
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            rolls = _partition(roll_path, fmt, count, pathlib.Path(tmp))
+            with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+                futures = [
+                    pool.submit(_populate, provider.path, list(parties),
+                                shard_roll, batch_size,
+                                [tuple(pair) for pair in districts])
+                    for provider, shard_roll in zip(self.providers, rolls)]
+                return sum(future.result() for future in futures)
+
+    def is_valid(self, name: str, voter_id: str) -> bool:
+        with self.on(self.provider_for(voter_id)):
+            return bool(voter_model.is_valid(name, voter_id))
+
+    def get_by_voter_id(self, voter_id: str) -> Optional[voter_model.Voter]:
+        with self.on(self.provider_for(voter_id)):
+            return voter_model.get_by_voter_id(voter_id)
+
+    def authenticate(self, name: str, voter_id: str
+                     ) -> Union[voter_model.Voter, voter_model.AuthFailure]:
+        with self.on(self.provider_for(voter_id)):
+            return voter_model.authenticate(name, voter_id)
+
+    def cast_vote(self, voter: voter_model.Voter, party: party_model.Party
+                  ) -> int:
+        """Cast a vote on the voter's shard, see electionday.cast_vote.
+
+        Raises:
+            voter_model.AlreadyVotedError: Voter has already voted
+
+        Returns:
+            int: Ballot ID, unique within the voter's shard
+        """
+        provider: db.ConnectionProvider = self.provider_for(voter.voter_id)
+        with self.on(provider):
+            ballot_id: int = _cast_vote(voter=voter, party=party)
+            self._results[provider].record_vote(ballot_id, party._id)
+            # The feed publishes the sum over shards, not this shard's.
+            voting.record_committed([(ballot_id, voter, party, ())],
+                                    self)
+            return ballot_id
+
+    def _sum(self, fn, *args) -> List[party_model.Party]:
+        totals: Dict[str, party_model.Party] = {}
+        for provider in self.providers:
+            with self.on(provider):
+                parties = fn(*args)
+            for party in parties:
+                if party.name in totals:
+                    totals[party.name].votes += party.votes
+                else:
+                    totals[party.name] = party
+        return list(totals.values())
+
+    def select_all(self) -> Sequence[party_model.Party]:
+        """Parties with votes summed over all shards, ordered by name."""
+        return self._sum(party_model.select_all)
+
+    def _cached_results(self) -> Sequence[party_model.Party]:
+        # Run on a shard, see on.
+        return self._results[db.get_provider()].results()
+
+    def select_results(self, scope: Optional[district.Scope] = None
+                       ) -> Sequence[party_model.Party]:
+        """Parties ranked by votes summed over all shards, nationally or
+          in a region or district.
+
+        National standings are kept per shard like results.CACHE, so
+          while nothing changes they cost a PRAGMA data_version per
+          shard instead of a query.
+        """
+        if scope is None:
+            totals = self._sum(self._cached_results)
+        else:
+            totals = self._sum(party_model.select_results, scope)
+        parties = sorted(totals, key=lambda party: (-party.votes, party.name))
+        for i, party in enumerate(parties):
+            party.selector = str(i+1)
+        return parties
+
+    def select_winners(self, scope: Optional[district.Scope] = None
+                       ) -> Sequence[party_model.Party]:
+        """Parties with most votes summed over all shards."""
+        parties = self.select_results(scope)
+        winners = [party for party in parties
+                   if party.votes == parties[0].votes] if parties else []
+        for i, party in enumerate(winners):
+            party.selector = str(i+1)
+        return winners
+
+    def get_by_id(self, _id: int) -> Optional[party_model.Party]:
+        """Party with votes summed over all shards."""
+        found: Optional[party_model.Party] = None
+        for provider in self.providers:
+            with self.on(provider):
+                party = party_model.get_by_id(_id)
+            if party is None:
+                return None
+            if found is None:
+                found = party
+            else:
+                found.votes += party.votes
+        return found
+
+    def find_scope(self, name: str) -> Optional[district.Scope]:
+        """Look up a district or region, the same on every shard."""
+        with self.on(self.providers[0]):
+            return district.find_scope(name)
+
+    def close(self) -> None:
+        """Close connections to all shards."""
+        for provider in self.providers:
+            provider.close()
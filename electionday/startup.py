@@ -0,0 +1,103 @@
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional
+
+import electionday.config as config
+
+
+class ImportTime(NamedTuple):
+    """One line of python -X importtime output, in microseconds.
+    """
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def import_times(module: str, env: Optional[Dict[str, str]] = None
+                 ) -> List[ImportTime]:
+    """Import module in a fresh interpreter and parse -X importtime.
+
+    Args:
+        module (str): Module to import
+        env (Optional[Dict[str, str]], optional): Environment of the
+          interpreter. Defaults to None, the current environment.
+
+    Raises:
+        subprocess.CalledProcessError: Import failed
+
+    Returns:
+        List[ImportTime]: Every module imported, in import order
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+        cwd=config.BASE_PATH, env=env)
+    times: List[ImportTime] = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append(ImportTime(
+            name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def cold_start(module: str = 'electionday.cli', runs: int = 5) -> dict:
+    """Measure time to import module in a fresh interpreter.
+
+    The fastest of several runs is used, it is the least disturbed by
+      other load on the machine.
+
+    Args:
+        module (str, optional): Module to import.
+          Defaults to 'electionday.cli', everything loaded before the
+          first prompt.
+        runs (int, optional): Number of interpreters to start.
+          Defaults to 5.
+
+    Returns:
+        dict: Import time of module in milliseconds, and its slowest
+          imports in the fastest run
+    """
+    fastest: Optional[List[ImportTime]] = None
+    total: Optional[int] = None
+    for _ in range(max(runs, 1)):
+        times = import_times(module)
+        cumulative: int = next(
+            time.cumulative_us for time in reversed(times)
+            if time.module == module)
+        if total is None or cumulative < total:
+            fastest, total = times, cumulative
+    slowest = sorted(fastest, key=lambda time: time.self_us, reverse=True)
+    return {
+        'module': module,
+        'import_ms': round(total / 1000, 2),
+        'budget_ms': config.STARTUP_BUDGET_MS,
+        'modules': sorted({time.module for time in fastest}),
+        'slowest': [
+            {'module': time.module,
+             'self_ms': round(time.self_us / 1000, 2)}
+            for time in slowest[:15]],
+    }
+
+
+def main() -> None:
+    """Print cold start measurement as JSON.
+
+    Exits with status 1 if import time exceeds config.STARTUP_BUDGET_MS.
+    """
+    parser = argparse.ArgumentParser(
+        description='Measure cold start import time')
+    parser.add_argument('module', nargs='?', default='electionday.cli')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    report = cold_start(args.module, args.runs)
+    report.pop('modules')
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report['import_ms'] <= config.STARTUP_BUDGET_MS else 1)
+
+
+if __name__ == '__main__':
+    main()
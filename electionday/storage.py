@@ -0,0 +1,176 @@
+import contextlib
+import contextvars
+import functools
+import importlib
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+import electionday.config as config
+
+
+class Storage:
+    """Storage engine behind the model functions.
+
+    Model functions decorated with routed (voter.is_valid,
+      voter.get_by_voter_id, voter.authenticate, party.select_all,
+      party.select_results, party.select_winners, party.get_by_id,
+      district.find_scope and voting.cast_vote) call the method of the
+      same name, with the same arguments, on the current engine. The
+      SQLite engine sets routed to False and the functions run their own
+      queries, so it costs nothing over calling them directly.
+
+    cast_vote stands in for voter.vote and party.add_vote, which are
+      only ever called together inside the vote transaction.
+    """
+    name: str = ''
+    routed: bool = True
+
+    def is_valid(self, name: str, voter_id: str) -> bool:
+        raise NotImplementedError
+
+    def get_by_voter_id(self, voter_id: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def authenticate(self, name: str, voter_id: str) -> Any:
+        raise NotImplementedError
+
+    def cast_vote(self, voter: Any, party: Any) -> int:
+        raise NotImplementedError
+
+    def select_all(self) -> Sequence[Any]:
+        raise NotImplementedError
+
+    def select_results(self, scope: Optional[Any] = None) -> Sequence[Any]:
+        raise NotImplementedError
+
+    def select_winners(self, scope: Optional[Any] = None) -> Sequence[Any]:
+        raise NotImplementedError
+
+    def get_by_id(self, _id: int) -> Optional[Any]:
+        raise NotImplementedError
+
+    def find_scope(self, name: str) -> Optional[Any]:
+        raise NotImplementedError
+
+
+class SQLiteStorage(Storage):
+    """Database of the connection provider, see database module.
+    """
+    name: str = 'sqlite'
+    routed: bool = False
+
+
+# Engine names and the classes implementing them, imported on first use
+#   so the SQLite engine never loads the others.
+ENGINES: Dict[str, str] = {
+    'sqlite': 'electionday.storage.SQLiteStorage',
+    'memory': 'electionday.memory.MemoryStorage',
+    'sharded': 'electionday.shard.ShardRouter',
+}
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+# Engine temporarily used instead of the configured one, see using.
+_override: contextvars.ContextVar = contextvars.ContextVar(
+    'storage', default=None)
+
+
+def create(engine: Optional[str] = None, **options) -> Storage:
+    """Create a storage engine by name.
+
+    Args:
+        engine (Optional[str], optional): Key of ENGINES.
+          Defaults to None, config.STORAGE_ENGINE or, when it is sqlite
+          and config.SHARD_COUNT is set, the shard databases.
+        **options: Engine constructor arguments
+
+    Raises:
+        ValueError: Unknown engine
+
+    Returns:
+        Storage: New engine
+    """
+    if engine is None:
+        engine = config.STORAGE_ENGINE
+        if engine == 'sqlite' and config.SHARD_COUNT:
+            engine = 'sharded'
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown storage engine {engine!r},'
+                         f' expected one of {", ".join(ENGINES)}')
+    module, _, name = ENGINES[engine].rpartition('.')
+    return getattr(importlib.import_module(module), name)(**options)
+
+
+def configure(engine: Optional[str] = None, **options) -> Storage:
+    """Replace the engine used by the model functions.
+
+    Returns:
+        Storage: New engine
+    """
+    global _storage
+    with _storage_lock:
+        _storage = create(engine, **options)
+        return _storage
+
+
+def get_storage() -> Storage:
+    """Get storage engine, created from config on first call.
+
+    Returns:
+        Storage: Engine set by using, if any, otherwise the configured
+          engine
+    """
+    global _storage
+    override: Optional[Storage] = _override.get()
+    if override is not None:
+        return override
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create()
+    return _storage
+
+
+@contextlib.contextmanager
+def using(storage: Storage) -> Iterator[Storage]:
+    """Context manager routing model functions called in the block, in
+      the current thread or task, to another engine.
+
+    Args:
+        storage (Storage): Engine to use
+
+    Yields:
+        Storage: The engine
+    """
+    token = _override.set(storage)
+    try:
+        yield storage
+    finally:
+        _override.reset(token)
+
+
+def routed(fn: Callable) -> Callable:
+    """Decorator routing calls of a model function to the method of the
+      same name of the current storage engine, see Storage.
+
+    Apply outside the database decorators, so other engines never open
+      a database connection.
+
+    Args:
+        fn (Callable): Decorated function, the SQLite implementation
+
+    Returns:
+        Callable: Decorator wrapper function
+    """
+    name: str = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs) -> Any:
+        storage: Storage = get_storage()
+        if storage.routed:
+            return getattr(storage, name)(*args, **kwargs)
+        return fn(*args, **kwargs)
+    # __wrapped__ is the undecorated function, as if routed was applied
+    #   by the database decorator itself.
+    wrapper.__wrapped__ = getattr(fn, '__wrapped__', fn)
+    return wrapper
@@ -0,0 +1,356 @@
+import argparse
+from dataclasses import asdict, dataclass, field
+import json
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError('Ranked-choice counting requires NumPy, install it'
+                      ' with: pip install -e .[ranked]') from e
+
+import electionday.database as db
+import electionday.district as district
+import electionday.ranked as ranked
+
+
+@dataclass
+class Round:
+    """Votes per party at the start of a counting round and its outcome.
+    """
+    number: int
+    votes: Dict[int, float]
+    exhausted: float
+    quota: float
+    elected: List[int] = field(default_factory=list)
+    eliminated: Optional[int] = None
+    surplus: float = 0.0
+
+
+@dataclass
+class Count:
+    """Outcome of a ranked-choice count.
+    """
+    seats: int
+    ballots: int
+    quota: float
+    elected: List[int] = field(default_factory=list)
+    rounds: List[Round] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RankedBallots:
+    """Ranked ballots as one integer matrix.
+
+    Row i holds ballot i's preferences as candidate indices (positions
+      in party_ids), most preferred first, padded with -1.
+    """
+
+    def __init__(self, party_ids: Sequence[int], preferences: 'np.ndarray'):
+        self.party_ids = np.asarray(party_ids, dtype=np.int64)
+        self.preferences: np.ndarray = np.asarray(preferences,
+                                                  dtype=np.int16)
+        if self.preferences.ndim != 2:
+            raise ValueError('Preferences must be a 2-dimensional array')
+
+    def __len__(self) -> int:
+        return self.preferences.shape[0]
+
+    @classmethod
+    def from_blobs(cls, party_ids: Sequence[int], blobs: Sequence[bytes]
+                   ) -> 'RankedBallots':
+        """Build the matrix from packed preferences, see ranked.encode.
+
+        Preferences for unknown parties are dropped.
+        """
+        party_ids = np.asarray(party_ids, dtype=np.int64)
+        lengths = np.fromiter((len(blob) // 2 for blob in blobs),
+                              dtype=np.int64, count=len(blobs))
+        flat = np.frombuffer(b''.join(blobs), dtype='<u2').astype(np.int64)
+        index_of = np.full(max(int(party_ids.max(initial=0)),
+                               int(flat.max(initial=0))) + 1, -1,
+                           dtype=np.int16)
+        index_of[party_ids] = np.arange(party_ids.size, dtype=np.int16)
+        candidates = index_of[flat]
+        # Drop unknown parties and close the gaps they leave.
+        known = candidates >= 0
+        rows = np.repeat(np.arange(lengths.size), lengths)[known]
+        candidates = candidates[known]
+        lengths = np.bincount(rows, minlength=lengths.size)
+        starts = np.cumsum(lengths) - lengths
+        columns = np.arange(rows.size) - np.repeat(starts, lengths)
+        matrix = np.full((lengths.size, int(lengths.max(initial=0)) or 1),
+                         -1, dtype=np.int16)
+        matrix[rows, columns] = candidates
+        return cls(party_ids, matrix)
+
+
+@db.read_only
+@db.connect_with_cursor
+def load(cursor: sqlite3.Cursor, scope: Optional[district.Scope] = None
+         ) -> RankedBallots:
+    """Load ranked ballots of a scope, national by default.
+
+    Args:
+        cursor (sqlite3.Cursor): Passed via decorator
+        scope (Optional[district.Scope], optional): District or region.
+          Defaults to None, national.
+
+    Raises:
+        ranked.MissingPreferencesError: Votes were replayed from a
+          journal without preferences
+
+    Returns:
+        RankedBallots: Ballots in ballot ID order
+    """
+    ranked.check_complete(cursor)
+    party_ids: List[int] = [
+        _id for _id, in cursor.execute('SELECT id FROM parties ORDER BY id')]
+    if scope is None or scope.level == district.NATIONAL:
+        query: str = 'SELECT preferences FROM ranked_ballots ORDER BY id'
+        params: tuple = ()
+    elif scope.level == district.DISTRICT:
+        query = '''SELECT preferences FROM ranked_ballots
+            JOIN ballots USING(id) WHERE district_id = ? ORDER BY id'''
+        params = (scope._id,)
+    else:
+        query = '''SELECT preferences FROM ranked_ballots
+            JOIN ballots USING(id)
+            JOIN districts ON districts.id = ballots.district_id
+            WHERE districts.region_id = ? ORDER BY ranked_ballots.id'''
+        params = (scope._id,)
+    blobs: List[bytes] = [blob for blob, in cursor.execute(query, params)]
+    return RankedBallots.from_blobs(party_ids, blobs)
+
+
+class _Counter:
+    """State of a count: each ballot's current preference and weight.
+
+    Ballots move to their next continuing preference in bulk: every
+      array operation covers all ballots leaving a candidate at once,
+      and a round only touches the ballots of the candidate elected or
+      eliminated in it.
+    """
+
+    def __init__(self, ballots: RankedBallots):
+        self.preferences: np.ndarray = ballots.preferences
+        self.candidates: int = ballots.party_ids.size
+        self.depth: int = self.preferences.shape[1]
+        # One extra slot so index -1 (exhausted) reads as continuing and
+        #   exhausted ballots are never moved.
+        self.continuing = np.ones(self.candidates + 1, dtype=bool)
+        self.position = np.zeros(len(ballots), dtype=np.int16)
+        self.current: np.ndarray = self.preferences[:, 0].copy()
+        # Unit weights until the first surplus transfer.
+        self.weights: Optional[np.ndarray] = None
+        self.votes: np.ndarray = self._tally(self.current)
+        self.exhausted: float = float(self._weight(
+            np.flatnonzero(self.current < 0)))
+
+    def _tally(self, current: np.ndarray,
+               weights: Optional[np.ndarray] = None) -> np.ndarray:
+        valid = current >= 0
+        return np.bincount(
+            current[valid], minlength=self.candidates,
+            weights=None if weights is None else weights[valid]
+        ).astype(np.float64)
+
+    def _weight(self, ballots: np.ndarray) -> float:
+        if self.weights is None:
+            return float(ballots.size)
+        return float(self.weights[ballots].sum())
+
+    def remove(self, candidate: int, weight: float = 1.0) -> None:
+        """Stop candidate continuing and move its ballots on, with their
+          weight multiplied by weight.
+        """
+        self.continuing[candidate] = False
+        ballots: np.ndarray = np.flatnonzero(self.current == candidate)
+        self.votes[candidate] = 0.0
+        if weight != 1.0:
+            if self.weights is None:
+                self.weights = np.ones(self.current.size, dtype=np.float64)
+            self.weights[ballots] *= weight
+        moving = ballots
+        while moving.size:
+            position = self.position[moving] + 1
+            ended = position >= self.depth
+            following = self.preferences[
+                moving, np.minimum(position, self.depth - 1)]
+            following[ended] = -1
+            self.position[moving] = position
+            self.current[moving] = following
+            moving = moving[~self.continuing[following]]
+        landed: np.ndarray = self.current[ballots]
+        self.votes += self._tally(
+            landed, None if self.weights is None else self.weights[ballots])
+        self.exhausted += self._weight(ballots[landed < 0])
+
+
+def _lowest(votes: np.ndarray, continuing: np.ndarray,
+            history: List[np.ndarray]) -> int:
+    """Candidate to eliminate: fewest votes, ties broken by fewest votes
+      in the latest earlier round that separates them, then by lowest
+      position.
+    """
+    candidates = np.flatnonzero(continuing)
+    tied = candidates[votes[candidates] == votes[candidates].min()]
+    for earlier in reversed(history):
+        if tied.size == 1:
+            break
+        tied = tied[earlier[tied] == earlier[tied].min()]
+    return int(tied[0])
+
+
+def count(ballots: RankedBallots, seats: int = 1) -> Count:
+    """Count ranked ballots by instant runoff (one seat) or single
+      transferable vote.
+
+    Instant runoff elects a candidate with a majority of the continuing
+      votes. STV elects candidates reaching the Droop quota, one per
+      round, and transfers their surplus at a reduced weight (Gregory
+      method, all of an elected candidate's ballots move at weight
+      surplus / votes). When nobody is elected the candidate with the
+      fewest votes is eliminated and their ballots move to their next
+      continuing preference at full weight. Once the continuing
+      candidates only fill the remaining seats they are all elected.
+
+    Args:
+        ballots (RankedBallots): Ballots to count
+        seats (int, optional): Seats to fill. Defaults to 1.
+
+    Returns:
+        Count: Elected party IDs, in order of election, and rounds. No
+          one is elected and there are no rounds without valid ballots.
+    """
+    started: float = time.perf_counter()
+    party_ids: List[int] = ballots.party_ids.tolist()
+    seats = min(max(int(seats), 1), len(party_ids))
+    counter = _Counter(ballots)
+    valid: float = float(counter.votes.sum())
+    quota: float = float(int(valid // (seats + 1)) + 1)
+    result = Count(seats=seats, ballots=len(ballots),
+                   quota=quota if seats > 1 else 0.0)
+    if not valid:
+        # No preferences for any party, nobody can be elected.
+        result.seconds = round(time.perf_counter() - started, 3)
+        return result
+    history: List[np.ndarray] = []
+    continuing = counter.continuing[:-1]
+    while len(result.elected) < seats and continuing.any():
+        # Copy, removing a candidate updates the counter in place.
+        votes: np.ndarray = counter.votes.copy()
+        if seats == 1:
+            # Majority of the votes still in the count.
+            quota = float(int(votes[continuing].sum() // 2) + 1)
+        round_ = Round(
+            number=len(result.rounds) + 1,
+            votes={party_ids[i]: _number(votes[i])
+                   for i in np.flatnonzero(continuing)},
+            exhausted=_number(counter.exhausted), quota=quota)
+        result.rounds.append(round_)
+        open_seats: int = seats - len(result.elected)
+        reached = np.flatnonzero(continuing & (votes >= quota))
+        if int(continuing.sum()) <= open_seats:
+            # Remaining candidates fill the remaining seats.
+            order = np.flatnonzero(continuing)
+            order = order[np.argsort(-votes[order], kind='stable')]
+            round_.elected = [party_ids[i] for i in order]
+            result.elected.extend(round_.elected)
+            break
+        if reached.size:
+            elected = int(reached[np.argmax(votes[reached])])
+            round_.elected = [party_ids[elected]]
+            result.elected.append(party_ids[elected])
+            if seats == 1:
+                break
+            surplus: float = float(votes[elected] - quota)
+            round_.surplus = _number(surplus)
+            counter.remove(elected, surplus / float(votes[elected]))
+        else:
+            eliminated: int = _lowest(votes, continuing, history)
+            round_.eliminated = party_ids[eliminated]
+            counter.remove(eliminated)
+        history.append(votes)
+    result.seconds = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _number(value: float) -> float:
+    """Whole vote counts as ints, fractional ones (transferred surplus)
+      rounded for reporting.
+    """
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 6)
+
+
+def synthetic(ballots: int, candidates: int, max_preferences: int = 10,
+              seed: int = 0) -> RankedBallots:
+    """Random ranked ballots for benchmarking, with between one and
+      max_preferences preferences each and some candidates more popular
+      than others.
+    """
+    rng = np.random.default_rng(seed)
+    depth: int = min(max_preferences, candidates)
+    popularity = np.log(rng.dirichlet(np.ones(candidates)))
+    preferences = np.empty((ballots, depth), dtype=np.int16)
+    # Generated in chunks to bound the memory of the random keys.
+    for start in range(0, ballots, 1 << 18):
+        chunk = preferences[start:start + (1 << 18)]
+        # Popularity-weighted random order (Gumbel trick).
+        keys = (popularity + rng.gumbel(
+            size=(chunk.shape[0], candidates))).astype(np.float32)
+        chunk[:] = np.argsort(-keys, axis=1)[:, :depth]
+        lengths = rng.integers(1, depth + 1, size=chunk.shape[0])
+        chunk[np.arange(depth) >= lengths[:, None]] = -1
+    return RankedBallots(np.arange(1, candidates + 1), preferences)
+
+
+def main() -> None:
+    """Run a ranked-choice count from the command line and print the
+      round-by-round report as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description='Instant runoff / single transferable vote count')
+    parser.add_argument('--seats', type=int, default=1)
+    parser.add_argument('--district', default=None,
+                        help='Count ballots of this district or region')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='Count N random ballots instead of the'
+                        ' database, as a benchmark')
+    parser.add_argument('--candidates', type=int, default=30,
+                        help='Candidates of synthetic ballots')
+    parser.add_argument('--output', default=None,
+                        help='Write report to this file instead of stdout')
+    args = parser.parse_args()
+    if args.synthetic:
+        started: float = time.perf_counter()
+        ballots: RankedBallots = synthetic(args.synthetic, args.candidates)
+        print(f'Generated {len(ballots):,} ballots in'
+              f' {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    else:
+        scope: Optional[district.Scope] = None
+        if args.district:
+            scope = district.find_scope(args.district)
+            if scope is None:
+                sys.exit(f'Unknown district or region: {args.district}')
+        try:
+            ballots = load(scope)
+        except ranked.MissingPreferencesError as e:
+            sys.exit(str(e))
+    report: str = json.dumps(count(ballots, args.seats).to_dict(), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
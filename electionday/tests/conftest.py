@@ -0,0 +1,41 @@
+import pytest
+
+import electionday as app
+import electionday.ballot as ballot
+import electionday.database as db
+import electionday.district as district
+import electionday.journal as journal
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.voter as voter_model
+
+
+PARTIES = ['Azorius Senate', 'Boros Legion', 'Dimir House']
+DISTRICTS = [('Tenth District', 'Ravnica'), ('Precinct Four', 'Ravnica'),
+             ('Ghirapur', 'Kaladesh')]
+VOTERS = [('1001', 'Dovin', 'Tenth District'),
+          ('1002', 'Tajic', 'Precinct Four'),
+          ('1003', 'Etrata', 'Ghirapur'),
+          ('1004', 'Judith')]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Configure decorators to use a populated database in tmp_path."""
+    monkeypatch.setattr(db, '_provider', None)
+    provider = db.configure(tmp_path / 'test.db')
+    db.create_tables(party_model.create_table, district.create_table,
+                     voter_model.create_table, ballot.create_table,
+                     ranked.create_table)
+    db.populate_tables((party_model.populate_table, PARTIES),
+                       (district.populate_table, DISTRICTS),
+                       (voter_model.populate_table, VOTERS))
+    yield provider
+    journal.close()
+    provider.close()
+
+
+def vote(voter_id, party_id):
+    """Cast a vote for party_id as the registered voter_id."""
+    return app.cast_vote(voter=voter_model.get_by_voter_id(voter_id),
+                         party=party_model.get_by_id(party_id))
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+import electionday.ballot as ballot
+import electionday.config as config
+import electionday.district as district
+import electionday.party as party_model
+import electionday.voter as voter_model
+
+
+@pytest.fixture
+def cursor():
+    connection = sqlite3.connect(':memory:')
+    cursor = connection.cursor()
+    party_model.create_table(cursor)
+    district.create_table(cursor)
+    voter_model.create_table(cursor)
+    ballot.create_table(cursor)
+    party_model.populate_table(cursor, ['Azorius Senate', 'Boros Legion'])
+    voter_model.populate_table(cursor, [('1001', 'Dovin'), ('1002', 'Tajic')])
+    yield cursor
+    connection.close()
+
+
+def standings(cursor):
+    return dict(cursor.execute('SELECT name, votes FROM standings'))
+
+
+def test_record_counts_ballot_in_standings(cursor):
+    ballot.record(cursor, 1)
+    ballot.record(cursor, 1)
+    ballot.record(cursor, 2)
+    assert standings(cursor) == {'Azorius Senate': 2, 'Boros Legion': 1}
+
+
+def test_record_does_not_touch_party_totals_before_fold(cursor):
+    ballot.record(cursor, 1)
+    got = cursor.execute('SELECT SUM(votes) FROM parties').fetchone()[0]
+    assert got == 0
+
+
+def test_fold_moves_pending_ballots_into_party_totals(cursor):
+    for party_id in (1, 2, 2):
+        ballot.record(cursor, party_id)
+    assert ballot.fold(cursor) == 3
+    got = dict(cursor.execute('SELECT name, votes FROM parties'))
+    assert got == {'Azorius Senate': 1, 'Boros Legion': 2}
+    assert standings(cursor) == got
+
+
+def test_fold_is_idempotent(cursor):
+    ballot.record(cursor, 1)
+    ballot.fold(cursor)
+    ballot.fold(cursor)
+    assert standings(cursor) == {'Azorius Senate': 1, 'Boros Legion': 0}
+
+
+def test_record_folds_every_interval(cursor, monkeypatch):
+    monkeypatch.setattr(config, 'BALLOT_FOLD_INTERVAL', 2)
+    for party_id in (1, 1, 2):
+        ballot.record(cursor, party_id)
+    got = dict(cursor.execute('SELECT name, votes FROM parties'))
+    assert got == {'Azorius Senate': 2, 'Boros Legion': 0}
+    assert standings(cursor) == {'Azorius Senate': 2, 'Boros Legion': 1}
+
+
+def test_vote_only_succeeds_once(cursor):
+    voter = voter_model.Voter(_id=1, name='Dovin', voter_id='1001')
+    voter_model.vote(cursor, voter)
+    assert voter.has_voted
+    stale = voter_model.Voter(_id=1, name='Dovin', voter_id='1001')
+    with pytest.raises(voter_model.AlreadyVotedError):
+        voter_model.vote(cursor, stale)
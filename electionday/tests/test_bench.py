@@ -0,0 +1,29 @@
+import json
+
+import electionday.bench as bench
+
+
+def test_percentiles_use_nearest_rank():
+    samples = [i / 1e6 for i in range(1, 101)]
+    got = bench.percentiles(samples)
+    assert (got['p50_us'], got['p95_us'], got['p99_us']) == (50, 95, 99)
+
+
+def test_percentiles_of_no_samples():
+    assert bench.percentiles([]) == {'count': 0}
+
+
+def test_run_reports_all_benchmarks(tmp_path, monkeypatch):
+    monkeypatch.setattr(bench.db, '_provider', None)
+    report = bench.run(voters=200, parties=3, writers=2, votes=50,
+                       samples=20, directory=tmp_path)
+    assert report['import']['rows'] == 200
+    assert report['import']['row_by_row']['rows'] == 200
+    assert report['import']['speedup'] > 0
+    assert report['cast_vote']['ballots'] == 50
+    assert set(report['login']) == {'is_valid+get_by_voter_id',
+                                     'authenticate'}
+    assert report['results']['cache']['count'] == 20
+    assert report['memory_engine']['import']['rows'] == 200
+    assert report['memory_engine']['cast_vote']['count'] == 50
+    json.dumps(report)
@@ -0,0 +1,73 @@
+import electionday.bloom as bloom
+import electionday.database as db
+import electionday.voter as voter_model
+
+
+def test_no_false_negatives_and_rate():
+    voter_ids = bloom.BloomFilter.for_capacity(10_000, 0.01)
+    voter_ids.update(f'{i:08d}' for i in range(10_000))
+    assert all(f'{i:08d}' in voter_ids for i in range(10_000))
+    false_positives = sum(f'x{i:07d}' in voter_ids for i in range(10_000))
+    assert false_positives < 200
+
+
+def test_save_and_load(tmp_path):
+    voter_ids = bloom.BloomFilter.for_capacity(100, 0.001)
+    voter_ids.update(['1001', '1002'])
+    voter_ids.save(tmp_path / 'voters.bloom')
+    loaded = bloom.BloomFilter.load(tmp_path / 'voters.bloom')
+    assert (loaded.size, loaded.hashes) == (voter_ids.size, voter_ids.hashes)
+    assert '1001' in loaded and '1002' in loaded
+
+
+def test_rebuilt_after_import(database):
+    # Populating doesn't build a filter, setup rebuilds it once at the end.
+    assert bloom.current() is None
+    bloom.rebuild()
+    assert bloom.filter_path(database.path).exists()
+    voter_ids = bloom.current()
+    assert all(voter_id in voter_ids
+               for voter_id in ('1001', '1002', '1003', '1004'))
+
+
+def test_import_adds_to_filter(database, monkeypatch):
+    bloom.rebuild()
+    # The import doesn't read the voters back to build a new filter.
+    monkeypatch.setattr(bloom, 'build', None)
+    voter_model.bulk_import([('1005', 'Kaya')])
+    assert '1005' in bloom.current()
+    assert '1001' in bloom.current()
+    assert voter_model.authenticate('Kaya', '1005').voter_id == '1005'
+
+
+def test_saturated_filter_removed_on_import(database):
+    bloom.rebuild()
+    voter_model.bulk_import((f'{i:05d}', 'Voter') for i in range(1000))
+    assert bloom.current() is None
+    assert voter_model.authenticate('Voter', '00999').voter_id == '00999'
+
+
+def test_reloaded_when_rebuilt_elsewhere(database):
+    bloom.rebuild()
+    assert '1005' not in bloom.current()
+    # Another process rebuilding the filter only replaces the file.
+    voter_ids = bloom.BloomFilter.for_capacity(10, 0.001)
+    voter_ids.update(['1001', '1005'])
+    voter_ids.save(bloom.filter_path(database.path))
+    assert '1005' in bloom.current()
+    bloom.filter_path(database.path).unlink()
+    assert bloom.current() is None
+
+
+def test_unknown_id_rejected_without_query(database, monkeypatch):
+    monkeypatch.setattr(bloom, 'current', lambda: bloom.BloomFilter(64, 3))
+    monkeypatch.setattr(db.ConnectionProvider, 'connection', None)
+    assert voter_model.is_valid.__wrapped__(None, 'Dovin', '1001') is False
+    assert voter_model.authenticate.__wrapped__(
+        None, 'Dovin', '1001') is voter_model.AuthFailure.UNKNOWN_ID
+
+
+def test_is_valid_returns_bool(database):
+    assert voter_model.is_valid('dovin', '1001') is True
+    assert voter_model.is_valid('Tajic', '1001') is False
+    assert voter_model.is_valid('Nobody', '9999') is False
@@ -0,0 +1,87 @@
+import dataclasses
+import threading
+
+import pytest
+
+import electionday.catalog as catalog
+import electionday.database as db
+import electionday.memory as memory
+import electionday.party as party_model
+import electionday.storage as storage
+from electionday.tests.conftest import PARTIES
+
+
+@pytest.fixture
+def parties(database):
+    return catalog.PartyCatalog()
+
+
+def test_catalog_matches_select_all(parties):
+    expected = [(party._id, party.name, party.symbol, party.selector)
+                for party in party_model.select_all()]
+    got = [(party._id, party.name, party.symbol, party.selector)
+           for party in parties.parties()]
+    assert got == expected
+
+
+def test_lookup_by_selector_and_id(parties):
+    party = parties.by_selector('2')
+    assert party.name == 'Boros Legion'
+    assert parties.by_id(party._id) is party
+    assert parties.by_selector('9') is None
+    assert parties.by_id(999) is None
+
+
+def test_records_are_frozen(parties):
+    party = parties.by_selector('1')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        party.name = 'Orzhov Syndicate'
+    assert not hasattr(party, '__dict__')
+
+
+def test_votes_do_not_reload(parties, monkeypatch):
+    parties.parties()
+    version = parties.version
+
+    def other_connection():
+        with db.get_connection() as connection:
+            connection.execute('INSERT INTO ballots(party_id) VALUES(1)')
+            connection.execute('UPDATE parties SET votes = votes + 1')
+
+    thread = threading.Thread(target=other_connection)
+    thread.start()
+    thread.join()
+    monkeypatch.setattr(catalog, '_load', None)
+    assert parties.by_selector('1').name == 'Azorius Senate'
+    assert parties.version == version
+
+
+def test_party_changes_reload(parties):
+    parties.parties()
+
+    def other_connection():
+        with db.get_connection() as connection:
+            party_model.populate_table(connection.cursor(),
+                                       ['Golgari Swarm'])
+
+    thread = threading.Thread(target=other_connection)
+    thread.start()
+    thread.join()
+    assert [party.name for party in parties.parties()] == [
+        'Azorius Senate', 'Boros Legion', 'Dimir House', 'Golgari Swarm']
+    assert parties.by_selector('4').name == 'Golgari Swarm'
+
+
+def test_routed_engine_parties_read_once(monkeypatch):
+    engine = memory.MemoryStorage(None)
+    parties = catalog.PartyCatalog()
+    with storage.using(engine):
+        # Not kept before the engine has parties.
+        assert parties.parties() == ()
+        engine.add_parties(PARTIES)
+        assert parties.by_selector('2').name == 'Boros Legion'
+        monkeypatch.setattr(engine, 'select_all', None)
+        party = parties.by_selector('2')
+        assert parties.by_id(party._id) is party
+        assert parties.by_selector('9') is None
+        assert [party.name for party in parties.parties()] == PARTIES
@@ -0,0 +1,88 @@
+import gc
+import sqlite3
+import threading
+
+import pytest
+
+import electionday.database as db
+import electionday.party as party_model
+
+
+def test_provider_opens_connection_lazily(tmp_path):
+    path = tmp_path / 'lazy.db'
+    provider = db.ConnectionProvider(path)
+    assert not path.exists()
+    provider.connection
+    assert path.exists()
+    provider.close()
+
+
+def test_provider_reuses_connection_in_same_thread(tmp_path):
+    provider = db.ConnectionProvider(tmp_path / 'test.db')
+    assert provider.connection is provider.connection
+    provider.close()
+
+
+def test_provider_opens_one_connection_per_thread(tmp_path):
+    provider = db.ConnectionProvider(tmp_path / 'test.db')
+    connections = [provider.connection]
+    thread = threading.Thread(
+        target=lambda: connections.append(provider.connection))
+    thread.start()
+    thread.join()
+    assert connections[0] is not connections[1]
+    provider.close()
+
+
+def test_provider_configures_connection(tmp_path):
+    provider = db.ConnectionProvider(
+        tmp_path / 'test.db', synchronous='FULL', busy_timeout=1234,
+        mmap_size=4096)
+    connection = provider.connection
+    assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert connection.execute('PRAGMA synchronous').fetchone()[0] == 2
+    assert connection.execute('PRAGMA busy_timeout').fetchone()[0] == 1234
+    provider.close()
+
+
+def test_close_closes_connections(tmp_path):
+    provider = db.ConnectionProvider(tmp_path / 'test.db')
+    connection = provider.connection
+    provider.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute('SELECT 1')
+    assert provider.connection is not connection
+    provider.close()
+
+
+def test_decorators_use_configured_database(database):
+    @db.connect_with_cursor
+    def count_voters(cursor):
+        return cursor.execute('SELECT COUNT(*) FROM voters').fetchone()[0]
+
+    assert count_voters() == 4
+
+
+def test_unused_votes_index_is_dropped(database):
+    connection = database.connection
+    connection.execute('CREATE INDEX parties_votes ON parties(votes DESC)')
+    connection.commit()
+    db.create_tables(party_model.create_table)
+    assert connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+        " AND tbl_name = 'parties' AND name = 'parties_votes'"
+    ).fetchone() is None
+
+
+def test_thread_connection_closed_on_exit(tmp_path):
+    provider = db.ConnectionProvider(tmp_path / 'test.db')
+    opened = []
+    thread = threading.Thread(
+        target=lambda: opened.append(provider.connection))
+    thread.start()
+    thread.join()
+    gc.collect()
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute('SELECT 1')
+    assert provider._connections == []
+    provider.close()
@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+import electionday.ballot as ballot
+import electionday.database as db
+import electionday.district as district
+import electionday.journal as journal
+import electionday.party as party_model
+import electionday.replay as replay
+import electionday.voter as voter_model
+from electionday.tests.conftest import vote
+
+
+def votes(scope):
+    return {party.name: party.votes
+            for party in party_model.select_results(scope)}
+
+
+@pytest.fixture
+def cast(database):
+    vote('1001', 1)
+    vote('1002', 2)
+    vote('1003', 2)
+    vote('1004', 3)
+
+
+def test_voters_are_assigned_to_districts(database):
+    tenth = district.find_scope('tenth district')
+    assert voter_model.get_by_voter_id('1001').district_id == tenth._id
+    assert voter_model.get_by_voter_id('1004').district_id is None
+
+
+def test_scoped_results_before_and_after_fold(cast):
+    scopes = {name: district.find_scope(name)
+              for name in ('Tenth District', 'Ravnica', 'Kaladesh')}
+    expected = {
+        'Tenth District': {'Azorius Senate': 1, 'Boros Legion': 0,
+                           'Dimir House': 0},
+        'Ravnica': {'Azorius Senate': 1, 'Boros Legion': 1,
+                    'Dimir House': 0},
+        'Kaladesh': {'Azorius Senate': 0, 'Boros Legion': 1,
+                     'Dimir House': 0},
+    }
+    assert {name: votes(scope) for name, scope in scopes.items()} == expected
+    connection = db.get_connection()
+    ballot.fold(connection.cursor())
+    connection.commit()
+    assert connection.execute(
+        'SELECT SUM(votes) FROM district_tally').fetchone()[0] == 3
+    assert {name: votes(scope) for name, scope in scopes.items()} == expected
+    winner_ids = [party._id for party in party_model.select_winners(
+        scopes['Ravnica'])]
+    assert winner_ids == [1, 2]
+    assert votes(None) == {'Azorius Senate': 1, 'Boros Legion': 2,
+                           'Dimir House': 1}
+
+
+def test_scoped_reads_do_not_scan_ballots(database):
+    connection = db.get_connection()
+    for name in ('Tenth District', 'Ravnica'):
+        query, params = district.standings_query(district.find_scope(name))
+        plan = ' '.join(row[-1] for row in connection.execute(
+            f'EXPLAIN QUERY PLAN {query}', params))
+        assert 'SCAN ballots' not in plan
+
+
+def test_children(database):
+    ravnica = district.find_scope('Ravnica')
+    assert [scope.name for scope in district.select_children()] == [
+        'Kaladesh', 'Ravnica']
+    assert [scope.name for scope in district.select_children(ravnica)] == [
+        'Precinct Four', 'Tenth District']
+    assert district.find_scope('Nowhere') is None
+
+
+def test_replay_restores_district_tallies(cast, tmp_path):
+    journal.close()
+    connection = db.get_connection()
+    connection.execute('DELETE FROM ballots')
+    connection.execute('UPDATE voters SET has_voted = 0')
+    connection.commit()
+    replay.rebuild(tmp_path / 'test.ballots')
+    assert votes(district.find_scope('Ravnica')) == {
+        'Azorius Senate': 1, 'Boros Legion': 1, 'Dimir House': 0}
+
+
+def test_adds_district_columns_to_old_tables(tmp_path):
+    connection = sqlite3.connect(tmp_path / 'old.db')
+    connection.execute('''CREATE TABLE voters(
+        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+        name VARCHAR(60) NOT NULL,
+        voter_id VARCHAR(12) NOT NULL UNIQUE,
+        has_voted NUMERIC(1) NOT NULL DEFAULT 0)''')
+    connection.execute('''CREATE TABLE ballots(
+        id INTEGER PRIMARY KEY NOT NULL,
+        party_id INTEGER NOT NULL)''')
+    cursor = connection.cursor()
+    district.create_table(cursor)
+    voter_model.create_table(cursor)
+    ballot.create_table(cursor)
+    for table in ('voters', 'ballots'):
+        columns = [row[1] for row in cursor.execute(
+            f'PRAGMA table_info({table})')]
+        assert columns[-1] == 'district_id'
+    assert not db.add_column(cursor, 'voters', 'district_id', 'INTEGER')
+    connection.close()
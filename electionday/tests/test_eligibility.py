@@ -0,0 +1,119 @@
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import electionday as app
+import electionday.database as db
+import electionday.eligibility as eligibility
+import electionday.party as party_model
+import electionday.voter as voter_model
+from electionday.tests.conftest import VOTERS, vote
+
+
+@pytest.fixture
+def index(database):
+    path = eligibility.build()
+    assert path == eligibility.index_path(database.path)
+    return eligibility.current()
+
+
+def test_lookup(index):
+    assert len(index) == 4
+    assert index.lookup('1001') is False
+    assert index.lookup('9999') is None
+    assert sorted(index.ordinal(voter_id) for voter_id in
+                  ('1001', '1002', '1003', '1004')) == [0, 1, 2, 3]
+
+
+def test_unknown_id_without_query(index, monkeypatch):
+    monkeypatch.setattr(db.ConnectionProvider, 'connection', None)
+    assert voter_model.authenticate.__wrapped__(
+        None, 'Nobody', '9999') is voter_model.AuthFailure.UNKNOWN_ID
+    assert voter_model.get_by_voter_id.__wrapped__(None, '9999') is None
+
+
+def test_vote_marks_index_shared_between_processes(index):
+    voter = voter_model.authenticate('Dovin', '1001')
+    app.cast_vote(voter=voter, party=party_model.select_all()[0])
+    assert index.lookup('1001') is True
+    # A second mapping of the file, as opened by another terminal.
+    assert eligibility.EligibilityIndex(index.path).lookup('1001') is True
+    assert eligibility.EligibilityIndex(index.path).lookup('1002') is False
+
+
+def test_vote_refused_by_index(index):
+    index.mark('1002')
+    voter = voter_model.authenticate('Tajic', '1002')
+    with pytest.raises(voter_model.AlreadyVotedError):
+        app.cast_vote(voter=voter, party=party_model.select_all()[0])
+    assert voter_model.get_by_voter_id('1002').has_voted is False
+
+
+def test_build_includes_votes(database):
+    voter = voter_model.authenticate('Etrata', '1003')
+    app.cast_vote(voter=voter, party=party_model.select_all()[0])
+    eligibility.build()
+    assert eligibility.current().lookup('1003') is True
+    assert eligibility.current().lookup('1004') is False
+
+
+def test_patch(database):
+    voter_model.bulk_import((str(i), 'Voter') for i in range(2000, 2100))
+    for voter_id in ('1001', '2010', '2050'):
+        vote(voter_id, 1)
+    eligibility.build()
+    index = eligibility.current()
+    registered = {row[0] for row in VOTERS} | {
+        str(i) for i in range(2000, 2100)}
+    inserted = [str(i) for i in range(3000, 3040)]
+    deleted = ['1002', '2001', '2050', '2099', '9999']
+    assert eligibility.patch(index, inserted, deleted) == index.path
+    patched = eligibility.current()
+    registered = (registered | set(inserted)) - set(deleted)
+    assert len(patched) == len(registered) == 140
+    assert {voter_id: patched.lookup(voter_id)
+            for voter_id in registered | set(deleted)} == {
+        voter_id: (voter_id in ('1001', '2010')
+                   if voter_id in registered else None)
+        for voter_id in registered | set(deleted)}
+
+
+def test_patch_collision(index):
+    # An inserted voter ID hashed like a registered one needs a new salt.
+    assert eligibility.patch(index, ['1005', '1002'], []) is None
+    assert eligibility.current() is index
+
+
+def test_bulk_import_removes_index(index):
+    voter_model.bulk_import([('1005', 'Kaya')])
+    assert eligibility.current() is None
+    assert not index.path.exists()
+    assert voter_model.authenticate('Kaya', '1005').voter_id == '1005'
+
+
+def in_other_process(database, code):
+    """Run code against the test database in a separate interpreter."""
+    subprocess.run(
+        [sys.executable, '-c',
+         'import electionday.database as db\n'
+         'import electionday.eligibility as eligibility\n'
+         'import electionday.voter as voter_model\n'
+         f'db.configure({str(database.path)!r})\n' + code],
+        check=True, cwd=pathlib.Path(__file__).parents[2])
+
+
+def test_reopened_when_replaced_by_other_process(index, database):
+    assert voter_model.authenticate(
+        'Kaya', '1005') is voter_model.AuthFailure.UNKNOWN_ID
+    in_other_process(database, "voter_model.bulk_import([('1005', 'Kaya')])\n"
+                               'eligibility.build()')
+    assert eligibility.current().lookup('1005') is False
+    assert voter_model.authenticate('Kaya', '1005').voter_id == '1005'
+    # Votes are marked in the new file, not the replaced one.
+    app.cast_vote(voter=voter_model.authenticate('Kaya', '1005'),
+                  party=party_model.select_all()[0])
+    assert eligibility.EligibilityIndex(index.path).lookup('1005') is True
+    in_other_process(database, 'eligibility.remove()')
+    assert eligibility.current() is None
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+
+import electionday as app
+import electionday.config as config
+import electionday.feed as feed
+import electionday.party as party_model
+import electionday.results as results
+import electionday.server as server
+import electionday.shard as shard
+import electionday.storage as storage
+import electionday.voter as voter_model
+from electionday.tests.conftest import PARTIES, VOTERS, vote
+
+
+@pytest.fixture
+def results_feed(database, monkeypatch):
+    results.CACHE.invalidate()
+    results_feed = feed.ResultsFeed(history=3)
+    monkeypatch.setattr(feed, 'FEED', results_feed)
+    results_feed.refresh()
+    return results_feed
+
+
+def test_publishes_only_changes(results_feed):
+    assert results_feed.version == 1
+    assert not results_feed.publish()
+    vote('1001', 2)
+    assert results_feed.version == 2
+    assert results_feed.changes(2) is None
+
+
+def test_delta_has_changed_counts_and_winners(results_feed):
+    vote('1001', 2)
+    vote('1002', 1)
+    delta = json.loads(results_feed.changes(2))
+    assert delta == {'version': 3, 'since': 2, 'full': False,
+                     'votes': {'1': 1}, 'winners': [1, 2]}
+    vote('1003', 1)
+    delta = json.loads(results_feed.changes(3))
+    assert delta['votes'] == {'1': 2} and delta['winners'] == [1]
+    vote('1004', 1)
+    delta = json.loads(results_feed.changes(4))
+    assert delta['votes'] == {'1': 3} and 'winners' not in delta
+
+
+def test_delta_is_shared(results_feed):
+    vote('1001', 2)
+    assert results_feed.changes(1) is results_feed.changes(1)
+
+
+def test_old_and_unknown_versions_get_full_update(results_feed):
+    for voter_id in ('1001', '1002', '1003'):
+        vote(voter_id, 3)
+    for since in (0, 1, 99):
+        delta = json.loads(results_feed.changes(since))
+        assert delta['full']
+        assert delta['votes'] == {'1': 0, '2': 0, '3': 3}
+        assert delta['winners'] == [3]
+
+
+def test_waiters_share_one_future(results_feed):
+    async def main():
+        waiters = [asyncio.ensure_future(results_feed.wait_async(1, 5))
+                   for _ in range(100)]
+        await asyncio.sleep(0)
+        assert len(results_feed._futures) == 1
+        assert results_feed.subscribers == 100
+        await asyncio.get_running_loop().run_in_executor(
+            None, vote, '1001', 1)
+        return await asyncio.gather(*waiters)
+    changes = asyncio.run(main())
+    assert len(set(map(id, changes))) == 1
+    assert json.loads(changes[0])['votes'] == {'1': 1}
+
+
+def test_wait_times_out(results_feed):
+    assert results_feed.wait(1, timeout=0.01) is None
+    assert asyncio.run(results_feed.wait_async(1, 0.01)) is None
+
+
+def test_sharded_feed(tmp_path, monkeypatch):
+    roll_path = tmp_path / 'roll.csv'
+    roll_path.write_text('\n'.join(f'{voter_id},{name}'
+                                   for voter_id, name, *_ in VOTERS))
+    router = shard.ShardRouter(shard.shard_paths(2, tmp_path))
+    router.populate(PARTIES, roll_path)
+    results_feed = feed.ResultsFeed()
+    monkeypatch.setattr(feed, 'FEED', results_feed)
+    try:
+        with storage.using(router):
+            assert results_feed.refresh() == 1
+            for voter_id, name, *_ in VOTERS[:3]:
+                app.cast_vote(voter=voter_model.authenticate(name, voter_id),
+                              party=party_model.get_by_id(1))
+        # Published from the shard router itself, whatever engine is set.
+        voter_id, name, *_ = VOTERS[3]
+        router.cast_vote(router.authenticate(name, voter_id),
+                         router.get_by_id(2))
+    finally:
+        router.close()
+    assert {shard.shard_index(voter_id, 2)
+            for voter_id, *_ in VOTERS} == {0, 1}
+    assert results_feed.version == 5
+    delta = json.loads(results_feed.changes(0))
+    assert delta['votes'] == {'1': 3, '2': 1, '3': 0}
+    assert delta['winners'] == [1]
+
+
+def test_server_long_poll_and_stream(results_feed, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    headers = b'X-Password: secret\r\nConnection: close\r\n\r\n'
+
+    async def get(port, path):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET ' + path.encode() + b' HTTP/1.1\r\n' + headers)
+        return reader, writer
+
+    async def main():
+        api = server.VotingServer(read_workers=2)
+        listener = await api.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await get(port, '/results/changes?since=1'
+                                       '&timeout=0.01')
+            timed_out = await reader.read()
+            writer.close()
+            reader, writer = await get(port, '/results/changes?since=1')
+            stream, stream_writer = await get(port, '/results/stream'
+                                              '?since=1')
+            await asyncio.sleep(0.05)
+            await api.read(vote, '1001', 3)
+            polled = await reader.read()
+            writer.close()
+            head = await stream.readuntil(b'\r\n\r\n')
+            event = await stream.readuntil(b'\n\n')
+            stream_writer.close()
+            return timed_out, polled, head, event
+        finally:
+            listener.close()
+            api.ballots.close()
+            api.readers.shutdown()
+    timed_out, polled, head, event = asyncio.run(main())
+    assert timed_out.startswith(b'HTTP/1.1 204')
+    assert polled.startswith(b'HTTP/1.1 200')
+    assert json.loads(polled.partition(b'\r\n\r\n')[2])['votes'] == {
+        '3': 1}
+    assert b'text/event-stream' in head
+    assert event.startswith(b'id: 2\ndata: {')
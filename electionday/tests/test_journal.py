@@ -0,0 +1,209 @@
+import pytest
+
+import electionday as app
+import electionday.database as db
+import electionday.journal as journal
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.replay as replay
+import electionday.results as results
+import electionday.voter as voter_model
+import electionday.voting as voting
+import electionday.writer as ballot_writer
+
+
+def write(path, entries):
+    log = journal.Journal(path)
+    log.append(entries)
+    log.close()
+    return log
+
+
+def entries(count):
+    return [journal.JournalEntry(i, 1, f'{1000 + i}', 1_000_000_000 * i)
+            for i in range(1, count + 1)]
+
+
+def cast(voter_id, name, party_index=0):
+    voter = voter_model.authenticate(name, voter_id)
+    return app.cast_vote(voter=voter,
+                         party=party_model.select_all()[party_index])
+
+
+def test_round_trip(tmp_path):
+    log = write(tmp_path / 'test.ballots', entries(3))
+    assert log.syncs == 1 and log.pending == 0
+    reader = journal.JournalReader(tmp_path / 'test.ballots', chunk_size=7)
+    assert list(reader) == entries(3)
+    assert reader.error is None and reader.entries == 3
+
+
+def test_round_trip_preferences(tmp_path):
+    logged = [entry._replace(preferences=(2, 3, 1)[:entry.ballot_id - 1])
+              for entry in entries(3)]
+    write(tmp_path / 'test.ballots', logged)
+    assert list(journal.JournalReader(tmp_path / 'test.ballots')) == logged
+
+
+def test_appends_to_v1_journal(tmp_path):
+    path = tmp_path / 'test.ballots'
+    path.write_bytes(journal.MAGIC_V1)
+    write(path, [entry._replace(preferences=(1, 2)) for entry in entries(2)])
+    reader = journal.JournalReader(path)
+    assert list(reader) == [entry._replace(preferences=None)
+                            for entry in entries(2)]
+    assert reader.magic == journal.MAGIC_V1 and reader.error is None
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    path = tmp_path / 'test.ballots'
+    write(path, entries(3))
+    size = path.stat().st_size
+    with open(path, 'r+b') as f:
+        f.truncate(size - 2)
+    reader = journal.JournalReader(path)
+    assert list(reader) == entries(2)
+    assert reader.error == 'truncated frame'
+    assert reader.offset == size - len(journal.encode(entries(3)[-1]))
+
+
+def test_checksum_mismatch_stops_reading(tmp_path):
+    path = tmp_path / 'test.ballots'
+    write(path, entries(3))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xff
+    path.write_bytes(bytes(data))
+    reader = journal.JournalReader(path)
+    assert len(list(reader)) == 2
+    assert reader.error == 'checksum mismatch'
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'test.ballots'
+    path.write_bytes(b'not a journal')
+    with pytest.raises(journal.JournalError):
+        list(journal.JournalReader(path))
+
+
+def test_cast_vote_appends_after_commit(database, tmp_path):
+    ballot_id = cast('1001', 'Dovin')
+    with pytest.raises(voter_model.AlreadyVotedError):
+        app.cast_vote(voter=voter_model.get_by_voter_id('1001'),
+                      party=party_model.select_all()[0])
+    journal.close()
+    logged = list(journal.JournalReader(tmp_path / 'test.ballots'))
+    assert [(entry.ballot_id, entry.voter_id) for entry in logged] == [
+        (ballot_id, '1001')]
+
+
+def test_writer_appends_batches(database, tmp_path):
+    writer = ballot_writer.BallotWriter(batch_size=10, max_delay=0.05)
+    futures = [writer.submit(voter_model.get_by_voter_id(voter_id), party)
+               for voter_id, party in zip(
+                   ('1001', '1002'), party_model.select_all())]
+    writer.close()
+    journal.close()
+    logged = list(journal.JournalReader(tmp_path / 'test.ballots'))
+    assert sorted(entry.ballot_id for entry in logged) == sorted(
+        future.result() for future in futures)
+
+
+def test_disabled(database, tmp_path, monkeypatch):
+    monkeypatch.setattr(journal.config, 'JOURNAL_ENABLED', False)
+    cast('1001', 'Dovin')
+    assert not (tmp_path / 'test.ballots').exists()
+
+
+def test_rebuild(database, tmp_path):
+    cast('1001', 'Dovin', 0)
+    cast('1002', 'Tajic', 1)
+    cast('1003', 'Etrata', 1)
+    journal.close()
+    path = tmp_path / 'test.ballots'
+    copy = tmp_path / 'copy.ballots'
+    copy.write_bytes(path.read_bytes())
+    connection = db.get_connection()
+    connection.execute('DELETE FROM ballots')
+    connection.execute('UPDATE voters SET has_voted = 0')
+    connection.commit()
+    report = replay.rebuild(copy, batch_size=2)
+    assert (report.ballots, report.voters, report.error) == (3, 3, None)
+    assert report.unknown_voters == report.unknown_parties == 0
+    votes = {party.name: party.votes for party in results.CACHE.results()}
+    assert votes == {'Azorius Senate': 1, 'Boros Legion': 2,
+                     'Dimir House': 0}
+    assert voter_model.get_by_voter_id('1003').has_voted
+    assert not voter_model.get_by_voter_id('1004').has_voted
+
+
+def test_rebuild_restores_preferences(database, tmp_path):
+    parties = party_model.select_all()
+    first = voting.cast_ranked_vote(
+        voter=voter_model.get_by_voter_id('1001'), parties=parties[::-1])
+    cast('1002', 'Tajic', 1)
+    journal.close()
+    copy = tmp_path / 'copy.ballots'
+    copy.write_bytes((tmp_path / 'test.ballots').read_bytes())
+    # Not in the copy, so its ranked row must not survive the rebuild.
+    voting.cast_ranked_vote(voter=voter_model.get_by_voter_id('1003'),
+                            parties=parties[:2])
+    report = replay.rebuild(copy)
+    assert (report.ballots, report.missing_preferences) == (2, 0)
+    rows = db.get_connection().execute(
+        'SELECT id, preferences FROM ranked_ballots').fetchall()
+    assert [(_id, ranked.decode(blob)) for _id, blob in rows] == [
+        (first, tuple(party._id for party in parties[::-1]))]
+
+
+def test_rebuild_from_v1_journal(database, tmp_path):
+    voting.cast_ranked_vote(voter=voter_model.get_by_voter_id('1001'),
+                            parties=party_model.select_all())
+    path = tmp_path / 'old.ballots'
+    path.write_bytes(journal.MAGIC_V1)
+    write(path, entries(2))
+    report = replay.rebuild(path)
+    assert (report.ballots, report.missing_preferences) == (2, 2)
+    connection = db.get_connection()
+    assert connection.execute(
+        'SELECT COUNT(*) FROM ranked_ballots').fetchone() == (0,)
+    with pytest.raises(ranked.MissingPreferencesError):
+        ranked.check_complete(connection.cursor())
+    replay.rebuild(tmp_path / 'test.ballots')
+    ranked.check_complete(connection.cursor())
+
+
+def test_load_test(database, tmp_path):
+    path = tmp_path / 'recorded.ballots'
+    write(path, [journal.JournalEntry(i, 1, f'{1000 + i}', 1_000_000 * i)
+                 for i in range(1, 5)] + [
+        journal.JournalEntry(9, 1, '9999', 5_000_000)])
+    report = replay.load_test(path, speed=10)
+    assert report['ballots'] == 4
+    assert report['skipped'] == 1 and report['errors'] == 0
+    assert report['latency']['count'] == 4
+    assert results.CACHE.results()[0].votes == 4
+    with pytest.raises(ValueError):
+        replay.load_test(tmp_path / 'test.ballots')
+
+
+def test_append_returns_once_synced(tmp_path):
+    log = journal.Journal(tmp_path / 'test.ballots')
+    log.append(entries(2))
+    assert (log.written, log.synced, log.syncs) == (2, 2, 1)
+    log.close()
+
+
+def test_journal_failure_keeps_votes(database, monkeypatch):
+    def fail(ballots):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(journal, 'record', fail)
+    assert cast('1001', 'Dovin')
+    writer = ballot_writer.BallotWriter()
+    try:
+        for voter_id in ('1002', '1003'):
+            assert writer.cast(voter_model.get_by_voter_id(voter_id),
+                               party_model.select_all()[0], timeout=5)
+    finally:
+        writer.close()
+    assert results.CACHE.results()[0].votes == 3
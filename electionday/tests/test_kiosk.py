@@ -0,0 +1,81 @@
+import asyncio
+
+import electionday.config as config
+import electionday.kiosk as kiosk
+import electionday.voter as voter_model
+
+
+async def session(port, lines):
+    """Type lines on a terminal and return everything it displayed."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(''.join(f'{line}\r\n' for line in lines).encode())
+    writer.write_eof()
+    output = await reader.read()
+    writer.close()
+    return output.decode()
+
+
+def run(*terminals, client=session, **options):
+    async def main():
+        server = kiosk.KioskServer(workers=2, **options)
+        listener = await server.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.wait_for(asyncio.gather(
+                *(client(port, lines) for lines in terminals)), 10)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.ballots.close()
+            server.executor.shutdown()
+    return asyncio.run(main())
+
+
+def test_vote(database, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    [output] = run(['1', 'Dovin', '1001', '2', 'y', '', '3'])
+    assert 'CAST VOTE' in output
+    assert 'You have selected: BOROS LEGION' in output
+    assert 'Thank you for voting!' in output
+    assert output.endswith('Goodbye\r\n\r\n')
+    assert voter_model.get_by_voter_id('1001').has_voted is True
+
+
+def test_sessions_are_independent(database, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    voted, failed, rejected = run(
+        ['1', 'Tajic', '1002', '1', 'y', '', '3'],
+        ['1', 'Tajic', '9999', '3'],
+        ['9', '3'])
+    assert 'Thank you for voting!' in voted
+    assert voter_model.AuthFailure.UNKNOWN_ID.message in failed
+    assert 'Thank you' not in failed
+    assert 'Invalid selector (9), please try again.' in rejected
+
+
+def test_results(database, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    [output] = run(['1', 'Etrata', '1003', '3', 'y', '', '2', 'secret', '',
+                    '2', 'wrong', '3'], district_name='Kaladesh')
+    assert 'CURRENT RESULTS: KALADESH' in output
+    assert 'Votes: 1  Dimir House' in output
+    assert 'Winning party: Dimir House' in output
+    assert 'Invalid password.' in output
+
+
+def test_disconnect(database):
+    [output] = run(['1', 'Dovin'])
+    assert 'Voter ID: ' in output
+    assert 'Goodbye' not in output
+
+
+def test_session_limit(database):
+    async def terminals(port, lines):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        await reader.readuntil(b'Select menu option: ')
+        busy = await session(port, [])
+        writer.close()
+        return busy
+
+    [busy] = run([], client=terminals, max_sessions=1)
+    assert busy == 'All terminals are busy, please try again.\r\n'
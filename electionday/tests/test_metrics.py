@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import electionday as app
+import electionday.database as db
+import electionday.metrics as metrics
+import electionday.party as party_model
+import electionday.voter as voter_model
+
+
+@pytest.fixture
+def registry(database):
+    registry = metrics.enable(metrics.Registry(slow_query_ms=0))
+    yield registry
+    metrics.disable()
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram(buckets=(0.001, 0.01))
+    for value in (0.0005, 0.005, 0.005, 1.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [('0.001', 1), ('0.01', 3), ('+Inf', 4)]
+    assert histogram.count == 4
+
+
+def test_counts_calls_and_statements(registry):
+    voter = voter_model.authenticate('Dovin', '1001')
+    voter_model.authenticate('Nobody', '1001')
+    app.cast_vote(voter=voter, party=party_model.select_all()[0])
+    functions = registry.to_dict()['functions']
+    assert functions['voter.authenticate']['calls'] == 2
+    assert functions['voter.authenticate']['statements'] == 2
+    cast = functions['voting.cast_vote']
+    assert cast['calls'] == 1 and cast['errors'] == 0
+    assert cast['latency']['count'] == 1
+    assert cast['lock_wait']['sum'] > 0
+    assert cast['commit']['sum'] > 0
+
+
+def test_counts_errors(registry):
+    voter = voter_model.authenticate('Dovin', '1001')
+    party = party_model.select_all()[0]
+    app.cast_vote(voter=voter, party=party)
+    with pytest.raises(voter_model.AlreadyVotedError):
+        app.cast_vote(voter=voter, party=party)
+    assert registry.functions['voting.cast_vote'].errors == 1
+
+
+def test_slow_queries_hide_parameters(registry):
+    voter_model.authenticate('Dovin', '1001')
+    logged = [query.sql for query in registry.slow_queries
+              if query.function == 'voter.authenticate']
+    assert logged and all('Dovin' not in sql and '1001' not in sql
+                          for sql in logged)
+
+
+def test_export(registry, tmp_path):
+    voter_model.authenticate('Dovin', '1001')
+    text = registry.write(tmp_path / 'metrics.prom').read_text()
+    assert ('electionday_db_calls_total{function="voter.authenticate"} 1'
+            in text)
+    assert ('electionday_db_latency_seconds_bucket'
+            '{function="voter.authenticate",le="+Inf"} 1' in text)
+    data = json.loads(registry.write(tmp_path / 'metrics.json').read_text())
+    assert data['functions']['voter.authenticate']['calls'] == 1
+
+
+def test_disabled_by_default(database):
+    assert db.get_instrumentation() is None
+    voter_model.authenticate('Dovin', '1001')
+    assert not metrics.REGISTRY.functions
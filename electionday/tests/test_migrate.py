@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+import electionday.database as db
+import electionday.district as district
+import electionday.journal as journal
+import electionday.migrate as migrate
+import electionday.party as party_model
+import electionday.voter as voter_model
+from electionday.tests.conftest import DISTRICTS, PARTIES, vote
+
+
+# Tables as created by the first version's setup_db.py, before
+#   ballots, districts and the migrate module.
+LEGACY_TABLES = [
+    '''CREATE TABLE parties(
+        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+        name VARCHAR(30) NOT NULL UNIQUE,
+        symbol VARCHAR(60),
+        votes NUMERIC(10) NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE voters(
+        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+        name VARCHAR(60) NOT NULL,
+        voter_id VARCHAR(12) NOT NULL UNIQUE,
+        has_voted NUMERIC(1) NOT NULL DEFAULT 0
+    )''',
+]
+VOTERS = [(f'{2000 + i}', f'Voter {i}') for i in range(25)]
+
+
+@pytest.fixture
+def legacy(tmp_path, monkeypatch):
+    """Database of the first version, with some votes."""
+    monkeypatch.setattr(db, '_provider', None)
+    provider = db.configure(tmp_path / 'legacy.db')
+    connection = db.get_connection()
+    for query in LEGACY_TABLES:
+        connection.execute(query)
+    connection.executemany('INSERT INTO parties(name) VALUES(?)',
+                           [(name,) for name in PARTIES])
+    connection.executemany('INSERT INTO voters(voter_id, name) VALUES(?, ?)',
+                           VOTERS)
+    # Votes were counted on the party row, without ballots.
+    for voter_id, party_id in (('2000', 1), ('2001', 2), ('2020', 2)):
+        connection.execute(
+            'UPDATE voters SET has_voted = 1 WHERE voter_id = ?',
+            (voter_id,))
+        connection.execute(
+            'UPDATE parties SET votes = votes + 1 WHERE id = ?', (party_id,))
+    connection.commit()
+    yield provider
+    journal.close()
+    provider.close()
+
+
+def table_sql(name):
+    row = db.get_connection().execute(
+        'SELECT sql FROM sqlite_master WHERE name = ?', (name,)).fetchone()
+    return row and row[0]
+
+
+def test_new_databases_are_current(database):
+    assert 'WITHOUT ROWID' in table_sql('voters')
+    assert 'AUTOINCREMENT' not in table_sql('parties')
+    assert migrate.get_version() == 0
+    assert migrate.migrate() == [1, 2]
+    assert migrate.get_version() == migrate.SCHEMA_VERSION
+    assert migrate.migrate() == []
+
+
+def test_migrate_in_batches_while_voting(legacy):
+    copied = []
+
+    def progress(version, rows):
+        copied.append((version, rows))
+        if len(copied) == 2:
+            # Votes and registrations between batches, before and after
+            #   the batch being copied.
+            vote('2002', 3)
+            vote('2024', 1)
+            db.populate_tables((district.populate_table, DISTRICTS),
+                               (voter_model.populate_table,
+                                [('3000', 'Late', 'Ghirapur')]))
+
+    assert migrate.migrate(batch_size=10, pause=0, progress=progress) == [
+        1, 2]
+    assert copied == [(1, 3), (2, 10), (2, 20), (2, 26)]
+    assert 'WITHOUT ROWID' in table_sql('voters')
+    assert 'AUTOINCREMENT' not in table_sql('parties')
+    assert 'REFERENCES parties' in table_sql('ballots')
+    assert table_sql('voters_compact') is None
+
+    after = {p.name: p.votes for p in party_model.select_results()}
+    assert after == {'Azorius Senate': 2, 'Boros Legion': 2,
+                     'Dimir House': 1}
+    voted = db.get_connection().execute(
+        'SELECT voter_id FROM voters WHERE has_voted ORDER BY voter_id')
+    assert [row[0] for row in voted] == ['2000', '2001', '2002', '2020',
+                                         '2024']
+    late = voter_model.authenticate('late', '3000')
+    assert late.district_id == district.find_scope('Ghirapur')._id
+    assert late._id == 26
+    assert voter_model.authenticate(
+        'Voter 2', '2002') is voter_model.AuthFailure.ALREADY_VOTED
+    vote('2010', 2)
+    assert party_model.get_by_id(2).votes == 3
+
+
+def test_party_triggers_survive(legacy):
+    migrate.migrate()
+    version = db.get_connection().execute(
+        'SELECT version FROM parties_version').fetchone()[0]
+    db.populate_tables((party_model.populate_table, ['Gruul Clans']))
+    assert db.get_connection().execute(
+        'SELECT version FROM parties_version').fetchone()[0] == version + 1
+
+
+@pytest.mark.skipif(sqlite3.sqlite_version_info < (3, 37, 0),
+                    reason='STRICT tables need SQLite 3.37')
+def test_migrated_tables_are_strict(legacy):
+    migrate.migrate()
+    with pytest.raises(sqlite3.IntegrityError):
+        db.get_connection().execute(
+            "UPDATE parties SET votes = 'many' WHERE id = 1")
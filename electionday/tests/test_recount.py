@@ -0,0 +1,43 @@
+import electionday as app
+import electionday.ballot as ballot
+import electionday.database as db
+import electionday.party as party_model
+import electionday.recount as recount
+import electionday.voter as voter_model
+
+
+def cast_votes():
+    parties = party_model.select_all()
+    for i, (voter_id, name) in enumerate(
+            [('1001', 'Dovin'), ('1002', 'Tajic'), ('1003', 'Etrata')]):
+        app.cast_vote(voter=voter_model.authenticate(name, voter_id),
+                      party=parties[i % 2])
+
+
+def test_recount_matches_counters(database):
+    cast_votes()
+    report = recount.recount([database.path], workers=2, chunk_size=2)
+    assert report.ok
+    assert report.ballots == report.voters_voted == 3
+    got = {party.name: party.recounted for party in report.parties}
+    assert got == {'Azorius Senate': 2, 'Boros Legion': 1, 'Dimir House': 0}
+
+
+def test_recount_reports_counter_discrepancy(database):
+    cast_votes()
+    with database.connection as connection:
+        ballot.fold(connection.cursor())
+        connection.execute(
+            "UPDATE parties SET votes = votes + 5 WHERE name = 'Dimir House'")
+    report = recount.recount([database.path], workers=1)
+    assert not report.ok
+    [party] = report.discrepancies
+    assert (party.name, party.recounted, party.difference) == (
+        'Dimir House', 0, 5)
+
+
+def test_recount_sums_multiple_databases(database, tmp_path):
+    cast_votes()
+    report = recount.recount([database.path, database.path], workers=1)
+    assert report.ballots == 6
+    assert report.to_dict()['ok']
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+import electionday.config as config
+import electionday.database as db
+import electionday.district as district
+import electionday.party as party_model
+import electionday.replica as replica
+from electionday.tests.conftest import vote
+
+
+def database_path():
+    return db.get_provider().path
+
+
+def votes():
+    return {party.name: party.votes for party in party_model.select_results()}
+
+
+@pytest.fixture
+def publisher(database):
+    publisher = replica.start(interval=3600)
+    yield publisher
+    replica.stop()
+
+
+def test_reads_lag_until_next_snapshot(publisher):
+    assert publisher.path == replica.replica_path(database_path())
+    assert publisher.snapshots == 1
+    vote('1001', 1)
+    assert votes()['Azorius Senate'] == 0
+    publisher.publish()
+    assert votes()['Azorius Senate'] == 1
+    assert publisher.staleness < 1
+    assert publisher.staleness_bound == 3600 + publisher.seconds
+
+
+def test_replica_is_an_immutable_rollback_journal_copy(publisher):
+    copy = sqlite3.connect(publisher.path)
+    assert copy.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    assert copy.execute('SELECT COUNT(*) FROM voters').fetchone()[0] == 4
+    copy.close()
+    # Replica reads don't wait for the primary's write lock.
+    writer = sqlite3.connect(database_path(), timeout=0)
+    writer.execute('BEGIN EXCLUSIVE')
+    assert district.find_scope('Ravnica').level == district.REGION
+    writer.rollback()
+    writer.close()
+
+
+def test_stale_replica_falls_back_to_primary(publisher, monkeypatch):
+    vote('1001', 1)
+    assert votes()['Azorius Senate'] == 0
+    monkeypatch.setattr(config, 'REPLICA_MAX_STALENESS', -1.0)
+    assert votes()['Azorius Senate'] == 1
+
+
+def test_using_keeps_its_provider(publisher):
+    vote('1001', 1)
+    with db.using(db.get_provider()):
+        assert votes()['Azorius Senate'] == 1
+    assert votes()['Azorius Senate'] == 0
+
+
+def test_stop_reads_primary(publisher):
+    vote('1001', 1)
+    replica.stop()
+    assert replica.current() is None
+    assert votes()['Azorius Senate'] == 1
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+import electionday as app
+import electionday.party as party_model
+import electionday.results as results
+import electionday.voter as voter_model
+
+
+@pytest.fixture
+def cache(database):
+    return results.ResultsCache()
+
+
+def vote(voter_id, name, party_name, cache):
+    voter = voter_model.authenticate(name, voter_id)
+    party = next(party for party in party_model.select_all()
+                 if party.name == party_name)
+    cache.record_vote(app.cast_vote(voter=voter, party=party), party._id)
+
+
+def test_results_match_database(cache):
+    got = [(party.name, party.votes) for party in cache.results()]
+    expected = [(party.name, party.votes)
+                for party in party_model.select_results()]
+    assert got == expected
+
+
+def test_record_vote_updates_ranking_without_reload(cache, monkeypatch):
+    cache.results()
+    monkeypatch.setattr(results, '_load', None)
+    vote('1001', 'Dovin', 'Dimir House', cache)
+    got = [(party.name, party.votes) for party in cache.results()]
+    assert got[0] == ('Dimir House', 1)
+    assert [party.name for party in cache.winners()] == ['Dimir House']
+
+
+def test_winners_include_ties(cache):
+    vote('1001', 'Dovin', 'Dimir House', cache)
+    vote('1002', 'Tajic', 'Boros Legion', cache)
+    got = [party.name for party in cache.winners()]
+    assert got == ['Boros Legion', 'Dimir House']
+    assert got == [party.name for party in party_model.select_winners()]
+
+
+def test_results_reload_after_write_from_other_connection(database, cache):
+    cache.results()
+    connection = sqlite3.connect(database.path)
+    with connection:
+        connection.execute('INSERT INTO ballots(party_id) VALUES(1)')
+    connection.close()
+    got = {party.name: party.votes for party in cache.results()}
+    assert got['Azorius Senate'] == 1
+
+
+def test_out_of_order_ballots_are_applied_in_sequence(cache):
+    cache.results()
+    cache.record_vote(cache.ballot_id + 2, 2)
+    assert sum(party.votes for party in cache.results()) == 0
+    cache.record_vote(cache.ballot_id + 1, 1)
+    assert sum(party.votes for party in cache.results()) == 2
@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+
+import electionday.roll as roll
+
+
+VOTERS = [['1001', 'Dovin'], ['1002', 'Tajic'], ['1003', 'Etrata']]
+
+
+def test_iter_json_array_streams_member_of_object(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps({'parties': ['A', 'B'], 'voters': VOTERS}))
+    got = list(roll.iter_json_array(path, 'voters'))
+    assert got == VOTERS
+
+
+def test_iter_json_array_streams_across_chunks(tmp_path):
+    path = tmp_path / 'data.json'
+    voters = [[str(1000 + i), f'Name {i}'] for i in range(500)]
+    path.write_text(json.dumps({'voters': voters, 'count': 12345}))
+    got = list(roll.iter_json_array(path, 'voters', chunk_size=7))
+    assert got == voters
+
+
+def test_iter_json_array_empty_array(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('{"parties": [], "voters": []}')
+    assert list(roll.iter_json_array(path, 'parties')) == []
+
+
+@pytest.mark.parametrize('filename, content', [
+    ('voters.json', json.dumps({'parties': ['A'], 'voters': VOTERS})),
+    ('voters.json', json.dumps(VOTERS)),
+    ('voters.ndjson', '\n'.join(json.dumps(voter) for voter in VOTERS)),
+    ('voters.jsonl', '\n'.join(
+        json.dumps({'voter_id': voter_id, 'name': name})
+        for voter_id, name in VOTERS)),
+    ('voters.csv', 'voter_id,name\n' + '\n'.join(
+        ','.join(voter) for voter in VOTERS)),
+    ('voters.csv', '\n'.join(','.join(voter) for voter in VOTERS)),
+])
+def test_iter_voters_reads_supported_formats(tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_text(content)
+    got = list(roll.iter_voters(path))
+    expected = [tuple(voter) for voter in VOTERS]
+    assert got == expected
+
+
+def test_iter_voters_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        list(roll.iter_voters(tmp_path / 'voters.xml', 'xml'))
+
+
+@pytest.mark.parametrize('size, expected', [
+    (2, [[0, 1], [2, 3], [4]]),
+    (5, [[0, 1, 2, 3, 4]]),
+    (10, [[0, 1, 2, 3, 4]]),
+])
+def test_batched(size, expected):
+    assert list(roll.batched(range(5), size)) == expected
+
+
+class _MeasuredStream(roll._JSONStream):
+    largest: int = 0
+
+    def _fill(self):
+        filled = super()._fill()
+        self.largest = max(self.largest, len(self.buffer))
+        return filled
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 16])
+def test_iter_member_skips_members_before_key(chunk_size):
+    voters = [[str(1000 + i), f'N\\a"me {i} ]}}'] for i in range(2000)]
+    text = json.dumps({'voters': voters, 'note': 'a \\" [ {' * 20,
+                       'meta': {'a': [[1, {'b': '}'}]], 'c': [[[]], {}]},
+                       'count': -12.5e3, 'parties': ['A', 'B']})
+    stream = _MeasuredStream(io.StringIO(text), chunk_size)
+    assert list(stream.iter_member('parties')) == ['A', 'B']
+    # Skipped members are never held in memory.
+    assert stream.largest < 64
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64])
+def test_decode_values_longer_than_chunk(chunk_size):
+    values = [{'name': 'x' * 100, 'tags': [1, 2.5, None, True, 'a\\\\b']},
+              'é\\n"' * 30, -12345.678, []]
+    stream = roll._JSONStream(io.StringIO(json.dumps(values)), chunk_size)
+    assert list(stream.iter_array()) == values
@@ -0,0 +1,69 @@
+import io
+import os
+
+from click.testing import CliRunner
+
+import electionday.cli as cli
+import electionday.navigation as navigation
+import electionday.screen as screen_model
+
+
+class CountingStream(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+def test_frame_is_written_once():
+    stream = CountingStream()
+    screen = screen_model.Screen(padding=2, stream=stream)
+    screen.clear()
+    screen.header('MAIN MENU')
+    screen.line('One', '<c>', '<r>')
+    screen.line('Two')
+    screen.flush()
+    assert stream.writes == 1
+    assert stream.getvalue() == (
+        f'{screen_model.CLEAR}\n  MAIN MENU\n\n<c>  One<r>\n  Two\n')
+    screen.flush()
+    assert stream.writes == 1
+
+
+def test_clear_drops_unflushed_output():
+    screen = screen_model.Screen()
+    screen.line('stale')
+    screen.clear()
+    assert screen.render() == screen_model.CLEAR
+
+
+def test_menu_layout_is_cached_until_options_change(monkeypatch):
+    menu = navigation.Menu(['One', 'Two'], [1, 2])
+    calls = []
+    render = menu._render
+    monkeypatch.setattr(menu, '_render', lambda: calls.append(1) or render())
+    assert menu.layout == menu.layout == str(menu)
+    assert len(calls) == 1
+    menu.options.append('Three')
+    menu.selectors.append('3')
+    assert 'Three' in menu.layout
+    menu.left_padding = 4
+    assert menu.layout.startswith('    1.')
+    assert len(calls) == 3
+
+
+def test_cli_clears_without_subprocess(monkeypatch):
+    enabled = []
+    monkeypatch.setattr(os, 'system', None)
+    monkeypatch.setattr(screen_model.colorama, 'just_fix_windows_console',
+                        lambda: enabled.append(True))
+    monkeypatch.setattr(cli.db, 'close', lambda: None)
+    result = CliRunner().invoke(cli.main, ['-o', '3'])
+    assert result.exit_code == 0
+    assert result.output.startswith(screen_model.CLEAR)
+    assert 'MAIN MENU' in result.output and 'Goodbye' in result.output
+    assert enabled == [True]
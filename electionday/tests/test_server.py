@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+
+import electionday.config as config
+import electionday.metrics as metrics
+import electionday.server as server
+
+
+async def request(port, method, path, body=None, headers=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = f'{method} {path} HTTP/1.1\r\nConnection: close\r\n'
+    for key, value in (headers or {}).items():
+        head += f'{key}: {value}\r\n'
+    if 'Content-Length' not in (headers or {}):
+        head += f'Content-Length: {len(payload)}\r\n'
+    head += '\r\n'
+    writer.write(head.encode() + payload)
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    _, _, raw_body = rest.partition(b'\r\n\r\n')
+    return int(status_line.split()[1]), json.loads(raw_body)
+
+
+def run(*requests):
+    async def main():
+        api = server.VotingServer(read_workers=2)
+        listener = await api.start('127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return [await request(port, *args) for args in requests]
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            api.ballots.close()
+            api.readers.shutdown()
+    return asyncio.run(main())
+
+
+def test_auth_returns_voter(database):
+    [(status, body)] = run(
+        ('POST', '/auth', {'name': 'dovin', 'voter_id': '1001'}))
+    assert status == 200
+    assert body == {'name': 'Dovin', 'voter_id': '1001'}
+
+
+def test_auth_rejects_invalid_credentials(database):
+    [(status, body)] = run(
+        ('POST', '/auth', {'name': 'Tajic', 'voter_id': '1001'}))
+    assert status == 401
+
+
+def test_parties_lists_parties(database):
+    [(status, body)] = run(('GET', '/parties'))
+    assert status == 200
+    assert [party['name'] for party in body] == [
+        'Azorius Senate', 'Boros Legion', 'Dimir House']
+
+
+def test_cast_ballot_then_results(database, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    ballot = {'name': 'Dovin', 'voter_id': '1001', 'party_id': 2}
+    (cast, again, results, forbidden) = run(
+        ('POST', '/ballots', ballot),
+        ('POST', '/ballots', ballot),
+        ('GET', '/results', None, {'X-Password': 'secret'}),
+        ('GET', '/results'),
+    )
+    assert cast[0] == 201
+    assert again[0] == 409
+    assert results[0] == 200
+    assert [party['name'] for party in results[1]['winners']] == [
+        'Boros Legion']
+    assert forbidden[0] == 403
+
+
+@pytest.mark.parametrize('method, path, status', [
+    ('GET', '/missing', 404),
+    ('GET', '/ballots', 405),
+])
+def test_unknown_routes(database, method, path, status):
+    [(got, _)] = run((method, path))
+    assert got == status
+
+
+@pytest.mark.parametrize('length, status', [
+    ('abc', 400), ('-1', 400), ('1e3', 400), (str(1 << 20), 413),
+])
+def test_invalid_content_length(database, length, status):
+    [(got, body)] = run(('POST', '/auth', None, {'Content-Length': length}))
+    assert got == status
+    assert body['error']
+
+
+def test_metrics_when_enabled(database, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    [(disabled, _)] = run(('GET', '/metrics', None, {'X-Password': 'secret'}))
+    metrics.enable(metrics.Registry())
+    try:
+        [(auth, _), (status, body)] = run(
+            ('POST', '/auth', {'name': 'Dovin', 'voter_id': '1001'}),
+            ('GET', '/metrics', None, {'X-Password': 'secret'}))
+    finally:
+        metrics.disable()
+    assert disabled == 404
+    assert status == 200
+    assert body['functions']['voter.authenticate']['calls'] == 1
+
+
+def test_results_by_district(database, monkeypatch):
+    monkeypatch.setitem(vars(config), 'PASSWORD', 'secret')
+    headers = {'X-Password': 'secret'}
+    (cast, scoped, unknown) = run(
+        ('POST', '/ballots',
+         {'name': 'Etrata', 'voter_id': '1003', 'party_id': 3}),
+        ('GET', '/results?district=kaladesh', None, headers),
+        ('GET', '/results?district=Nowhere', None, headers),
+    )
+    assert cast[0] == 201
+    assert scoped[1]['scope'] == {'level': 'region', 'name': 'Kaladesh'}
+    assert [party['name'] for party in scoped[1]['winners']] == [
+        'Dimir House']
+    assert unknown[0] == 404
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+import electionday as app
+import electionday.config as config
+import electionday.party as party_model
+import electionday.results as results
+import electionday.shard as shard
+import electionday.storage as storage
+import electionday.voter as voter_model
+import electionday.writer as ballot_writer
+
+
+PARTIES = ['Azorius Senate', 'Boros Legion', 'Dimir House']
+VOTERS = [(str(1000 + i), f'Voter {i}') for i in range(60)]
+
+
+@pytest.fixture
+def router(tmp_path):
+    roll_path = tmp_path / 'roll.csv'
+    roll_path.write_text(
+        '\n'.join(f'{voter_id},{name}' for voter_id, name in VOTERS))
+    router = shard.ShardRouter(shard.shard_paths(3, tmp_path))
+    router.populate(PARTIES, roll_path)
+    yield router
+    router.close()
+
+
+def test_shard_index_is_stable():
+    assert shard.shard_index('1001', 4) == shard.shard_index('1001', 4)
+    assert {shard.shard_index(voter_id, 4) for voter_id, _ in VOTERS} == {
+        0, 1, 2, 3}
+
+
+def test_populate_partitions_voters(router):
+    counts = []
+    for provider in router.providers:
+        counts.append(provider.connection.execute(
+            'SELECT COUNT(*) FROM voters').fetchone()[0])
+    assert sum(counts) == len(VOTERS)
+    assert all(counts)
+
+
+def test_lookups_are_routed_to_voter_shard(router):
+    for voter_id, name in VOTERS:
+        assert router.is_valid(name, voter_id)
+        assert router.get_by_voter_id(voter_id).name == name
+    assert router.authenticate('Nobody', '1') is (
+        voter_model.AuthFailure.UNKNOWN_ID)
+
+
+def test_votes_are_summed_across_shards(router):
+    parties = router.select_all()
+
+    def cast(voters):
+        for i, (voter_id, name) in enumerate(voters):
+            router.cast_vote(router.authenticate(name, voter_id),
+                        parties[i % 2])
+
+    threads = [threading.Thread(target=cast, args=(VOTERS[i::4],))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    got = {party.name: party.votes for party in router.select_results()}
+    assert got == {'Azorius Senate': 32, 'Boros Legion': 28,
+                   'Dimir House': 0}
+    assert [party.name for party in router.select_winners()] == [
+        'Azorius Senate']
+
+
+def test_national_results_are_cached(router, monkeypatch):
+    parties = router.select_all()
+    assert not any(party.votes for party in router.select_results())
+    # Votes on this process's shard connections are applied in memory.
+    monkeypatch.setattr(results, '_load', None)
+    for i, (voter_id, name) in enumerate(VOTERS[:6]):
+        router.cast_vote(router.authenticate(name, voter_id),
+                         parties[i % 2])
+    got = {party.name: party.votes for party in router.select_results()}
+    assert got == {'Azorius Senate': 3, 'Boros Legion': 3, 'Dimir House': 0}
+
+
+def test_vote_twice_on_shard_raises(router):
+    voter_id, name = VOTERS[0]
+    party = router.select_all()[0]
+    router.cast_vote(router.authenticate(name, voter_id), party)
+    with pytest.raises(voter_model.AlreadyVotedError):
+        router.cast_vote(router.get_by_voter_id(voter_id), party)
+
+
+def test_model_functions_use_shards(router):
+    writer = ballot_writer.BallotWriter(max_delay=0)
+    with storage.using(router):
+        parties = party_model.select_all()
+        for voter_id, name in VOTERS[:3]:
+            voter = voter_model.authenticate(name, voter_id)
+            app.cast_vote(voter=voter, party=parties[0])
+        voter_id, name = VOTERS[3]
+        writer.cast(voter_model.authenticate(name, voter_id), parties[1])
+        assert voter_model.get_by_voter_id(voter_id).has_voted is True
+        got = {party.name: party.votes
+               for party in party_model.select_results()}
+    writer.close()
+    assert got == {'Azorius Senate': 3, 'Boros Legion': 1, 'Dimir House': 0}
+    for voter_id, _ in VOTERS[:4]:
+        assert router.provider_for(voter_id).connection.execute(
+            'SELECT has_voted FROM voters WHERE voter_id = ?',
+            (voter_id,)).fetchone() == (1,)
+
+
+def test_shard_count_selects_router(tmp_path, monkeypatch):
+    monkeypatch.setitem(vars(config), 'SHARD_COUNT', 2)
+    monkeypatch.setitem(vars(config), 'DATA_DIR_PATH', tmp_path)
+    engine = storage.create()
+    try:
+        assert isinstance(engine, shard.ShardRouter)
+        assert [provider.path for provider in engine.providers] == (
+            shard.shard_paths(2, tmp_path))
+    finally:
+        engine.close()
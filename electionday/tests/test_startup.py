@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import electionday.config as config
+import electionday.startup as startup
+
+
+def test_package_import_is_lazy():
+    modules = {time.module for time in startup.import_times(
+        'electionday, electionday.navigation, electionday.config')}
+    for heavy in ('click', 'colorama', 'environs', 'sqlite3'):
+        assert heavy not in modules
+
+
+def test_config_without_password():
+    env = {key: value for key, value in os.environ.items()
+           if key != 'PASSWORD'}
+    completed = subprocess.run(
+        [sys.executable, '-c',
+         'import electionday.config as c; print(c.APP_NAME)'],
+        capture_output=True, text=True, cwd=config.BASE_PATH, env=env)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == config.APP_NAME
+
+
+def test_cli_import_within_budget():
+    report = startup.cold_start('electionday.cli', runs=3)
+    assert report['import_ms'] <= config.STARTUP_BUDGET_MS, report['slowest']
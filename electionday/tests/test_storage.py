@@ -0,0 +1,132 @@
+import pytest
+
+import electionday as app
+import electionday.catalog as catalog
+import electionday.database as db
+import electionday.district as district
+import electionday.memory as memory
+import electionday.party as party_model
+import electionday.results as results
+import electionday.storage as storage
+import electionday.voter as voter_model
+from electionday.tests.conftest import DISTRICTS, PARTIES, VOTERS, vote
+
+
+@pytest.fixture
+def memory_engine(monkeypatch):
+    """In-memory engine with the test data, no database connection."""
+    monkeypatch.setattr(db.ConnectionProvider, 'connection', None)
+    engine = memory.MemoryStorage(None)
+    engine.add_parties(PARTIES)
+    engine.add_districts(DISTRICTS)
+    engine.add_voters(VOTERS)
+    with storage.using(engine):
+        yield engine
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def engine(request):
+    """Run test against each storage engine."""
+    return request.getfixturevalue(
+        'database' if request.param == 'sqlite' else 'memory_engine')
+
+
+def test_login(engine):
+    assert voter_model.is_valid('dovin', '1001')
+    assert not voter_model.is_valid('Tajic', '1001')
+    assert voter_model.get_by_voter_id('9999') is None
+    dovin = voter_model.authenticate('DOVIN', '1001')
+    assert (dovin._id, dovin.name, dovin.has_voted) == (1, 'Dovin', False)
+    assert dovin.district_id == district.find_scope('tenth district')._id
+    assert voter_model.get_by_voter_id('1004').district_id is None
+    assert voter_model.authenticate(
+        'Dovin', '9999') is voter_model.AuthFailure.UNKNOWN_ID
+    assert voter_model.authenticate(
+        'Tajic', '1001') is voter_model.AuthFailure.NAME_MISMATCH
+
+
+def test_login_ignores_case_in_any_script(engine):
+    voters = [('1005', 'Ünal Straße')]
+    if isinstance(engine, memory.MemoryStorage):
+        engine.add_voters(voters)
+    else:
+        voter_model.bulk_import(voters)
+    assert voter_model.is_valid('ÜNAL STRASSE', '1005')
+    assert voter_model.authenticate('ünal strasse', '1005').name == (
+        'Ünal Straße')
+    assert voter_model.authenticate(
+        'Unal Strasse', '1005') is voter_model.AuthFailure.NAME_MISMATCH
+
+
+def test_votes_and_results(engine):
+    assert [vote(*v) for v in (('1001', 2), ('1002', 2), ('1003', 1))] == [
+        1, 2, 3]
+    assert voter_model.authenticate(
+        'Dovin', '1001') is voter_model.AuthFailure.ALREADY_VOTED
+    voter = voter_model.get_by_voter_id('1001')
+    assert voter.has_voted
+    with pytest.raises(voter_model.AlreadyVotedError):
+        app.cast_vote(voter=voter, party=party_model.get_by_id(1))
+
+    results = party_model.select_results()
+    assert [(p.name, p.votes, p.selector) for p in results] == [
+        ('Boros Legion', 2, '1'), ('Azorius Senate', 1, '2'),
+        ('Dimir House', 0, '3')]
+    assert [p.name for p in party_model.select_winners()] == ['Boros Legion']
+    assert [p.name for p in party_model.select_all()] == sorted(PARTIES)
+    assert party_model.get_by_id(2).votes == 2
+    assert party_model.get_by_id(99) is None
+
+    ravnica = district.find_scope('Ravnica')
+    assert ravnica.level == district.REGION
+    assert {p.name: p.votes for p in party_model.select_results(ravnica)
+            } == {'Boros Legion': 2, 'Azorius Senate': 0, 'Dimir House': 0}
+    ghirapur = district.find_scope('GHIRAPUR')
+    assert [p.name for p in party_model.select_winners(ghirapur)] == [
+        'Azorius Senate']
+    assert district.find_scope('Innistrad') is None
+
+
+def test_failed_vote_leaves_voter_unchanged(engine, capsys):
+    voter = voter_model.get_by_voter_id('1001')
+    stale = voter_model.get_by_voter_id('1001')
+    app.cast_vote(voter=voter, party=party_model.get_by_id(1))
+    assert voter.has_voted is True
+    with pytest.raises(voter_model.AlreadyVotedError):
+        app.cast_vote(voter=stale, party=party_model.get_by_id(1))
+    assert stale.has_voted is False
+    assert capsys.readouterr().out.count('AlreadyVotedError') <= 1
+
+
+def test_tied_winners(engine):
+    vote('1001', 1)
+    vote('1002', 3)
+    assert [p.name for p in party_model.select_winners()] == [
+        'Azorius Senate', 'Dimir House']
+
+
+def test_catalog_and_results_cache(memory_engine):
+    # Engine has no database connection, so none of this reads SQLite.
+    assert [party.name for party in catalog.CATALOG.parties()] == PARTIES
+    party = catalog.CATALOG.by_selector('2')
+    assert party.name == 'Boros Legion'
+    assert catalog.CATALOG.by_id(party._id) == party
+    assert catalog.CATALOG.by_selector('9') is None
+    app.cast_vote(voter=voter_model.authenticate('Dovin', '1001'),
+                  party=party)
+    assert [(p.name, p.votes) for p in results.CACHE.results()] == [
+        ('Boros Legion', 1), ('Azorius Senate', 0), ('Dimir House', 0)]
+    assert [p.name for p in results.CACHE.winners()] == ['Boros Legion']
+
+
+def test_memory_engine_from_config(monkeypatch, tmp_path):
+    data = tmp_path / 'data.json'
+    data.write_text('{"parties": ["Simic Combine"], "districts": [],'
+                    ' "voters": [["1", "Zegana"]]}')
+    monkeypatch.setattr(storage, '_storage', None)
+    monkeypatch.setattr(db.ConnectionProvider, 'connection', None)
+    engine = storage.configure('memory', path=data)
+    assert storage.get_storage() is engine
+    assert voter_model.is_valid('Zegana', '1')
+    with pytest.raises(ValueError):
+        storage.create('paper')
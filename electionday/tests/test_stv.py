@@ -0,0 +1,126 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import electionday.district as district
+import electionday.journal as journal
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.replay as replay
+import electionday.stv as stv
+import electionday.voter as voter_model
+import electionday.voting as voting
+import electionday.writer as ballot_writer
+
+
+def ballots(*groups):
+    """(count, [party IDs]) groups to RankedBallots over parties 1-4."""
+    rows = [preferences for count, preferences in groups
+            for _ in range(count)]
+    matrix = np.full((len(rows), 4), -1, dtype=np.int16)
+    for i, preferences in enumerate(rows):
+        matrix[i, :len(preferences)] = [_id - 1 for _id in preferences]
+    return stv.RankedBallots([1, 2, 3, 4], matrix)
+
+
+def test_instant_runoff():
+    count = stv.count(ballots((8, [1, 2]), (5, [2, 3]), (4, [3, 2]),
+                              (2, [4, 3])))
+    assert count.elected == [3]
+    assert [(r.eliminated, r.elected) for r in count.rounds] == [
+        (4, []), (2, []), (None, [3])]
+    assert count.rounds[1].votes == {1: 8, 2: 5, 3: 6}
+    assert count.rounds[2].votes == {1: 8, 3: 11}
+
+
+def test_exhausted_ballots():
+    count = stv.count(ballots((8, [1, 2]), (5, [2, 3]), (4, [3, 2]),
+                              (2, [4])))
+    assert count.elected == [2]
+    assert count.rounds[1].exhausted == 2
+    assert count.rounds[2].votes == {1: 8, 2: 9}
+
+
+@pytest.mark.parametrize('seats', [1, 2])
+def test_no_valid_ballots_elects_nobody(seats):
+    for empty in (ballots(), ballots((3, []))):
+        count = stv.count(empty, seats)
+        assert (count.elected, count.rounds) == ([], [])
+
+
+def test_majority_in_first_round():
+    count = stv.count(ballots((6, [1]), (4, [2])))
+    assert count.elected == [1] and len(count.rounds) == 1
+
+
+def test_surplus_transfers_at_reduced_weight():
+    count = stv.count(ballots((8, [1, 2]), (5, [2, 3]), (4, [3, 2]),
+                              (2, [4, 3])), seats=2)
+    assert count.quota == 7
+    assert count.rounds[0].elected == [1] and count.rounds[0].surplus == 1
+    assert count.rounds[1].votes == {2: 6, 3: 4, 4: 2}
+    assert count.elected == [1, 2]
+
+
+def test_ties_are_broken_by_earlier_rounds():
+    count = stv.count(ballots((4, [1]), (3, [2]), (3, [3]), (1, [4, 2])))
+    # 1 and 2 tie at 4 in the third round, 2 had fewer in the first.
+    assert [r.eliminated for r in count.rounds] == [4, 3, 2, None]
+    assert count.elected == [1]
+
+
+def test_from_blobs_drops_unknown_parties():
+    loaded = stv.RankedBallots.from_blobs(
+        [1, 2, 3], [ranked.encode([2, 9, 1]), ranked.encode([3])])
+    assert loaded.preferences.tolist() == [[1, 0], [2, -1]]
+
+
+def test_validate():
+    assert ranked.validate(['2', 1]) == (2, 1)
+    for preferences in ([], [1, 1], [0], list(range(1, 100))):
+        with pytest.raises(ranked.InvalidPreferencesError):
+            ranked.validate(preferences)
+    assert ranked.decode(ranked.encode([3, 1, 2])) == (3, 1, 2)
+
+
+def test_cast_and_count_by_district(database):
+    parties = {party._id: party for party in party_model.select_all()}
+
+    def cast(voter_id, *party_ids):
+        return voting.cast_ranked_vote(
+            voter=voter_model.get_by_voter_id(voter_id),
+            parties=[parties[_id] for _id in party_ids])
+
+    cast('1001', 1, 3)
+    cast('1002', 2, 3)
+    writer = ballot_writer.BallotWriter()
+    writer.cast(voter_model.get_by_voter_id('1003'), parties[3],
+                preferences=(3, 2))
+    with pytest.raises(ranked.InvalidPreferencesError):
+        writer.submit(voter_model.get_by_voter_id('1004'), parties[1],
+                      (2, 1))
+    writer.close()
+    assert party_model.select_results()[0].votes == 1
+    assert stv.count(stv.load()).elected == [3]
+    ravnica = stv.load(district.find_scope('Ravnica'))
+    assert len(ravnica) == 2
+    assert len(stv.load(district.find_scope('Ghirapur'))) == 1
+
+
+def test_replayed_without_preferences_not_counted(database, tmp_path):
+    path = tmp_path / 'old.ballots'
+    path.write_bytes(journal.MAGIC_V1)
+    log = journal.Journal(path)
+    log.append([journal.JournalEntry(1, 2, '1001', 1_000_000)])
+    log.close()
+    replay.rebuild(path)
+    with pytest.raises(ranked.MissingPreferencesError):
+        stv.load()
+
+
+def test_synthetic_count():
+    count = stv.count(stv.synthetic(20_000, 12, seed=1), seats=3)
+    assert len(count.elected) == 3 == len(set(count.elected))
+    assert count.quota == 5_001
+    first = count.rounds[0]
+    assert sum(first.votes.values()) == 20_000
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import electionday as app
+import electionday.bloom as bloom
+import electionday.eligibility as eligibility
+import electionday.party as party_model
+import electionday.sync as sync
+import electionday.voter as voter_model
+
+
+# 1001 renamed, 1002 moved district, 1003 unchanged, 1004 dropped and
+#   1005 new.
+ROLL = [('1001', 'Dovin Baan', 'Tenth District'),
+        ('1002', 'Tajic', 'Ghirapur'),
+        ('1003', 'Etrata', 'Ghirapur'),
+        ('1005', 'Kaya', 'Precinct Four')]
+
+
+def write_roll(path, voters):
+    with open(path, 'w') as f:
+        for voter_id, name, district_name in voters:
+            f.write(json.dumps({'voter_id': voter_id, 'name': name,
+                                'district': district_name}) + '\n')
+    return path
+
+
+def test_diff():
+    current = [('1', 'A', None, 0), ('2', 'B', 1, 1), ('3', 'C', 1, 0),
+               ('5', 'E', None, 0)]
+    new = [('1', 'A', None), ('3', 'C', 2), ('4', 'D', None)]
+    assert list(sync.diff(current, new)) == [
+        ('same', '1'), ('keep', '2'), ('update', ('3', 'C', 2)),
+        ('insert', ('4', 'D', None)), ('delete', '5')]
+
+
+@pytest.mark.parametrize('voters', [ROLL, ROLL[::-1]],
+                         ids=['sorted', 'unsorted'])
+def test_sync(database, tmp_path, voters):
+    report = sync.sync(write_roll(tmp_path / 'roll.ndjson', voters))
+    assert (report.inserted, report.updated, report.deleted,
+            report.unchanged) == (1, 2, 1, 1)
+    assert report.sorted_roll is (voters == ROLL)
+    assert voter_model.get_by_voter_id('1001').name == 'Dovin Baan'
+    assert voter_model.get_by_voter_id('1004') is None
+    assert voter_model.authenticate('Kaya', '1005').district_id == 2
+    assert (voter_model.get_by_voter_id('1002').district_id
+            == voter_model.get_by_voter_id('1003').district_id)
+    assert bloom.might_be_registered('1005')
+    # Applied, a second sync finds nothing to do.
+    report = sync.sync(tmp_path / 'roll.ndjson')
+    assert (report.changes, report.unchanged) == (0, 4)
+
+
+def test_sync_keeps_votes(database, tmp_path):
+    for name, voter_id in (('Dovin', '1001'), ('Judith', '1004')):
+        voter = voter_model.authenticate(name, voter_id)
+        app.cast_vote(voter=voter, party=party_model.select_all()[0])
+    report = sync.sync(write_roll(tmp_path / 'roll.ndjson', ROLL))
+    assert (report.deleted, report.kept_voted) == (0, 1)
+    assert voter_model.get_by_voter_id('1001').has_voted is True
+    assert voter_model.get_by_voter_id('1004').has_voted is True
+
+
+def test_dry_run(database, tmp_path):
+    report = sync.sync(write_roll(tmp_path / 'roll.ndjson', ROLL),
+                       dry_run=True)
+    assert report.changes == 4
+    assert voter_model.get_by_voter_id('1004') is not None
+    assert voter_model.get_by_voter_id('1005') is None
+
+
+def test_sync_rebuilds_index(database, tmp_path):
+    eligibility.build()
+    sync.sync(write_roll(tmp_path / 'roll.ndjson', ROLL), batch_size=1)
+    index = eligibility.current()
+    assert len(index) == 4
+    assert index.lookup('1005') is False
+    assert index.lookup('1004') is None
+
+
+def test_sync_patches_index_and_filter(database, tmp_path, monkeypatch):
+    bloom.rebuild()
+    eligibility.build()
+    app.cast_vote(voter=voter_model.authenticate('Etrata', '1003'),
+                  party=party_model.select_all()[0])
+    # Neither is rebuilt from the voters table.
+    monkeypatch.setattr(bloom, 'build', None)
+    monkeypatch.setattr(eligibility, 'build', None)
+    sync.sync(write_roll(tmp_path / 'roll.ndjson', ROLL))
+    assert '1005' in bloom.current()
+    index = eligibility.current()
+    assert len(index) == 4
+    assert (index.lookup('1003'), index.lookup('1005')) == (True, False)
+    assert index.lookup('1004') is None
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+import electionday.party as party_model
+import electionday.voter as voter_model
+import electionday.writer as ballot_writer
+
+
+@pytest.fixture
+def ballots(database):
+    writer = ballot_writer.BallotWriter(batch_size=16, max_delay=0.05)
+    yield writer
+    writer.close()
+
+
+def voter(voter_id, name):
+    return voter_model.authenticate(name, voter_id)
+
+
+def test_cast_returns_ballot_id(ballots):
+    party = party_model.select_all()[0]
+    assert ballots.cast(voter('1001', 'Dovin'), party) == 1
+    assert party_model.select_results()[0].votes == 1
+
+
+def test_concurrent_ballots_share_a_commit(ballots):
+    parties = party_model.select_all()
+    voters = [voter(voter_id, name) for voter_id, name in
+              [('1001', 'Dovin'), ('1002', 'Tajic'), ('1003', 'Etrata')]]
+    outcomes = []
+    threads = [
+        threading.Thread(target=lambda v=v, p=p: outcomes.append(
+            ballots.cast(v, p)))
+        for v, p in zip(voters, parties)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outcomes) == [1, 2, 3]
+    assert ballots.batches == 1
+
+
+def test_failed_ballot_does_not_abort_batch(ballots):
+    party = party_model.select_all()[0]
+    dovin = voter('1001', 'Dovin')
+    first = ballots.submit(dovin, party)
+    again = ballots.submit(
+        voter_model.Voter(_id=dovin._id, name='Dovin', voter_id='1001'),
+        party)
+    other = ballots.submit(voter('1002', 'Tajic'), party)
+    assert first.result() == 1
+    with pytest.raises(voter_model.AlreadyVotedError):
+        again.result()
+    assert other.result() == 2
+    assert party_model.select_results()[0].votes == 2
+
+
+def test_submit_after_close_raises(ballots):
+    ballots.close()
+    with pytest.raises(RuntimeError):
+        ballots.submit(voter('1001', 'Dovin'), party_model.select_all()[0])
+
+
+def test_close_resolves_every_submitted_ballot(ballots):
+    party = party_model.select_all()[0]
+    futures = []
+    stop = threading.Event()
+
+    def submit():
+        while not stop.is_set():
+            try:
+                futures.append(ballots.submit(
+                    voter_model.Voter(_id=1, name='Dovin', voter_id='1001'),
+                    party))
+            except RuntimeError:
+                return
+
+    threads = [threading.Thread(target=submit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while len(futures) < 50:
+        pass
+    ballots.close()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert all(future.done() for future in futures)
+    assert [future.exception() is None for future in futures].count(
+        True) == 1
+
+
+def test_stopped_writer_fails_queued_ballots(ballots):
+    pending = ballot_writer._PendingBallot(voter('1001', 'Dovin'),
+                                           party_model.select_all()[0])
+    ballots._queue.put(ballot_writer._STOP)
+    ballots._queue.put(pending)
+    ballots._run()
+    assert ballots._closed
+    with pytest.raises(RuntimeError):
+        pending.future.result(0)
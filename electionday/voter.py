@@ -1,8 +1,14 @@
 from dataclasses import dataclass
+import enum
 import sqlite3
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Optional, Union
 
+import electionday.bloom as bloom
+import electionday.config as config
 import electionday.database as db
+import electionday.eligibility as eligibility
+import electionday.roll as roll
+import electionday.storage as storage
 import electionday.party as party
 import electionday.voter as voter
 
@@ -14,10 +20,38 @@ class Voter:
     name: str
     voter_id: str
     has_voted: bool = False
+    district_id: Optional[int] = None
+
+
+class AlreadyVotedError(Exception):
+    """Raised when a voter who has already voted tries to vote again.
+    """
+
+
+class AuthFailure(enum.Enum):
+    """Reason a voter could not be authenticated.
+    """
+    UNKNOWN_ID = enum.auto()
+    NAME_MISMATCH = enum.auto()
+    ALREADY_VOTED = enum.auto()
+
+    @property
+    def message(self) -> str:
+        """User facing message, doesn't reveal which credential was wrong.
+        """
+        if self is AuthFailure.ALREADY_VOTED:
+            return 'You have already voted.'
+        return 'Invalid credentials.'
 
 
 def create_table(cursor: sqlite3.Cursor) -> None:
-    """Create parties table if it doesn't exist.
+    """Create voters table if it doesn't exist.
+
+    Voters are stored in a WITHOUT ROWID table keyed by voter_id, so a
+      login reads the whole voter from a single B-tree lookup instead of
+      the voter_id index followed by the table. The id column keeps the
+      registration order used by voter.Voter and recounts. Tables
+      created by earlier versions are upgraded by the migrate module.
 
     To be called from a create_tables function in setup.
 
@@ -28,14 +62,17 @@ def create_table(cursor: sqlite3.Cursor) -> None:
         sqlite3.Error: SQLite exception
         Exception: Generic exception
     """
-    query: str = '''CREATE TABLE IF NOT EXISTS voters(
-        id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-        name VARCHAR(60) NOT NULL,
-        voter_id VARCHAR(12) NOT NULL UNIQUE,
-        has_voted NUMERIC(1) NOT NULL DEFAULT 0
-    )'''
+    query: str = f'''CREATE TABLE IF NOT EXISTS voters(
+        voter_id TEXT PRIMARY KEY NOT NULL,
+        id INTEGER NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        has_voted INTEGER NOT NULL DEFAULT 0,
+        district_id INTEGER REFERENCES districts(id)
+    ) {db.table_options('WITHOUT ROWID')}'''
     try:
         cursor.execute(query)
+        db.add_column(cursor, 'voters', 'district_id',
+                      'INTEGER REFERENCES districts(id)')
     except sqlite3.OperationalError as e:
         print(repr(e))
         raise e
@@ -44,47 +81,223 @@ def create_table(cursor: sqlite3.Cursor) -> None:
         raise e
 
 
-def populate_table(cursor: sqlite3.Cursor, voters: Iterable):
+def populate_table(cursor: sqlite3.Cursor, voters: Iterable,
+                   batch_size: int = config.IMPORT_BATCH_SIZE,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   ) -> int:
+    """Insert voters in batches, skipping already registered voter IDs.
+
+    Voters are assigned to their district by name, unknown districts
+      leave the voter unassigned. Voter IDs are added to the existing
+      voter ID Bloom filter rather than rescanning the table, a new or
+      saturated one is built by bloom.rebuild, see bloom.store.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor
+        voters (Iterable): (voter_id, name) pairs or (voter_id, name,
+          district) rows
+        batch_size (int, optional): Rows per executemany call.
+          Defaults to config.IMPORT_BATCH_SIZE.
+        progress (Optional[Callable[[int, int], None]], optional): Called
+          with rows processed and rows inserted after each batch.
+          Defaults to None.
 
+    Raises:
+        sqlite3.Error: SQLite exception
+        Exception: Generic exception
+
+    Returns:
+        int: Number of inserted voters
+    """
+    # Voters table has no rowid to number voters, see create_table.
+    #   Numbered once per batch, skipped voters leave gaps.
+    last_id_query: str = 'SELECT COALESCE(MAX(id), 0) FROM voters'
+    query: str = '''INSERT OR IGNORE INTO voters(id, voter_id, name)
+        VALUES(?, ?, ?)'''
+    district_query: str = '''INSERT OR IGNORE INTO voters(
+        id, voter_id, name, district_id)
+        VALUES(?, ?, ?, (SELECT id FROM districts WHERE name = ?))'''
+    processed: int = 0
+    inserted: int = 0
     try:
-        for voter_id, name in voters:
-            query: str = (f"""INSERT INTO voters(name, voter_id)
-                VALUES(?, ?)""")
-            try:
-                cursor.execute(query, (name, voter_id))
-            except sqlite3.IntegrityError:
-                continue
+        voter_ids: Optional[bloom.BloomFilter] = bloom.saved(cursor)
+        for batch in roll.batched(voters, batch_size):
+            last_id: int = cursor.execute(last_id_query).fetchone()[0]
+            if all(len(row) == 2 for row in batch):
+                cursor.executemany(query, [
+                    (last_id + i, *row)
+                    for i, row in enumerate(batch, 1)])
+            else:
+                cursor.executemany(district_query, [
+                    (last_id + i, *row, None)[:4]
+                    for i, row in enumerate(batch, 1)])
+            if voter_ids is not None:
+                # Skipped voter IDs are registered already.
+                voter_ids.update(row[0] for row in batch)
+                if voter_ids.saturated():
+                    voter_ids = bloom.store(cursor, voter_ids)
+            processed += len(batch)
+            inserted += cursor.rowcount
+            if progress is not None:
+                progress(processed, inserted)
+        if voter_ids is not None:
+            bloom.store(cursor, voter_ids)
     except sqlite3.Error as e:
         print(repr(e))
         raise e
     except Exception as e:
         print(repr(e))
         raise e
+    return inserted
+
+
+@db.connect
+def bulk_import(connection: sqlite3.Connection, voters: Iterable,
+                batch_size: int = config.IMPORT_BATCH_SIZE,
+                progress: Optional[Callable[[int, int], None]] = None,
+                ) -> int:
+    """Stream voters into the voters table inside a single transaction.
+
+    Voters are consumed lazily from the iterable so memory use stays
+      flat regardless of the size of the voter roll, see
+      roll.iter_voters. The eligibility index is removed as it would
+      not know the new voters, rebuild it with eligibility.build, and
+      bloom.rebuild builds the voter ID filter if there is none.
+
+    Args:
+        connection (sqlite3.Connection): Passed via decorator
+        voters (Iterable): (voter_id, name) pairs
+        batch_size (int, optional): Rows per executemany call.
+          Defaults to config.IMPORT_BATCH_SIZE.
+        progress (Optional[Callable[[int, int], None]], optional): Called
+          with rows processed and rows inserted after each batch.
+          Defaults to None.
+
+    Returns:
+        int: Number of inserted voters
+    """
+    cursor: Optional[sqlite3.Cursor] = None
+    eligibility.remove()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('BEGIN')
+        return populate_table(cursor, voters, batch_size, progress)
+    finally:
+        if cursor:
+            cursor.close()
+
+
+def names_match(name: str, registered_name: str) -> bool:
+    """Compare an entered name with a registered one, ignoring case in
+      any script (Ünal matches ÜNAL), unlike SQLite's ASCII-only NOCASE.
+    """
+    return name.casefold() == registered_name.casefold()
+
 
+def _is_registered(voter_id: str) -> bool:
+    """False if voter_id is certainly unknown, checked without a query.
 
+    The Bloom filter sheds most unknown IDs in constant time, the
+      eligibility index catches the rest.
+    """
+    if not bloom.might_be_registered(voter_id):
+        return False
+    index: Optional[eligibility.EligibilityIndex] = eligibility.current()
+    return index is None or index.lookup(voter_id) is not None
+
+
+@storage.routed
 @db.connect_with_cursor
 def is_valid(cursor: sqlite3.Cursor, name: str, voter_id: str) -> bool:
 
+    if not _is_registered(voter_id):
+        return False
     query: str = 'SELECT name FROM voters WHERE voter_id = ?'
-    try:
-        return (name.lower()
-            == cursor.execute(query, (voter_id,)).fetchone()[0].lower())
-    except TypeError:
-        False
+    row = cursor.execute(query, (voter_id,)).fetchone()
+    return row is not None and names_match(name, row[0])
 
 
+@storage.routed
 @db.connect_with_cursor
 def get_by_voter_id(cursor: sqlite3.Cursor, voter_id: str) -> Optional[Voter]:
 
-    query: str = '''SELECT id, name, has_voted FROM voters WHERE voter_id = ?'''
-    _id, name, has_voted = cursor.execute(query, (voter_id,)).fetchone()
-    return Voter(_id=_id, name=name, voter_id=voter_id, has_voted=bool(int(has_voted)))
+    if not _is_registered(voter_id):
+        return None
+    query: str = '''SELECT id, name, has_voted, district_id FROM voters
+        WHERE voter_id = ?'''
+    row = cursor.execute(query, (voter_id,)).fetchone()
+    if row is None:
+        return None
+    _id, name, has_voted, district_id = row
+    return Voter(_id=_id, name=name, voter_id=voter_id,
+                 has_voted=bool(has_voted), district_id=district_id)
+
+
+@storage.routed
+@db.connect_with_cursor
+def authenticate(cursor: sqlite3.Cursor, name: str, voter_id: str
+                 ) -> Union[Voter, AuthFailure]:
+    """Validate credentials and fetch voter in a single query.
+
+    Name is compared case-insensitively on the fetched row, see
+      names_match. Unknown voter IDs are turned away by the Bloom filter
+      and eligibility index, if built, without a query. Already voted is
+      only reported once the name matches, so it doesn't reveal who has
+      voted.
+
+    Args:
+        cursor (sqlite3.Cursor): Passed via decorator
+        name (str): Name of voter
+        voter_id (str): Voter ID
+
+    Returns:
+        Union[Voter, AuthFailure]: Voter allowed to vote or reason for
+          refusing login
+    """
+    if not _is_registered(voter_id):
+        return AuthFailure.UNKNOWN_ID
+    query: str = '''SELECT id, name, has_voted, district_id FROM voters
+        WHERE voter_id = ?'''
+    row = cursor.execute(query, (voter_id,)).fetchone()
+    if row is None:
+        return AuthFailure.UNKNOWN_ID
+    _id, voter_name, has_voted, district_id = row
+    if not names_match(name, voter_name):
+        return AuthFailure.NAME_MISMATCH
+    if has_voted:
+        return AuthFailure.ALREADY_VOTED
+    return Voter(_id=_id, name=voter_name, voter_id=voter_id,
+                 district_id=district_id)
 
 
 def vote(cursor: sqlite3.Cursor, voter: Voter) -> None:
+    """Mark voter as having voted.
 
-    query: str = '''UPDATE voters SET has_voted = 1 WHERE id = ?'''
-    cursor.execute(query, (voter._id,))
+    The update only matches voters who haven't voted yet, so two
+      terminals racing for the same voter can't both succeed. Voters
+      marked in the eligibility index are refused without the update,
+      the caller marks the vote there once committed, see
+      eligibility.mark_voted.
+
+    Args:
+        cursor (sqlite3.Cursor): Connection cursor, inside the vote
+          transaction
+        voter (Voter): Voter to mark
+
+    Raises:
+        AlreadyVotedError: Voter has already voted
+    """
+    index: Optional[eligibility.EligibilityIndex] = eligibility.current()
+    if index is not None and index.lookup(voter.voter_id):
+        raise AlreadyVotedError(voter.voter_id)
+    query: str = '''UPDATE voters SET has_voted = 1
+        WHERE voter_id = ? AND has_voted = 0'''
+    updated: int = cursor.execute(query, (voter.voter_id,)).rowcount
+    if updated != 1:
+        if index is not None:
+            # Vote committed elsewhere but missing from the index.
+            index.mark(voter.voter_id)
+        raise AlreadyVotedError(voter.voter_id)
     voter.has_voted = True
 
 
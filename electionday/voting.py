@@ -0,0 +1,126 @@
+import functools
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import electionday.database as db
+import electionday.eligibility as eligibility
+import electionday.feed as feed
+import electionday.journal as journal
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.results as results
+import electionday.storage as storage
+import electionday.voter as voter_model
+
+
+# Ballot ID, voter, party and preferences, () unless ranked.
+Committed = Tuple[int, voter_model.Voter,
+                  Union[party_model.Party, party_model.PartyRecord],
+                  Tuple[int, ...]]
+
+
+def _record_state(ballots: List[Committed]) -> None:
+    for ballot_id, voter, party, _ in ballots:
+        results.CACHE.record_vote(ballot_id, party._id)
+        eligibility.mark_voted(voter.voter_id)
+
+
+def _publish(ballots: List[Committed],
+             engine: Optional[storage.Storage] = None) -> None:
+    feed.FEED.publish(engine)
+
+
+def record_committed(ballots: Iterable[Committed],
+                     engine: Optional[storage.Storage] = None) -> None:
+    """Update in-process state, the ballot journal and the live results
+      feed once ballots have been committed.
+
+    Called by every write path (cast_vote, the group-commit writer and
+      shards) after commit and before the ballots are acknowledged,
+      never inside the vote transaction, so a rolled back ballot is
+      never recorded and an acknowledged one is in the journal.
+
+    The ballots are committed whatever happens here, so a failing step
+      is printed and the others still run instead of failing the vote.
+
+    Args:
+        ballots (Iterable[Committed]): (ballot ID, voter, party,
+          preferences) tuples
+        engine (Optional[storage.Storage], optional): Engine the ballots
+          were cast on, whose results the feed publishes. Defaults to
+          None, the current engine.
+    """
+    ballots = list(ballots)
+    for step in (_record_state, journal.record,
+                 functools.partial(_publish, engine=engine)):
+        try:
+            step(ballots)
+        except Exception as e:
+            print(repr(e))
+
+
+@storage.routed
+@db.connect_with_cursor
+def cast_vote(cursor: db.sqlite3.Cursor,
+              voter: voter_model.Voter,
+              party: party_model.Party) -> int:
+    """Cast a vote by setting voter has_voted attribute/value to True/1
+      and appending a ballot for the party, in a single transaction.
+
+    The write lock is taken up front (BEGIN IMMEDIATE) so concurrent
+      terminals queue for it instead of failing to upgrade a read lock.
+
+    Args:
+        cursor (db.sqlite3.Cursor): Database connection cursor
+        voter (voter_model.Voter): Voter to vote
+        party (party_model.Party): Party to vote for
+
+    Raises:
+        voter_model.AlreadyVotedError: Voter has already voted
+        Exception: Generic exception
+
+    Returns:
+        int: Ballot ID
+    """
+    # Errors are printed and rolled back by the decorator.
+    cursor.execute('BEGIN IMMEDIATE')
+    voter_model.vote(cursor, voter)
+    ballot_id: int = party_model.add_vote(cursor, party, voter.district_id)
+    cursor.connection.commit()
+    record_committed([(ballot_id, voter, party, ())])
+    return ballot_id
+
+
+@db.connect_with_cursor
+def cast_ranked_vote(cursor: db.sqlite3.Cursor,
+                     voter: voter_model.Voter,
+                     parties: Sequence[Union[party_model.Party,
+                                             party_model.PartyRecord]]
+                     ) -> int:
+    """Cast a ranked vote, a ballot for the first preference plus the
+      full preference list, in a single transaction.
+
+    Args:
+        cursor (db.sqlite3.Cursor): Database connection cursor
+        voter (voter_model.Voter): Voter to vote
+        parties (Sequence[Union[party_model.Party,
+          party_model.PartyRecord]]): Parties, most preferred first
+
+    Raises:
+        ranked.InvalidPreferencesError: Preferences can't be counted
+        voter_model.AlreadyVotedError: Voter has already voted
+        Exception: Generic exception
+
+    Returns:
+        int: Ballot ID
+    """
+    preferences: Tuple[int, ...] = ranked.validate(
+        party._id for party in parties)
+    # Errors are printed and rolled back by the decorator.
+    cursor.execute('BEGIN IMMEDIATE')
+    voter_model.vote(cursor, voter)
+    ballot_id: int = party_model.add_vote(cursor, parties[0],
+                                          voter.district_id)
+    ranked.record(cursor, ballot_id, preferences)
+    cursor.connection.commit()
+    record_committed([(ballot_id, voter, parties[0], preferences)])
+    return ballot_id
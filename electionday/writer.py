@@ -0,0 +1,271 @@
+import asyncio
+import concurrent.futures
+from dataclasses import dataclass, field
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple, Union
+
+import electionday.config as config
+import electionday.database as db
+import electionday.party as party_model
+import electionday.ranked as ranked
+import electionday.storage as storage
+import electionday.voter as voter_model
+import electionday.voting as voting
+
+
+@dataclass
+class _PendingBallot:
+    voter: voter_model.Voter
+    party: party_model.Party
+    # Full preference list of a ranked ballot, party is the first.
+    preferences: Tuple[int, ...] = ()
+    future: concurrent.futures.Future = field(
+        default_factory=concurrent.futures.Future)
+    # Engine casting the ballot on its own, None for the SQLite batch.
+    engine: Optional[storage.Storage] = None
+
+
+# Queue marker telling the writer thread to finish.
+_STOP = object()
+
+
+@db.connect
+def _write_batch(connection: sqlite3.Connection,
+                 batch: List[_PendingBallot],
+                 ) -> List[Union[int, Exception]]:
+    """Write a batch of ballots in one transaction.
+
+    Each ballot runs in its own savepoint so a failed ballot (e.g. voter
+      has already voted) is rolled back on its own while the rest of the
+      batch commits together.
+
+    Args:
+        connection (sqlite3.Connection): Passed via decorator
+        batch (List[_PendingBallot]): Ballots to write
+
+    Returns:
+        List[Union[int, Exception]]: Ballot ID or exception per ballot
+    """
+    cursor: Optional[sqlite3.Cursor] = None
+    outcomes: List[Union[int, Exception]] = []
+    try:
+        cursor = connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        for pending in batch:
+            cursor.execute('SAVEPOINT ballot')
+            try:
+                voter_model.vote(cursor, pending.voter)
+                ballot_id: int = party_model.add_vote(
+                    cursor, pending.party, pending.voter.district_id)
+                if pending.preferences:
+                    ranked.record(cursor, ballot_id, pending.preferences)
+                outcomes.append(ballot_id)
+            except Exception as e:
+                cursor.execute('ROLLBACK TO ballot')
+                outcomes.append(e)
+            cursor.execute('RELEASE ballot')
+    finally:
+        if cursor:
+            cursor.close()
+    return outcomes
+
+
+class BallotWriter:
+    """Group-commit queue for ballots.
+
+    Callers submit ballots from any thread, a single writer thread
+      collects them for up to max_delay seconds or batch_size ballots
+      and commits them in one transaction, so many ballots share one
+      commit (and fsync). Each caller waits on its own future, which
+      resolves with the ballot ID once the batch is durable or with the
+      ballot's own exception.
+    """
+
+    def __init__(self,
+                 batch_size: int = config.WRITER_BATCH_SIZE,
+                 max_delay: float = config.WRITER_MAX_DELAY):
+        self.batch_size: int = max(int(batch_size), 1)
+        self.max_delay: float = max(float(max_delay), 0.0)
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed: bool = False
+        self.batches: int = 0
+        self.ballots: int = 0
+
+    def start(self) -> None:
+        """Start writer thread, called on first submit."""
+        with self._lock:
+            self._start()
+
+    def _start(self) -> None:
+        if self._closed:
+            raise RuntimeError('Ballot writer is closed')
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='ballot-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, voter: voter_model.Voter, party: party_model.Party,
+               preferences: Sequence[int] = ()
+               ) -> concurrent.futures.Future:
+        """Queue a ballot.
+
+        Args:
+            voter (voter_model.Voter): Voter to vote
+            party (party_model.Party): Party to vote for, the first
+              preference of a ranked ballot
+            preferences (Sequence[int], optional): Party IDs of a ranked
+              ballot, most preferred first. Defaults to ().
+
+        Raises:
+            ranked.InvalidPreferencesError: Preferences can't be counted
+            RuntimeError: Writer is closed
+
+        Returns:
+            concurrent.futures.Future: Resolves with ballot ID
+        """
+        engine: storage.Storage = storage.get_storage()
+        if preferences and engine.routed:
+            raise ranked.InvalidPreferencesError(
+                f'Ranked ballots need the sqlite storage engine,'
+                f' not {engine.name}')
+        if preferences:
+            preferences = ranked.validate(preferences)
+            if preferences[0] != party._id:
+                raise ranked.InvalidPreferencesError(
+                    'First preference must be the party voted for')
+        pending = _PendingBallot(voter, party, tuple(preferences),
+                                 engine=engine if engine.routed else None)
+        # Queued under the lock, so never behind the stop marker.
+        with self._lock:
+            self._start()
+            self._queue.put(pending)
+        return pending.future
+
+    def cast(self, voter: voter_model.Voter, party: party_model.Party,
+             timeout: Optional[float] = None,
+             preferences: Sequence[int] = ()) -> int:
+        """Queue a ballot and block until it is committed, see submit.
+
+        Raises:
+            ranked.InvalidPreferencesError: Preferences can't be counted
+            voter_model.AlreadyVotedError: Voter has already voted
+            sqlite3.Error: Batch could not be committed
+
+        Returns:
+            int: Ballot ID
+        """
+        return self.submit(voter, party, preferences).result(timeout)
+
+    async def cast_async(self, voter: voter_model.Voter,
+                         party: party_model.Party,
+                         preferences: Sequence[int] = ()) -> int:
+        """Queue a ballot and await its commit, see cast."""
+        return await asyncio.wrap_future(
+            self.submit(voter, party, preferences))
+
+    def close(self) -> None:
+        """Write queued ballots and stop writer thread."""
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def _collect(self, first: _PendingBallot) -> List[_PendingBallot]:
+        batch: List[_PendingBallot] = [first]
+        deadline: float = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if pending is _STOP:
+                # Put marker back so the run loop stops after this batch.
+                self._queue.put(_STOP)
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self) -> None:
+        try:
+            while True:
+                pending = self._queue.get()
+                if pending is _STOP:
+                    return
+                try:
+                    self._commit(self._collect(pending))
+                except Exception as e:
+                    # Keep writing later batches, _commit resolved this one.
+                    print(repr(e))
+        finally:
+            with self._lock:
+                # Stopped or died, later submits must not wait on it.
+                self._closed = True
+            self._fail_queued()
+
+    def _fail_queued(self) -> None:
+        """Fail ballots still queued when the writer thread stops, so no
+          caller waits forever."""
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if pending is not _STOP:
+                pending.future.set_exception(
+                    RuntimeError('Ballot writer is closed'))
+
+    def _cast_each(self, batch: List[_PendingBallot]) -> None:
+        """Cast ballots of other storage engines one at a time, e.g. the
+          shards, where each ballot commits on its voter's shard."""
+        for pending in batch:
+            try:
+                ballot_id: int = pending.engine.cast_vote(
+                    pending.voter, pending.party)
+            except Exception as e:
+                pending.future.set_exception(e)
+                continue
+            self.ballots += 1
+            pending.future.set_result(ballot_id)
+
+    def _commit(self, batch: List[_PendingBallot]) -> None:
+        routed = [pending for pending in batch if pending.engine is not None]
+        if routed:
+            self._cast_each(routed)
+            batch = [pending for pending in batch if pending.engine is None]
+            if not batch:
+                return
+        try:
+            outcomes = _write_batch(batch)
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        self.batches += 1
+        try:
+            # Journaled before callers hear their ballot is in.
+            voting.record_committed(
+                (outcome, pending.voter, pending.party,
+                 pending.preferences)
+                for pending, outcome in zip(batch, outcomes)
+                if not isinstance(outcome, Exception))
+        finally:
+            for pending, outcome in zip(batch, outcomes):
+                if isinstance(outcome, Exception):
+                    pending.future.set_exception(outcome)
+                else:
+                    self.ballots += 1
+                    pending.future.set_result(outcome)
@@ -12,8 +12,9 @@ def custom_run(command_subclass):
 
     def modified_run(self):
         orig_run(self)
+        # Run as a script, setup_db only works under its main guard.
         exec(open(pathlib.Path('./setup_db.py'), encoding='utf-8').read(),
-             globals())
+             {**globals(), '__name__': '__main__'})
     command_subclass.run = modified_run
     return command_subclass
 
@@ -39,8 +40,11 @@ setup(
         'install': CustomInstallCommand, 'develop': CustomDevelopCommand,
     },
     install_requires=requirements,
+    extras_require={'ranked': ['numpy']},
     entry_points=f'''
         [console_scripts]
         {APP_SLUG}={APP_SLUG}:main
+        {APP_SLUG}-server={APP_SLUG}.server:main
+        {APP_SLUG}-kiosk={APP_SLUG}.kiosk:main
     ''',
 )
@@ -1,20 +1,101 @@
+import argparse
+import sys
+import time
+
+import electionday.ballot as ballot
+import electionday.bloom as bloom
+import electionday.config as config
 import electionday.database as db
+import electionday.district as district
+import electionday.eligibility as eligibility
+import electionday.migrate as migrate
+import electionday.ranked as ranked
+import electionday.roll as roll
+import electionday.shard as shard
 from electionday.party import (
     create_table as party_table,
     populate_table as party_data
 )
 from electionday.voter import (
+    bulk_import as voter_bulk_import,
     create_table as voter_table,
-    populate_table as voter_data
 )
 
-db.create_tables(party_table, voter_table)
-try:
-    data = db.load_data()
-    parties, voters = data['parties'], data['voters']
-except Exception as e:
-    print(repr(e))
-    raise e
-else:
-    db.populate_tables((party_data, parties), (voter_data, voters))
-    print('Successfully created and populated database tables.')
+
+started: float = time.perf_counter()
+
+
+def report_progress(processed: int, inserted: int) -> None:
+    """Print voter import progress on a single line."""
+    elapsed: float = time.perf_counter() - started
+    rate: float = processed / elapsed if elapsed else 0.0
+    print(f'\rImported {processed:,} voters ({inserted:,} new,'
+          f' {rate:,.0f} rows/s)', end='', file=sys.stderr, flush=True)
+
+
+def main() -> None:
+    """Create and populate the database, or the shards, from the command
+      line."""
+    parser = argparse.ArgumentParser(
+        description='Create and populate the ElectionDay database.')
+    parser.add_argument('--data', default=str(config.DATA_PATH),
+                        help='JSON file with parties (and voters)')
+    parser.add_argument('--voters', default=None,
+                        help='Voter roll to stream (json, ndjson or csv),'
+                        ' defaults to the voters in --data')
+    parser.add_argument('--format', choices=roll.FORMATS, default=None,
+                        help='Voter roll format, guessed from suffix by'
+                        ' default')
+    parser.add_argument('--batch-size', type=int,
+                        default=config.IMPORT_BATCH_SIZE,
+                        help='Voters inserted per batch')
+    parser.add_argument('--shards', type=int, default=config.SHARD_COUNT,
+                        help='Partition voters across this many database'
+                        ' files, populated concurrently')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Do not report import progress')
+    # Ignore unknown arguments, this script is also run from setup.py.
+    args, _ = parser.parse_known_args()
+
+    if args.shards:
+        router = shard.ShardRouter(shard.shard_paths(args.shards))
+        try:
+            parties = list(roll.iter_json_array(args.data, 'parties'))
+            districts = list(roll.iter_json_array(args.data, 'districts'))
+            inserted = router.populate(parties, args.voters or args.data,
+                                       args.format, args.batch_size,
+                                       districts=districts)
+        except Exception as e:
+            print(repr(e))
+            raise e
+        finally:
+            router.close()
+        print(f'Successfully created and populated {args.shards} database'
+              f' shards ({inserted:,} voters).')
+        sys.exit()
+
+    db.create_tables(party_table, district.create_table, voter_table,
+                     ballot.create_table, ranked.create_table)
+    # Upgrades tables of an existing database, marks new ones as current.
+    migrate.migrate()
+    try:
+        parties = list(roll.iter_json_array(args.data, 'parties'))
+        districts = list(roll.iter_json_array(args.data, 'districts'))
+        voters = roll.iter_voters(args.voters or args.data, args.format)
+    except Exception as e:
+        print(repr(e))
+        raise e
+    else:
+        db.populate_tables((party_data, parties),
+                           (district.populate_table, districts))
+        voter_bulk_import(voters, batch_size=args.batch_size,
+                          progress=None if args.quiet else report_progress)
+        if not args.quiet:
+            print(file=sys.stderr)
+        bloom.rebuild()
+        eligibility.build()
+        print('Successfully created and populated database tables.')
+
+
+if __name__ == '__main__':
+    main()